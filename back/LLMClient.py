@@ -1,4 +1,5 @@
 import json
+import re
 import hashlib
 import base64
 import hmac
@@ -6,25 +7,146 @@ from urllib.parse import urlencode, urlparse
 import ssl
 from datetime import datetime
 from time import mktime
+import time
 from wsgiref.handlers import format_date_time
 import websocket
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import threading
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+try:
+    import websockets  # 可选依赖：仅 recognize_intent_async 需要
+except ImportError:
+    websockets = None
 # 加密相关：hashlib, base64, hmac - 用于API认证签名
 # 网络相关：urlencode, urlparse, ssl, websocket - 用于WebSocket连接
 # 时间相关：datetime, mktime, format_date_time - 用于时间戳生成
-# 并发：threading - 用于异步处理WebSocket消息
+# 并发：threading, ThreadPoolExecutor - 连接池与固定数量的I/O线程
+#       asyncio, websockets - 异步接口，单个事件循环上复用大量请求
+
+_BATCH_LINE = re.compile(r"\s*(\d+)\s*[.、:：)）]\s*(.*)")  # 批量回复中的一行："序号. 意图"
+
+class LLMError(Exception): pass # 星火接口调用失败（连接、鉴权、协议错误等）
+
+# 空闲连接已被服务端关闭时发送或读取第一帧抛出的异常；超时（WebSocketTimeoutException、socket.timeout）不在其中
+_CLOSED_ERRORS = (websocket.WebSocketConnectionClosedException, ConnectionResetError,
+                  ConnectionAbortedError, BrokenPipeError)
+
+class PooledConnection:
+    """连接池中的一条WebSocket连接，记录创建时间用于鉴权过期判断"""
+    def __init__(self, ws, created_at: float):
+        self.ws = ws
+        self.created_at = created_at
+        self.reused = False  # 是否是从空闲队列中取出的旧连接
+
+class WebSocketPool:
+    """
+    星火WebSocket连接池
+    - 复用已完成TLS握手的连接，避免每次请求重新建连
+    - 连接超过 max_age 秒后丢弃重连（鉴权URL中的date有效期有限）
+    - 同时借出的连接数不超过 size
+    """
+    def __init__(self, url_factory, size: int = 4, max_age: float = 240, connect_timeout: float = 10):
+        if size < 1:
+            raise ValueError("连接池大小必须大于0")
+        self.url_factory = url_factory  # 每次新建连接时重新签名URL
+        self.size = size
+        self.max_age = max_age
+        self.connect_timeout = connect_timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.created = 0  # 累计新建连接数
+        self.reused = 0   # 累计复用次数
+
+    def _connect(self) -> PooledConnection:
+        try:
+            ws = websocket.create_connection(
+                self.url_factory(),
+                timeout=self.connect_timeout,
+                sslopt={"cert_reqs": ssl.CERT_NONE}  # 禁用SSL验证（仅建议测试环境）
+            )
+        except (websocket.WebSocketException, OSError) as e:
+            raise LLMError(f"连接失败: {e}")
+        with self._lock:
+            self.created += 1
+        return PooledConnection(ws, time.time())
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        return bool(conn.ws.connected) and time.time() - conn.created_at < self.max_age
+
+    def acquire(self, fresh: bool = False) -> PooledConnection:
+        """借出一条连接：优先复用健康的空闲连接，否则新建"""
+        self._slots.acquire()
+        try:
+            while not fresh:
+                with self._lock:
+                    conn = self._idle.popleft() if self._idle else None
+                if conn is None:
+                    break
+                if self._healthy(conn):
+                    conn.reused = True
+                    with self._lock:
+                        self.reused += 1
+                    return conn
+                self._close(conn)
+            return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: PooledConnection):
+        """归还连接，不健康的连接直接关闭"""
+        try:
+            if self._healthy(conn):
+                with self._lock:
+                    self._idle.append(conn)
+            else:
+                self._close(conn)
+        finally:
+            self._slots.release()
+
+    def discard(self, conn: PooledConnection):
+        """丢弃出错的连接"""
+        self._close(conn)
+        self._slots.release()
+
+    def prewarm(self, count: Optional[int] = None):
+        """预先建立连接放入空闲队列"""
+        count = self.size if count is None else min(count, self.size)
+        with self._lock:
+            idle = len(self._idle)
+        for _ in range(count - idle):
+            self.release(self.acquire(fresh=True))
+
+    def close(self):
+        with self._lock:
+            conns, self._idle = list(self._idle), deque()
+        for conn in conns:
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn: PooledConnection):
+        try:
+            conn.ws.close()
+        except Exception:
+            pass
 
 class LLMClient:
     """LLM客户端，用于意图识别（使用讯飞星火 API）"""
     
-    def __init__(self, app_id: str, api_key: str, api_secret: str, spark_version: str = "v3.5"):
+    def __init__(self, app_id: str, api_key: str, api_secret: str, spark_version: str = "v3.5",
+                 pool_size: int = 4, timeout: float = 10, max_conn_age: float = 240,
+                 raise_errors: bool = False):
         if not all([app_id, api_key, api_secret]):
             raise ValueError("APP_ID, API_KEY, 和 API_SECRET 都不能为空")
         
         self.app_id = app_id
         self.api_key = api_key
         self.api_secret = api_secret
+        self.timeout = timeout  # 单次意图识别的最长等待时间（秒）
+        self.raise_errors = raise_errors  # True时超时/通信失败抛出LLMError，而不是返回None
         
         # 版本映射表：不同模型版本对应的WebSocket地址和领域参数
         version_map = {
@@ -44,6 +166,12 @@ class LLMClient:
         self.host = parsed_url.netloc
         self.path = parsed_url.path
 
+        # 连接池 + 固定数量的I/O线程，线程数不随并发会话数增长
+        self.pool = WebSocketPool(self._get_auth_url, size=pool_size, max_age=max_conn_age, connect_timeout=timeout)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="spark-io")
+        self._stats_lock = threading.Lock()  # 多个I/O线程与事件循环同时更新计数
+        self.early_exits = 0  # 流式回复中途即确定意图的次数
+
     def _get_auth_url(self) -> str:
         """生成带认证信息的WebSocket连接URL"""
         now = datetime.now()
@@ -73,13 +201,10 @@ class LLMClient:
         params = {"authorization": authorization, "date": date, "host": self.host}
         return f"{self.spark_url}?{urlencode(params)}"
 
-    def recognize_intent(self, user_input: str, available_intents: List[str]) -> Optional[str]:
-        """
-        识别用户输入的意图
-        """
-        # 构建系统提示词
+    def _system_prompt(self, available_intents: List[str]) -> str:
+        """构建系统提示词"""
         intents_str = ", ".join([f"'{i}'" for i in available_intents])
-        system_content = f"""你是一个故宫博物院客服系统的意图分类器。
+        return f"""你是一个故宫博物院客服系统的意图分类器。
 请将用户的输入分类到以下标准意图之一：[{intents_str}]。
 
 分类逻辑参考：
@@ -93,97 +218,244 @@ class LLMClient:
 仅返回意图名称，不要包含任何标点或其他文字。
 如果无法匹配，返回 'unknown'。
 """
-        
-        # 用于存储API返回结果和同步线程
+
+    def _chat_request(self, system_content: str, user_content: str, max_tokens: int) -> dict:
+        """构建请求数据"""
+        return {
+            "header": {"app_id": self.app_id},
+            "parameter": {
+                "chat": {
+                    "domain": self.domain,
+                    "temperature": 0.1,  # 低温度确保输出稳定
+                    "max_tokens": max_tokens  # 限制输出长度
+                }
+            },
+            "payload": {
+                "message": {
+                    "text": [
+                        {"role": "system", "content": system_content},
+                        {"role": "user", "content": user_content}
+                    ]
+                }
+            }
+        }
+
+    def _build_request(self, user_input: str, available_intents: List[str]) -> dict:
+        """构建单条意图识别的请求数据"""
+        return self._chat_request(self._system_prompt(available_intents), f"用户输入：{user_input}", 20)
+
+    def _build_batch_request(self, user_inputs: List[str], available_intents: List[str]) -> dict:
+        """构建批量意图识别的请求数据：系统提示词只发送一次，多条输入编号后一起分类"""
+        system_content = self._system_prompt(available_intents) + (
+            "本次有多条编号的用户输入，请逐条分类，每行一条，格式为\"序号. 意图名称\"，不要输出其他内容。\n")
+        user_content = "\n".join(f"{i}. 用户输入：{text}" for i, text in enumerate(user_inputs, 1))
+        return self._chat_request(system_content, user_content, 20 * len(user_inputs))
+
+    @staticmethod
+    def _parse_frame(message) -> Tuple[Optional[str], bool]:
+        """解析一帧回复，返回(文本分片, 是否结束)；status=2表示对话结束"""
+        data = json.loads(message)  # 将接收到的JSON字符串解析为Python字典对象
+        code = data['header']['code']  # 检查返回码,0表示成功
+        if code != 0:
+            raise LLMError(f'code={code}, msg={data["header"]["message"]}')
+        choices = data["payload"]["choices"]  # 从响应数据中提取AI回复内容所在的部分
+        content = choices["text"][0]["content"] if "text" in choices else None
+        return content, choices.get("status") == 2
+
+    def _exchange(self, ws, frame: str, on_partial=None) -> str:
+        """从已收到的第一帧开始读取完整回复；on_partial 在每个中间帧后收到当前已拼接的文本"""
         result_container = []
-        completed = threading.Event()
+        while True:
+            content, done = self._parse_frame(frame)
+            if content:
+                result_container.append(content)
+            if done:
+                return "".join(result_container)
+            if on_partial is not None:
+                on_partial("".join(result_container))
+            frame = ws.recv()
 
-        # WebSocket回调函数 ws - WebSocket连接对象，message - 接收到的原始消息
-        def on_message(ws, message):
+    @staticmethod
+    def _is_decisive(partial: str, available_intents: List[str]) -> bool:
+        """
+        流式回复的前缀是否已能确定结果：
+        已输出 unknown，或恰好等于某个意图且没有更长的意图以它开头
+        """
+        text = partial.strip().replace('"', '').replace("'", "")
+        if text.lower().startswith("unknown"):
+            return True
+        return text in available_intents and not any(
+            intent != text and intent.startswith(text) for intent in available_intents)
+
+    def _complete(self, request_data: dict, on_partial=None) -> str:
+        """
+        从连接池借出连接完成一次请求
+        复用的旧连接在发送或等待第一帧时发现已被服务端关闭（还没有任何回复），则新建连接重发一次；
+        超时、读到部分回复之后的错误和格式错误的回复都不重试
+        """
+        for attempt in range(2):
+            conn = self.pool.acquire(fresh=attempt > 0)
+            replied = False
             try:
-                data = json.loads(message)#将接收到的JSON字符串解析为Python字典对象
-                code = data['header']['code']#检查返回码,0表示成功
-                if code != 0:
-                    print(f'[API Error] code={code}, msg={data["header"]["message"]}')
-                    ws.close()
-                else:
-                    choices = data["payload"]["choices"]#从响应数据中提取AI回复内容所在的部分
-                    # 提取回复内容
-                    if "text" in choices:
-                        content = choices["text"][0]["content"]
+                conn.ws.settimeout(self.timeout)
+                conn.ws.send(json.dumps(request_data))  # 发送请求数据
+                frame = conn.ws.recv()
+                replied = True
+                text = self._exchange(conn.ws, frame, on_partial)
+            except LLMError:
+                self.pool.discard(conn)  # 业务错误后连接状态不确定，不再复用
+                raise
+            except (websocket.WebSocketException, OSError, ValueError, KeyError) as e:
+                self.pool.discard(conn)
+                if conn.reused and attempt == 0 and not replied and isinstance(e, _CLOSED_ERRORS):
+                    continue
+                raise LLMError(f"通信失败: {e}")
+            self.pool.release(conn)
+            return text
+        raise LLMError("通信失败")
+
+    @staticmethod
+    def _match_intent(full_response: str, available_intents: List[str]) -> Optional[str]:
+        """将模型回复映射到可用意图"""
+        # 1. 精确匹配
+        if full_response in available_intents:
+            return full_response
+        # 2. 包含匹配 AI回复中包含意图名称
+        for intent in available_intents:
+            if intent in full_response:
+                return intent
+        return None
+
+    def recognize_intent(self, user_input: str, available_intents: List[str]) -> Optional[str]:
+        """
+        识别用户输入的意图
+        """
+        content = self._submit(self._build_request(user_input, available_intents), available_intents)
+        return self._finish(user_input, content, available_intents)
+
+    def recognize_intents_batch(self, user_inputs: List[str], available_intents: List[str]) -> List[Optional[str]]:
+        """
+        批量识别多条输入的意图（同一组可用意图），一次请求返回每条输入的结果
+        """
+        content = self._submit(self._build_batch_request(user_inputs, available_intents))
+        results: List[Optional[str]] = [None] * len(user_inputs)
+        for line in (content or "").splitlines():
+            m = _BATCH_LINE.match(line)
+            if not m or not 1 <= int(m.group(1)) <= len(user_inputs):
+                continue
+            index = int(m.group(1)) - 1
+            results[index] = self._finish(user_inputs[index], m.group(2), available_intents)
+        return results
+
+    def _submit(self, request_data: dict, available_intents: Optional[List[str]] = None) -> Optional[str]:
+        """
+        在固定的I/O线程上执行请求，调用方最多等待 timeout 秒；失败时返回None
+        给出 available_intents 时启用提前返回：流式回复一旦能确定意图就把结果交给调用方，
+        I/O线程继续读完剩余的帧后把连接归还连接池
+        """
+        decided = Future()
+        def on_partial(text):
+            if not decided.done() and self._is_decisive(text, available_intents):
+                self._count_early_exit()
+                decided.set_result(text)
+        def on_done(f):
+            # 同一请求的回调与 on_partial 都在同一个I/O线程中执行，decided 无需加锁
+            if decided.done():
+                return
+            if f.exception() is not None:
+                decided.set_exception(f.exception())
+            else:
+                decided.set_result(f.result())
+
+        future = self._executor.submit(self._complete, request_data,
+                                       on_partial if available_intents else None)
+        future.add_done_callback(on_done)
+        try:
+            return decided.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            print(f"[API Error] 请求超时({self.timeout}s)")
+            if self.raise_errors:
+                raise LLMError(f"请求超时({self.timeout}s)")
+        except LLMError as e:
+            print(f"[API Error] {e}")
+            if self.raise_errors:
+                raise
+        return None
+
+    def _finish(self, user_input: str, content: str, available_intents: List[str]) -> Optional[str]:
+        """处理返回结果：清理引号后匹配意图"""
+        if not content:
+            return None
+        full_response = content.strip().replace('"', '').replace("'", "")
+        print(f"  [AI思考] '{user_input}' => '{full_response}'")
+        return self._match_intent(full_response, available_intents)
+
+    async def _complete_async(self, request_data: dict, available_intents: Optional[List[str]] = None) -> str:
+        """
+        异步完成一次请求：每个请求独占一条连接，由事件循环统一调度
+        给出 available_intents 时，流式回复一旦能确定意图即返回并关闭连接
+        不使用连接池：池中是 websocket-client 的阻塞连接，只能在I/O线程上读写，放进事件循环会阻塞整个循环；
+        websockets 的连接又绑定在创建它的事件循环上，不能由多个线程的池共享。
+        提前返回时连接上还有未读完的帧，也不能归还复用
+        """
+        if websockets is None:
+            raise RuntimeError("异步接口需要安装 websockets：pip install websockets")
+        url = self._get_auth_url()
+        options = {}
+        if url.startswith("wss://"):
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE  # 与同步客户端一致，禁用SSL验证（仅建议测试环境）
+            options["ssl"] = ssl_context
+        try:
+            async with websockets.connect(url, **options) as ws:
+                await ws.send(json.dumps(request_data))
+                result_container = []
+                while True:
+                    content, done = self._parse_frame(await ws.recv())
+                    if content:
                         result_container.append(content)
-                    # 检查是否完成（status=2表示对话结束）
-                    if choices.get("status") == 2:
-                        completed.set()#通知主线程处理完成
-                        ws.close()#关闭WebSocket连接
-            except Exception as e:
-                print(f"Message Error: {e}")
-                completed.set()
-
-        def on_error(ws, error):
-            print(f"WebSocket Error: {error}")
-            completed.set()
-
-        def on_close(ws, *args):
-            completed.set()
-
-        def on_open(ws):# WebSocket连接建立后发送请求
-            # 构建请求数据
-            request_data = {
-                "header": {"app_id": self.app_id},
-                "parameter": {
-                    "chat": {
-                        "domain": self.domain,
-                        "temperature": 0.1,  # 低温度确保输出稳定
-                        "max_tokens": 20     # 限制输出长度
-                    }
-                },
-                "payload": {
-                    "message": {
-                        "text": [
-                            {"role": "system", "content": system_content},
-                            {"role": "user", "content": f"用户输入：{user_input}"}
-                        ]
-                    }
-                }
-            }
-            ws.send(json.dumps(request_data))# 发送请求数据
-
-        # 建立WebSocket连接
-        ws_url = self._get_auth_url()
-        ws = websocket.WebSocketApp(
-            ws_url,
-            on_message=on_message,
-            on_error=on_error,
-            on_close=on_close,
-            on_open=on_open
-        )
+                    if done:
+                        return "".join(result_container)
+                    if available_intents and self._is_decisive("".join(result_container), available_intents):
+                        self._count_early_exit()
+                        return "".join(result_container)
+        except (websockets.exceptions.WebSocketException, OSError, ValueError, KeyError) as e:
+            raise LLMError(f"通信失败: {e}")
 
-        # 启动WebSocket线程
-        thread = threading.Thread(
-            target=lambda: ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})  # 禁用SSL验证（仅建议测试环境）
-        )
-        thread.daemon = True
-        thread.start()
-
-        # 等待结果（超时10秒）
-        completed.wait(timeout=10)
-        # 确保连接关闭
-        if ws.sock and ws.sock.connected:
-            ws.close()
-
-        # 处理返回结果
-        if result_container:
-            full_response = "".join(result_container).strip().replace('"', '').replace("'", "")
-            print(f"  [AI思考] '{user_input}' => '{full_response}'")
-            
-            # 1. 精确匹配
-            if full_response in available_intents:
-                return full_response
-            # 2. 包含匹配 AI回复中包含意图名称
-            for intent in available_intents:
-                if intent in full_response:
-                    return intent
+    async def recognize_intent_async(self, user_input: str, available_intents: List[str],
+                                     timeout: Optional[float] = None) -> Optional[str]:
+        """
+        识别用户输入的意图（asyncio版本）
+        timeout 为本次请求的截止时间（秒），默认使用 self.timeout；调用方取消任务时连接随之关闭
+        """
+        timeout = self.timeout if timeout is None else timeout
+        request_data = self._build_request(user_input, available_intents)
+        try:
+            content = await asyncio.wait_for(self._complete_async(request_data, available_intents), timeout)
+        except asyncio.TimeoutError:
+            print(f"[API Error] 请求超时({timeout}s)")
             return None
-        else:
-            return None
\ No newline at end of file
+        except LLMError as e:
+            print(f"[API Error] {e}")
+            return None
+        return self._finish(user_input, content, available_intents)
+
+    def _count_early_exit(self):
+        with self._stats_lock:
+            self.early_exits += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            early_exits = self.early_exits
+        return {
+            "connections_created": self.pool.created,
+            "connections_reused": self.pool.reused,
+            "idle_connections": len(self.pool._idle),
+            "early_exits": early_exits,
+        }
+
+    def close(self):
+        """关闭连接池和I/O线程"""
+        self._executor.shutdown(wait=False)
+        self.pool.close()
@@ -0,0 +1,96 @@
+# 文件名: compiler.py
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional, Tuple, Union
+
+from interpreter import (ProgramNode, StepNode, GroupNode, SpeakNode, ListenNode, BranchNode, DefaultNode, ExitNode,
+                         SilenceNode, IncludeNode, SyntaxError)
+from matcher import KeywordMatcher
+
+DEFAULT_TIMEOUT = 10               # 没有 Listen 时的单次静默提醒时间（秒）
+DEFAULT_TOTAL_SILENCE_TIMEOUT = 30 # 没有 Listen 时的总静默终止时间（秒）
+
+class CompiledStep(NamedTuple):
+    """编译后的步骤：执行时只需O(1)的字段访问，不再扫描 actions"""
+    name: str
+    message: str                    # 去重后按顺序拼接的 Speak 文本
+    message_count: int
+    end: bool                       # 是否包含 Exit
+    timeout: int                    # Listen 单次超时（秒）
+    total_silence_timeout: int      # Listen 总静默超时（秒）
+    silence_target: Optional[str]   # 第一个 Silence 的目标步骤
+    default_target: Optional[str]   # 第一个 Default 的目标步骤
+    branches: Mapping[str, str]     # 关键词 -> 目标步骤（只读）
+    intents: Tuple[str, ...]        # 关键词列表，按声明顺序，供意图识别使用
+    matcher: KeywordMatcher
+
+BranchTable = Tuple[Mapping[str, str], Tuple[str, ...], KeywordMatcher]  # (branches, intents, matcher)
+
+def intern_table(branches: Dict[str, str], policy: str, tables: Optional[Dict[tuple, BranchTable]] = None) -> BranchTable:
+    """相同的分支表（关键词、目标与顺序都相同）只编译一次，所有步骤共用同一个只读映射和 matcher"""
+    key = tuple(branches.items())
+    table = tables.get(key) if tables is not None else None
+    if table is None:
+        table = (MappingProxyType(branches), tuple(branches), KeywordMatcher(branches, policy))
+        if tables is not None:
+            tables[key] = table
+    return table
+
+def compile_step(step: StepNode, policy: str = KeywordMatcher.ORDER, groups: Optional[Mapping[str, GroupNode]] = None,
+                 tables: Optional[Dict[tuple, BranchTable]] = None) -> CompiledStep:
+    """
+    groups 为 Include 可引用的分支组；tables 为分支表的驻留表，在一个程序内共享
+    引用未定义的分支组时抛出 SyntaxError
+    """
+    listen = silence = default = None
+    messages, seen = [], set()
+    end = False
+    branches = {}
+    for action in step.actions:
+        if isinstance(action, SpeakNode):
+            if action.message not in seen:
+                messages.append(action.message)
+                seen.add(action.message)
+        elif isinstance(action, BranchNode):
+            branches[action.keyword] = action.step_name
+        elif isinstance(action, IncludeNode):
+            group = groups.get(action.group_name) if groups else None
+            if group is None:
+                raise SyntaxError(f"步骤 {step.name} 引用了未定义的分支组 {action.group_name}")
+            for branch in group.actions:
+                branches[branch.keyword] = branch.step_name
+        elif isinstance(action, ListenNode):
+            listen = listen or action
+        elif isinstance(action, SilenceNode):
+            silence = silence or action
+        elif isinstance(action, DefaultNode):
+            default = default or action
+        elif isinstance(action, ExitNode):
+            end = True
+    branches, intents, matcher = intern_table(branches, policy, tables)
+    return CompiledStep(
+        name=step.name,
+        message="\n".join(messages),
+        message_count=len(messages),
+        end=end,
+        timeout=listen.timeout if listen else DEFAULT_TIMEOUT,
+        total_silence_timeout=listen.total_silence_timeout if listen else DEFAULT_TOTAL_SILENCE_TIMEOUT,
+        silence_target=silence.step_name if silence else None,
+        default_target=default.step_name if default else None,
+        branches=branches,
+        intents=intents,
+        matcher=matcher,
+    )
+
+def effective_blocks(blocks: Iterable[Union[StepNode, GroupNode]]) -> Tuple[Dict[str, StepNode], Dict[str, GroupNode]]:
+    """按名字取生效的块（同名块以后者为准，步骤与分支组共用名字空间），分为步骤和分支组"""
+    effective = {block.name: block for block in blocks}
+    steps = {name: block for name, block in effective.items() if isinstance(block, StepNode)}
+    groups = {name: block for name, block in effective.items() if isinstance(block, GroupNode)}
+    return steps, groups
+
+def compile_program(program: Union[ProgramNode, Iterable[Union[StepNode, GroupNode]]],
+                    policy: str = KeywordMatcher.ORDER) -> Dict[str, CompiledStep]:
+    """把 Parser.parse_program 的结果编译为 步骤名 -> CompiledStep 的分派表（同名步骤以后者为准）"""
+    steps, groups = effective_blocks(program.steps if isinstance(program, ProgramNode) else program)
+    tables: Dict[tuple, BranchTable] = {}
+    return {name: compile_step(step, policy, groups, tables) for name, step in steps.items()}
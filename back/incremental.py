@@ -0,0 +1,194 @@
+# 文件名: incremental.py
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from compiler import compile_step, BranchTable, CompiledStep
+from interpreter import (Lexer, Parser, ProgramNode, StepNode, GroupNode, IncludeNode, Token, TokenType,
+                         BLOCK_KEYWORDS)
+from matcher import KeywordMatcher
+from program_cache import encode_step
+
+_CHUNK = 1 << 16  # 比较公共前后缀时每次比较的字符数
+_KEYWORD_LEN = max(len(k) for k in BLOCK_KEYWORDS)
+
+Block = Union[StepNode, GroupNode]
+
+def common_prefix(a: str, b: str) -> int:
+    """a、b 公共前缀的长度：按块比较定位到第一个不同的块，再在块内二分"""
+    n, i = min(len(a), len(b)), 0
+    while i < n and a[i:i + _CHUNK] == b[i:i + _CHUNK]:
+        i += _CHUNK
+    if i >= n:
+        return n
+    lo, hi = i, min(i + _CHUNK, n)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[i:mid] == b[i:mid]: lo = mid
+        else: hi = mid - 1
+    return lo
+
+def common_suffix(a: str, b: str, limit: int) -> int:
+    """a、b 公共后缀的长度，不超过 limit（避免与公共前缀重叠）"""
+    la, lb, n, i = len(a), len(b), min(len(a), len(b), limit), 0
+    while i < n:
+        size = min(_CHUNK, n - i)
+        if a[la - i - size:la - i] != b[lb - i - size:lb - i]:
+            break
+        i += size
+    else:
+        return n
+    lo, hi = i, min(i + _CHUNK, n)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - i] == b[lb - mid:lb - i]: lo = mid
+        else: hi = mid - 1
+    return lo
+
+class StepDiff(NamedTuple):
+    """一次更新后生效步骤的变化（同名步骤以后定义者为准）"""
+    added: List[str]
+    removed: List[str]
+    modified: List[str]
+
+class IncrementalProgram:
+    """
+    支持增量更新的程序：记录每个顶层块（Step/Group）在源码中的起点
+    update() 只重新词法/语法分析被修改的块，在原地替换 program.steps 与 compiled 中对应的条目
+    - 修改区间由新旧源码的公共前后缀确定
+    - 从修改点所在块的起点开始重新分析，遇到与旧源码对齐的块即停止，其后的块原样保留
+    - 分支组变化时，重新编译所有 Include 了它的步骤
+    """
+    def __init__(self, source: str, policy: str = KeywordMatcher.ORDER):
+        self.policy = policy
+        self.source = ""
+        self.starts: List[int] = []  # 每个块的起始关键字在源码中的位置
+        self.program = ProgramNode([])
+        self.compiled: Dict[str, CompiledStep] = {}
+        self._effective: Dict[str, Block] = {}  # 名字 -> 生效的（最后一个同名）块
+        self._groups: Dict[str, GroupNode] = {}  # 生效的分支组
+        self._tables: Dict[tuple, BranchTable] = {}  # 分支表驻留表
+        self._counts = Counter()  # 名字 -> 定义次数
+        self.update(source)
+
+    def _parse_region(self, source: str, start: int, stop_after: int, delta: int) -> Tuple[List[Block], List[int], int]:
+        """
+        从 start（某个块的起点或0）开始分析，直到越过 stop_after 后遇到与旧块对齐的块
+        返回 (新块, 新块起点, 对齐的旧块下标)；一直分析到文件结尾时下标为旧块数
+        """
+        old_starts, new_starts = self.starts, []
+        resync = None  # (对齐的块起始 Token, 旧块下标)
+        def tokens() -> Iterator[Token]:
+            nonlocal resync
+            lexer = Lexer(source, source.count('\n', 0, start) + 1, start)
+            for token, offset in lexer.tokens_with_offsets():
+                if token.type is TokenType.KEYWORD and token.value in BLOCK_KEYWORDS:
+                    if offset >= stop_after:
+                        j = bisect_left(old_starts, offset - delta)
+                        if j < len(old_starts) and old_starts[j] == offset - delta:
+                            resync = token, j
+                            yield token  # 之后的Token与旧源码相同，解析到这里即停止
+                            return
+                    new_starts.append(offset)
+                yield token
+        parser, steps = Parser(tokens()), []
+        while parser.current().type != TokenType.EOF and (resync is None or parser.current() is not resync[0]):
+            steps.append(parser.parse_block())
+        return steps, new_starts, len(old_starts) if resync is None else resync[1]
+
+    def update(self, source: str) -> StepDiff:
+        """
+        用新的源码更新程序，返回生效步骤的增删改（包括因所引用的分支组变化而改变的步骤）
+        解析或编译失败时抛出异常，程序保持不变
+        """
+        old = self.source
+        prefix = common_prefix(old, source)
+        if prefix == len(old) == len(source):
+            return StepDiff([], [], [])
+        suffix = common_suffix(old, source, min(len(old), len(source)) - prefix)
+        delta = len(source) - len(old)
+
+        # 从修改点之前、且块关键字及其后一个字符都未改变的块开始（修改可能把 Step 变成 Stepx 或 Speak）
+        # 这样的块是第一个块时从头分析（第一个块之前只有空白和注释）
+        k = bisect_right(self.starts, prefix - _KEYWORD_LEN - 1) - 1
+        first, start = (k, self.starts[k]) if k > 0 else (0, 0)
+        new_steps, new_starts, last = self._parse_region(source, start, len(source) - suffix, delta)
+        old_steps = self.program.steps[first:last]
+
+        # 先算出生效块的变化并完成编译，全部成功后才修改状态
+        old_counts = Counter(step.name for step in old_steps)
+        new_counts = Counter(step.name for step in new_steps)
+        last_in_region = {step.name: step for step in new_steps}  # 区间内每个名字的最后一个定义
+        effective: Dict[str, Optional[Block]] = {}  # 名字 -> 更新后生效的块（None 表示不再定义）
+        changed: Dict[str, Tuple[Optional[Block], Optional[Block]]] = {}  # 内容有变化的名字 -> (旧块, 新块)
+        for name in dict.fromkeys([step.name for step in old_steps] + list(last_in_region)):
+            count = self._counts[name] - old_counts[name] + new_counts[name]
+            if count <= 0:
+                after = None
+            elif count == new_counts[name]:
+                after = last_in_region[name]
+            else:
+                after = self._find_last(name, first, last, new_steps)  # 区间外还有同名定义（只在脚本重复定义时发生）
+            before = self._effective.get(name)
+            effective[name] = after
+            if before is None or after is None or (before is not after and encode_step(before) != encode_step(after)):
+                if before is not None or after is not None:
+                    changed[name] = (before, after)
+
+        groups = self._groups
+        changed_groups = {name for name, blocks in changed.items() if any(isinstance(b, GroupNode) for b in blocks)}
+        if changed_groups:
+            groups = dict(self._groups)
+            for name in changed_groups:
+                after = changed[name][1]
+                if isinstance(after, GroupNode):
+                    groups[name] = after
+                else:
+                    groups.pop(name, None)
+        recompile = {name: after for name, (_, after) in changed.items() if isinstance(after, StepNode)}
+        if changed_groups:
+            for name, block in self._effective.items():
+                block = effective.get(name, block)
+                if name not in recompile and isinstance(block, StepNode) and any(
+                        isinstance(a, IncludeNode) and a.group_name in changed_groups for a in block.actions):
+                    recompile[name] = block
+        compiled = {name: compile_step(step, self.policy, groups, self._tables) for name, step in recompile.items()}
+
+        self.program.steps[first:last] = new_steps  # 原地替换，ProgramNode 对象不变
+        self.starts[first:] = new_starts + [s + delta for s in self.starts[last:]]
+        self.source = source
+        self._counts.subtract(old_counts)
+        self._counts.update(new_counts)
+        for name, after in effective.items():
+            if after is None:
+                del self._counts[name]
+                self._effective.pop(name, None)
+            else:
+                self._effective[name] = after
+        self._groups = groups
+
+        diff = StepDiff([], [], [])
+        for name, (before, after) in changed.items():
+            if isinstance(after, StepNode):
+                (diff.modified if isinstance(before, StepNode) else diff.added).append(name)
+            elif isinstance(before, StepNode):
+                del self.compiled[name]
+                diff.removed.append(name)
+        for name, step in compiled.items():
+            if name not in changed and step[:-1] != self.compiled[name][:-1]:
+                diff.modified.append(name)  # 只因分支组变化
+            self.compiled[name] = step
+        return diff
+
+    def _find_last(self, name: str, first: int, last: int, new_steps: List[Block]) -> Block:
+        """更新后的最后一个同名块：依次在修改区间之后、新区间内、区间之前从后往前找"""
+        steps = self.program.steps
+        for i in range(len(steps) - 1, last - 1, -1):
+            if steps[i].name == name:
+                return steps[i]
+        for step in reversed(new_steps):
+            if step.name == name:
+                return step
+        for i in range(first - 1, -1, -1):
+            if steps[i].name == name:
+                return steps[i]
@@ -0,0 +1,111 @@
+# 文件名: intent_batcher.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from LLMClient import LLMError
+
+class _PendingIntent:
+    """等待批量分类的一条输入"""
+    def __init__(self, user_input: str, deadline: float):
+        self.user_input = user_input
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline  # 调用方放弃等待的时间点
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+class IntentBatcher:
+    """
+    意图识别微批处理
+    - 收集 max_wait 秒内、可用意图集合相同的输入，最多 max_batch 条合并为一次请求
+    - 每个调用方最多等待 latency_budget 秒，超时抛出 LLMError（与不合并时的客户端一致，熔断器记为失败）；
+      已超时的输入不再发送
+    - 合并后的请求在 max_inflight 个线程上并发发送
+    """
+    def __init__(self, client, max_batch: int = 8, max_wait: float = 0.005,
+                 latency_budget: float = 10, max_inflight: int = 4):
+        self.client = client  # 需要提供 recognize_intent 与 recognize_intents_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.latency_budget = latency_budget
+        self._groups = OrderedDict()  # 意图元组 -> 待处理列表，按最早到达排序
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="intent-batch")
+        self._worker = None
+        self.batches = 0  # 已发送的请求数
+        self.items = 0    # 已发送的输入条数
+
+    def recognize_intent(self, user_input: str, available_intents: List[str],
+                         budget: Optional[float] = None) -> Optional[str]:
+        budget = self.latency_budget if budget is None else budget
+        item = _PendingIntent(user_input, time.monotonic() + budget)
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._collect, name="intent-batcher", daemon=True)
+                self._worker.start()
+            self._groups.setdefault(tuple(available_intents), []).append(item)
+            self._cond.notify()
+        if not item.done.wait(budget):
+            print(f"[Batch] '{user_input}' 超出延迟预算({budget}s)")
+            raise LLMError(f"请求超时({budget}s)")
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _collect(self):
+        """后台线程：等待凑批或窗口到期后，把一批输入交给发送线程"""
+        while True:
+            with self._cond:
+                while not self._groups:
+                    self._cond.wait()
+                intents, items = next(iter(self._groups.items()))
+                # 窗口从该组最早的输入开始计时，且不超过其剩余延迟预算
+                flush_at = min(items[0].enqueued_at + self.max_wait, items[0].deadline)
+                while len(items) < self.max_batch:
+                    remaining = flush_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, rest = items[:self.max_batch], items[self.max_batch:]
+                if rest:
+                    self._groups[intents] = rest
+                    self._groups.move_to_end(intents)
+                else:
+                    del self._groups[intents]
+            self._executor.submit(self._dispatch, list(intents), batch)
+
+    def _dispatch(self, intents: List[str], batch: List[_PendingIntent]):
+        now = time.monotonic()
+        batch = [item for item in batch if item.deadline > now]  # 调用方已放弃的输入不再消耗token
+        if not batch:
+            return
+        inputs = [item.user_input for item in batch]
+        try:
+            if len(batch) == 1:
+                results = [self.client.recognize_intent(inputs[0], intents)]
+            else:
+                results = self.client.recognize_intents_batch(inputs, intents)
+        except Exception as e:
+            print(f"[Batch] 批量识别失败: {e}")
+            for item in batch:  # 异常交给每个调用方自行处理
+                item.error = e
+                item.done.set()
+            return
+        with self._cond:  # 多个发送线程同时完成
+            self.batches += 1
+            self.items += len(batch)
+        for item, result in zip(batch, results):
+            item.result = result
+            item.done.set()
+
+    def stats(self) -> dict:
+        with self._cond:
+            batches, items = self.batches, self.items
+        return {
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": items / batches if batches else 0.0,
+        }
@@ -0,0 +1,81 @@
+# 文件名: intent_cache.py
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+_MISSING = object()  # 区分"未命中"与"缓存的None"
+_NOISE = re.compile(r"[\s，。！？、；：,.!?;:~～…]+")  # 不影响意图的空白与标点
+
+def normalize_input(user_input: str) -> str:
+    """归一化用户输入：去掉空白与标点，英文转小写"""
+    return _NOISE.sub("", user_input).lower()
+
+class IntentCache:
+    """
+    意图识别缓存，放在LLM客户端前面
+    - 键：归一化后的输入 + 当前步骤Branch关键词元组
+    - LRU淘汰，超过 max_size 时移除最久未使用的条目
+    - TTL过期；识别失败(None)的结果使用较短的 negative_ttl 缓存
+    """
+    def __init__(self, backend, max_size: int = 1024, ttl: float = 600, negative_ttl: float = 60):
+        self.backend = backend  # 任何提供 recognize_intent 的客户端
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # key -> (过期时间, 意图)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(user_input: str, available_intents: List[str]) -> Tuple[str, Tuple[str, ...]]:
+        return normalize_input(user_input), tuple(available_intents)
+
+    def get(self, key):
+        """查询缓存，未命中或已过期时返回 _MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING
+
+    def put(self, key, intent: Optional[str]):
+        ttl = self.ttl if intent is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, intent)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def recognize_intent(self, user_input: str, available_intents: List[str]) -> Optional[str]:
+        key = self.make_key(user_input, available_intents)
+        intent = self.get(key)
+        if intent is not _MISSING:
+            return intent
+        intent = self.backend.recognize_intent(user_input, available_intents)
+        self.put(key, intent)
+        return intent
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,121 @@
+# 文件名: intent_classifier.py
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from intent_cache import normalize_input
+from interpreter import BranchNode
+
+def char_ngrams(text: str, n_min: int = 1, n_max: int = 2) -> Counter:
+    """字符n-gram词频（中文按字切分即可，无需分词）"""
+    text = normalize_input(text)
+    grams = Counter()
+    for n in range(n_min, n_max + 1):
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    return grams
+
+class LocalIntentClassifier:
+    """
+    本地意图分类层，位于Branch关键词匹配与LLM之间
+    - 特征：字符n-gram TF-IDF；每个意图的原型是其所有样例向量的质心
+    - 打分：输入向量与当前步骤可用意图原型的余弦相似度（倒排索引，只访问命中的n-gram）
+    - 最高分 >= threshold 且领先第二名 margin 以上才直接返回，否则交给 fallback（通常是LLM客户端）
+    """
+    def __init__(self, fallback=None, threshold: float = 0.5, margin: float = 0.1,
+                 n_min: int = 1, n_max: int = 2):
+        self.fallback = fallback
+        self.threshold = threshold
+        self.margin = margin
+        self.n_min, self.n_max = n_min, n_max
+        self._examples: Dict[str, List[str]] = defaultdict(list)  # 意图 -> 样例文本
+        # (n-gram -> IDF, n-gram -> [(意图, 权重)])；训练完成后整体替换，分类时只读取一次，两者总是同一次训练的结果
+        self._model: Optional[Tuple[Dict[str, float], Dict[str, List[Tuple[str, float]]]]] = None
+        self._train_lock = threading.RLock()  # 热加载时在后台补充样例并重新训练
+        self._stats_lock = threading.Lock()   # 多个会话线程同时更新计数
+        self.local_hits = 0  # 本地直接给出结果的次数
+        self.deferred = 0    # 交给下一层的次数
+
+    def add_examples(self, examples: Dict[str, str]):
+        """添加标注样例：{用户输入: 意图}"""
+        with self._train_lock:
+            for text, intent in examples.items():
+                self._examples[intent].append(text)
+            self._model = None
+
+    def add_program(self, program):
+        """用DSL中的Branch关键词训练：每个关键词本身就是其意图的样例"""
+        self.add_keywords(action.keyword for step in program.steps
+                          for action in step.actions if isinstance(action, BranchNode))
+
+    def add_keywords(self, keywords: Iterable[str]):
+        with self._train_lock:
+            for keyword in keywords:
+                if keyword not in self._examples[keyword]:
+                    self._examples[keyword].append(keyword)
+            self._model = None
+
+    def fit(self):
+        """根据样例计算IDF与各意图原型，构建倒排索引；返回 (idf, 索引)"""
+        with self._train_lock:
+            counts = {intent: [char_ngrams(t, self.n_min, self.n_max) for t in texts]
+                      for intent, texts in self._examples.items()}
+            df = Counter()
+            for grams_list in counts.values():
+                df.update(set().union(*grams_list))
+            total = len(counts)
+            idf = {g: math.log((1 + total) / (1 + d)) + 1 for g, d in df.items()}
+
+            index = defaultdict(list)
+            for intent, grams_list in counts.items():
+                centroid = Counter()
+                for grams in grams_list:
+                    for g, w in self._unit_vector(grams, idf).items():
+                        centroid[g] += w
+                norm = math.sqrt(sum(w * w for w in centroid.values())) or 1.0
+                for g, w in centroid.items():
+                    index[g].append((intent, w / norm))
+            self._model = (idf, dict(index))
+            return self._model
+
+    @staticmethod
+    def _unit_vector(grams: Counter, idf: Dict[str, float]) -> Dict[str, float]:
+        vec = {g: tf * idf[g] for g, tf in grams.items() if g in idf}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {g: w / norm for g, w in vec.items()}
+
+    def classify(self, user_input: str, available_intents: List[str]) -> Tuple[Optional[str], float, float]:
+        """返回(最佳意图, 最高分, 第二名分数)，只在可用意图中比较"""
+        model = self._model  # 热加载时其他线程可能正在重新训练，只读取一次
+        if model is None:
+            model = self.fit()
+        idf, index = model
+        allowed = set(available_intents)
+        scores = defaultdict(float)
+        for g, w in self._unit_vector(char_ngrams(user_input, self.n_min, self.n_max), idf).items():
+            for intent, pw in index.get(g, ()):
+                if intent in allowed:
+                    scores[intent] += w * pw
+        if not scores:
+            return None, 0.0, 0.0
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        return ranked[0][0], ranked[0][1], second
+
+    def recognize_intent(self, user_input: str, available_intents: List[str]) -> Optional[str]:
+        intent, best, second = self.classify(user_input, available_intents)
+        if intent is not None and best >= self.threshold and best - second >= self.margin:
+            with self._stats_lock:
+                self.local_hits += 1
+            print(f"  [本地分类] '{user_input}' => '{intent}' ({best:.2f})")
+            return intent
+        with self._stats_lock:
+            self.deferred += 1
+        if self.fallback is None:
+            return None
+        return self.fallback.recognize_intent(user_input, available_intents)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"local_hits": self.local_hits, "deferred": self.deferred}
@@ -1,6 +1,11 @@
 # 文件名: interpreter.py
+import re
+import sys
+from array import array
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+INTERPRETER_VERSION = "1.2"  # 语法或AST结构变化时递增，使旧的编译缓存失效
 
 class TokenType(Enum):
     KEYWORD = 1
@@ -10,23 +15,79 @@ class TokenType(Enum):
     SYMBOL = 5
     EOF = 6
 
-KEYWORDS = {"Step", "Speak", "Listen", "Branch", "Silence", "Default", "Exit"}
+KEYWORDS = {"Step", "Group", "Speak", "Listen", "Branch", "Include", "Silence", "Default", "Exit"}
+BLOCK_KEYWORDS = ("Step", "Group")  # 顶层块的起始关键字
+_KEYWORD_STRINGS = {k: sys.intern(k) for k in KEYWORDS}  # 关键字Token共用同一个字符串对象
+_TYPES = list(TokenType)  # 类型码(TokenType.value - 1) -> TokenType
 
 class Token:
+    __slots__ = ('type', 'value', 'line')
     def __init__(self, type: TokenType, value: Optional[str], line: int):
         self.type = type
         self.value = value
         self.line = line
     def __str__(self): return f"Line {self.line}: ({self.type.name}, {repr(self.value)})"
 
+class TokenStream:
+    """
+    紧凑的Token序列：类型码、值的起止偏移、行号分别存放在 array 列中，值按需从源码切出
+    每个Token约占 1+8+8+4 字节，而Token对象连同值字符串要一百多字节
+    """
+    __slots__ = ('source', 'types', 'starts', 'ends', 'lines')
+    def __init__(self, source: str):
+        self.source = source
+        self.types = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.lines = array('l')
+    def __len__(self) -> int: return len(self.types)
+    def type_at(self, i: int) -> TokenType: return _TYPES[self.types[i]]
+    def value_at(self, i: int) -> Optional[str]:
+        type = _TYPES[self.types[i]]
+        if type is TokenType.EOF: return None
+        value = self.source[self.starts[i]:self.ends[i]]
+        return _KEYWORD_STRINGS[value] if type is TokenType.KEYWORD else value
+    def __getitem__(self, i: int) -> Token:
+        if i < 0: i += len(self)
+        return Token(self.type_at(i), self.value_at(i), self.lines[i])
+    def __iter__(self) -> Iterator[Token]:
+        for i in range(len(self.types)): yield self[i]
+    def nbytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in (self.types, self.starts, self.ends, self.lines))
+    def spans(self) -> Iterator[Tuple[int, int, int, int]]:
+        """与 Lexer.spans() 相同的格式，供 Parser 直接读列"""
+        return zip(self.types, self.starts, self.ends, self.lines)
+
 class LexicalError(Exception): pass
 class SyntaxError(Exception): pass
 
+# 主正则：先跳过空白和注释，再用一次匹配识别整个Token，命中的分组序号（m.lastindex）即Token类型
+# \s、\d、\w 与 str.isspace、str.isdecimal、str.isalnum()+'_' 逐字符等价；关键字之后不能紧跟标识符字符
+# 其余情况（未闭合字符串、非法字符）匹配到空的 OTHER，交给逐字符扫描处理
+_TOKEN_RE = re.compile(r'''
+    (?:\s|\#[^\n]*)*
+    (?:
+        "(?P<STRING>[^"]*)"
+      | (?P<NUMBER>\d+)
+      | (?P<KEYWORD>(?:%s)(?!\w))
+      | (?P<IDENT>[^\W\d]\w*)
+      | (?P<SYMBOL>,)
+      | (?P<EOF>\Z)
+      | (?P<OTHER>)
+    )''' % '|'.join(sorted(KEYWORDS)), re.VERBOSE)
+_OTHER = -1
+_CODES = [_OTHER] * (_TOKEN_RE.groups + 1)  # 分组序号 -> 类型码（TokenType.value - 1，与 TokenStream 相同）
+for _type in TokenType:
+    _CODES[_TOKEN_RE.groupindex["IDENT" if _type is TokenType.IDENTIFIER else _type.name]] = _type.value - 1
+_KEYWORD_CODE, _IDENT_CODE, _NUMBER_CODE, _STRING_CODE, _EOF_CODE = (t.value - 1 for t in (
+    TokenType.KEYWORD, TokenType.IDENTIFIER, TokenType.NUMBER, TokenType.STRING, TokenType.EOF))
+
 class Lexer:
-    def __init__(self, script: str):
+    def __init__(self, script: str, line: int = 1, pos: int = 0):
         self.script = script# 源代码
-        self.pos = 0
-        self.line = 1
+        self.pos = pos  # 起始位置，从某个Token的起点开始分析时需同时给出该处的行号
+        self.line = line  # 起始行号，对脚本片段单独分析时用于保持全局行号
+        self._stream = None
 
     def skip_whitespace_and_comments(self):
         while self.pos < len(self.script):
@@ -43,6 +104,67 @@ class Lexer:
                 break
 
     def get_token(self) -> Token:#获取单个Token
+        if self._stream is None:
+            self._stream = self.tokens()
+        return next(self._stream, None) or Token(TokenType.EOF, None, self.line)
+
+    def tokens(self) -> Iterator[Token]:
+        """惰性生成Token序列（以EOF结尾），Parser可以边分析边取"""
+        for token, _ in self.tokens_with_offsets():
+            yield token
+
+    def tokens_with_offsets(self) -> Iterator[Tuple[Token, int]]:
+        """同 tokens()，同时给出每个Token在源码中的起点（字符串为左引号的位置）"""
+        script, interned = self.script, _KEYWORD_STRINGS.get
+        for code, start, end, line in self.spans():
+            if code == _EOF_CODE:
+                yield Token(TokenType.EOF, None, line), start
+                return
+            value = script[start:end]
+            if code == _STRING_CODE:
+                start -= 1
+            yield Token(_TYPES[code], interned(value, value), line), start
+
+    def token_stream(self) -> 'TokenStream':
+        """一次性分析为紧凑的 TokenStream，不创建Token对象；只需解析一遍时把 Lexer 直接交给 Parser，不必保留整个序列"""
+        stream = TokenStream(self.script)
+        types, starts, ends, lines = stream.types.append, stream.starts.append, stream.ends.append, stream.lines.append
+        for code, start, end, line in self.spans():
+            types(code)
+            starts(start)
+            ends(end)
+            lines(line)
+        return stream
+
+    def spans(self) -> Iterator[Tuple[int, int, int, int]]:
+        """
+        惰性生成每个Token的 (类型码, 值起点, 值终点, 行号)，字符串的值不含引号，以EOF结尾
+        每个Token是主正则的一次匹配，行号加上两次匹配终点之间的换行数（字符串即为右引号所在的行）；
+        少见情况（OTHER、以²这类字符开头的标识符、后面紧跟²的数字）按逐字符规则扫描这一个Token，保证Token与错误信息完全一致
+        """
+        script, count, codes = self.script, self.script.count, _CODES
+        while True:
+            for m in _TOKEN_RE.finditer(script, self.pos):
+                group = m.lastindex
+                code = codes[group]
+                start, end = m.span(group)
+                if (code == _OTHER or (code == _IDENT_CODE and not (script[start].isalpha() or script[start] == '_'))
+                        or (code == _NUMBER_CODE and script[end:end + 1].isdigit())):
+                    self.line += count('\n', self.pos, start)
+                    self.pos = start
+                    token = self._scan_token()
+                    value_end = self.pos - 1 if token.type is TokenType.STRING else self.pos
+                    yield token.type.value - 1, value_end - len(token.value or ""), value_end, token.line
+                    if token.type is TokenType.EOF:
+                        return
+                    break
+                self.line += count('\n', self.pos, m.end())
+                self.pos = m.end()
+                yield code, start, end, self.line
+                if code == _EOF_CODE:
+                    return
+
+    def _scan_token(self) -> Token:#逐字符获取单个Token
         self.skip_whitespace_and_comments()
         if self.pos >= len(self.script):
             return Token(TokenType.EOF, None, self.line)
@@ -84,55 +206,114 @@ class Lexer:
 
     #词法分析主函数，获取所有token，生成token序列
     def tokenize(self) -> List[Token]:
-        tokens = []
-        while True:
-            t = self.get_token()
-            tokens.append(t)
-            if t.type == TokenType.EOF: break
-        return tokens
+        return list(self.tokens())
 
-class ASTNode: pass # 抽象语法树节点基类
+class ASTNode: __slots__ = () # 抽象语法树节点基类，子类都用 __slots__ 省去实例 __dict__
 
-class ProgramNode(ASTNode):# 程序节点，包含多个步骤
-    def __init__(self, steps: List['StepNode']): self.steps = steps
+class ProgramNode(ASTNode):# 程序节点，按出现顺序包含所有顶层块（步骤与分支组）
+    __slots__ = ('steps',)
+    def __init__(self, steps: List[Union['StepNode', 'GroupNode']]): self.steps = steps
 class StepNode(ASTNode):# 步骤节点，包含多个动作
+    __slots__ = ('name', 'actions')
     def __init__(self, name: str, actions: List['ActionNode']): self.name, self.actions = name, actions
+class GroupNode(ASTNode):# 分支组节点，只包含 Branch，供多个步骤 Include；与步骤共用名字空间
+    __slots__ = ('name', 'actions')
+    def __init__(self, name: str, actions: List['BranchNode']): self.name, self.actions = name, actions
 class SpeakNode(ASTNode):# 说话节点
+    __slots__ = ('message',)
     def __init__(self, message: str): self.message = message
 class ListenNode(ASTNode):# 听取节点
+    __slots__ = ('timeout', 'total_silence_timeout')
     def __init__(self, timeout: int = 10, total_silence_timeout: int = 40):
         self.timeout = timeout # 单次提醒超时
         self.total_silence_timeout = total_silence_timeout # 总静默超时，用于终止
 class BranchNode(ASTNode):# 分支节点
+    __slots__ = ('keyword', 'step_name')
     def __init__(self, keyword: str, step_name: str): self.keyword, self.step_name = keyword, step_name
 class DefaultNode(ASTNode):# 默认节点
+    __slots__ = ('step_name',)
     def __init__(self, step_name: str): self.step_name = step_name
-class ExitNode(ASTNode): pass# 退出节点
+class ExitNode(ASTNode): __slots__ = ()# 退出节点
 class SilenceNode(ASTNode):# 静默处理节点
+    __slots__ = ('step_name',)
     def __init__(self, step_name: str): self.step_name = step_name
-ActionNode = Union[SpeakNode, ListenNode, BranchNode, DefaultNode, ExitNode, SilenceNode]# 动作节点类型别名
+class IncludeNode(ASTNode):# 引用分支组，在此位置展开组内的 Branch
+    __slots__ = ('group_name',)
+    def __init__(self, group_name: str): self.group_name = group_name
+ActionNode = Union[SpeakNode, ListenNode, BranchNode, DefaultNode, ExitNode, SilenceNode, IncludeNode]# 动作节点类型别名
 
 class Parser:
-    def __init__(self, tokens: List[Token]): 
-        self.tokens, self.pos = tokens, 0 #词法单元列表
-    def current(self) -> Token: return self.tokens[self.pos]# 获取当前Token
-    def advance(self): self.pos += 1# 移动到下一个Token
-    def expect(self, type: TokenType, value: Optional[str] = None):
-        t = self.current()#检查当前token是否符合预期
-        if t.type != type or (value and t.value != value): raise SyntaxError(f"Line {t.line}: Expected {type} {value}, got {t.type} {t.value}")
+    """
+    递归下降语法分析
+    tokens 可以是Token列表、Lexer.tokens() 生成器，也可以是 TokenStream 或 Lexer 本身：
+    后两者逐个读取 (类型码, 值起点, 值终点, 行号)，不创建Token对象（Lexer 还不保留整个Token序列）
+    """
+    def __init__(self, tokens: Union[Iterable[Token], TokenStream, 'Lexer']):
+        self.tokens, self.pos = tokens, 0 #词法单元列表、生成器、TokenStream 或 Lexer
+        self.type: TokenType = TokenType.EOF  # 当前Token
+        self.value: Optional[str] = None
+        self.line = 0
+        self._token = None
+        if isinstance(tokens, (TokenStream, Lexer)):
+            self._spans = tokens.spans()
+            self._source = tokens.source if isinstance(tokens, TokenStream) else tokens.script
+            self._next = self._next_span
+        else:
+            self._stream = iter(tokens)
+            self._next = self._next_token
+        self._next()
+    def _next_token(self):
+        t = self._token = next(self._stream)
+        self.type, self.value, self.line = t.type, t.value, t.line
+    def _next_span(self):
+        code, start, end, self.line = next(self._spans)
+        self.type = _TYPES[code]
+        if code == _KEYWORD_CODE:
+            self.value = _KEYWORD_STRINGS[self._source[start:end]]
+        else:
+            self.value = self._source[start:end] if code != _EOF_CODE else None
+    def current(self) -> Token:# 获取当前Token（读Token序列时为原对象）
+        return self._token or Token(self.type, self.value, self.line)
+    def advance(self):# 移动到下一个Token
+        self.pos += 1
+        if self.type != TokenType.EOF: self._next()
+    def expect(self, type: TokenType, value: Optional[str] = None) -> Optional[str]:
+        #检查当前token是否符合预期，返回其值
+        if self.type != type or (value and self.value != value): raise SyntaxError(f"Line {self.line}: Expected {type} {value}, got {self.type} {self.value}")
+        value = self.value
         self.advance()
-        return t
+        return value
+    def expect_name(self) -> str:
+        # 步骤名在跳转目标中反复出现，驻留后所有引用共用一个字符串
+        return sys.intern(self.expect(TokenType.IDENTIFIER))
     def parse_program(self) -> ProgramNode:
-        steps = []# 解析所有步骤
-        while self.current().type != TokenType.EOF: steps.append(self.parse_step())
+        steps = []# 解析所有步骤和分支组
+        while self.type != TokenType.EOF: steps.append(self.parse_block())
         return ProgramNode(steps)
-    
+
+    def parse_block(self) -> Union[StepNode, GroupNode]:
+        if self.type == TokenType.KEYWORD and self.value == "Group": return self.parse_group()
+        return self.parse_step()
+
+    def at_block_end(self) -> bool:# 遇到下一个Step/Group或eof
+        return self.type == TokenType.EOF or (self.type == TokenType.KEYWORD and self.value in BLOCK_KEYWORDS)
+
+    def parse_group(self) -> GroupNode:
+        self.expect(TokenType.KEYWORD, "Group")
+        name = self.expect_name()
+        branches = []
+        while not self.at_block_end():
+            if self.value != "Branch":
+                raise SyntaxError(f"Line {self.line}: Group {name} 中只能使用 Branch，遇到 '{self.value}'")
+            branches.append(self.parse_branch())
+        return GroupNode(name, branches)
+
     def parse_step(self) -> StepNode:
         self.expect(TokenType.KEYWORD, "Step")
-        name = self.expect(TokenType.IDENTIFIER).value# 步骤名称
-        actions = []# 解析步骤内的所有动作，直到遇到下一个step或eof
-        while self.current().type != TokenType.EOF and not (self.current().type == TokenType.KEYWORD and self.current().value == "Step"):
-            k = self.current().value
+        name = self.expect_name()# 步骤名称
+        actions = []# 解析步骤内的所有动作，直到遇到下一个块或eof
+        while not self.at_block_end():
+            k = self.value
             # 根据动作类型调用相应的解析方法
             if k == "Speak": actions.append(self.parse_speak())
             elif k == "Listen": actions.append(self.parse_listen())
@@ -140,34 +321,36 @@ class Parser:
             elif k == "Default": actions.append(self.parse_default())
             elif k == "Silence": actions.append(self.parse_silence())
             elif k == "Exit": actions.append(self.parse_exit())
-            else: raise SyntaxError(f"Line {self.current().line}: Unknown action '{k}'")
+            elif k == "Include": actions.append(self.parse_include())
+            else: raise SyntaxError(f"Line {self.line}: Unknown action '{k}'")
         return StepNode(name, actions)
     
     def parse_speak(self):
         self.expect(TokenType.KEYWORD, "Speak")
-        return SpeakNode(self.expect(TokenType.STRING).value.replace('\\n', '\n'))
+        return SpeakNode(self.expect(TokenType.STRING).replace('\\n', '\n'))
     def parse_listen(self):
         self.expect(TokenType.KEYWORD, "Listen")
         timeout = 10  # Default single timeout
         total_silence_timeout = 30 # Default total timeout
 
         # Listen 10, 50
-        if self.current().type == TokenType.NUMBER:
+        if self.type == TokenType.NUMBER:
             # First number is the single timeout for reminder
-            timeout = int(self.current().value)
+            timeout = int(self.value)
             self.advance()
-            if self.current().type == TokenType.SYMBOL and self.current().value == ',':
+            if self.type == TokenType.SYMBOL and self.value == ',':
                 self.advance()
-                if self.current().type == TokenType.NUMBER:
+                if self.type == TokenType.NUMBER:
                     # Second number is the total silence duration before termination
-                    total_silence_timeout = int(self.current().value)
+                    total_silence_timeout = int(self.value)
                     self.advance()
         return ListenNode(timeout, total_silence_timeout)
     def parse_branch(self):
         self.expect(TokenType.KEYWORD, "Branch")
-        k = self.expect(TokenType.STRING).value
-        if self.current().type == TokenType.SYMBOL: self.advance()
-        return BranchNode(k, self.expect(TokenType.IDENTIFIER).value)
-    def parse_default(self): self.expect(TokenType.KEYWORD, "Default"); return DefaultNode(self.expect(TokenType.IDENTIFIER).value)
-    def parse_silence(self): self.expect(TokenType.KEYWORD, "Silence"); return SilenceNode(self.expect(TokenType.IDENTIFIER).value)
-    def parse_exit(self): self.expect(TokenType.KEYWORD, "Exit"); return ExitNode()
\ No newline at end of file
+        k = sys.intern(self.expect(TokenType.STRING))  # 同一关键词常在多个步骤重复
+        if self.type == TokenType.SYMBOL: self.advance()
+        return BranchNode(k, self.expect_name())
+    def parse_default(self): self.expect(TokenType.KEYWORD, "Default"); return DefaultNode(self.expect_name())
+    def parse_silence(self): self.expect(TokenType.KEYWORD, "Silence"); return SilenceNode(self.expect_name())
+    def parse_exit(self): self.expect(TokenType.KEYWORD, "Exit"); return ExitNode()
+    def parse_include(self): self.expect(TokenType.KEYWORD, "Include"); return IncludeNode(self.expect_name())
\ No newline at end of file
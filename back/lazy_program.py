@@ -0,0 +1,162 @@
+# 文件名: lazy_program.py
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, Iterator, Tuple, Union
+
+from compiler import compile_step, BranchTable, CompiledStep
+from interpreter import Lexer, Parser, GroupNode, StepNode, SyntaxError
+from matcher import KeywordMatcher
+from program_cache import decode_source, file_program_key
+
+# 一次扫描建立索引：字符串和注释整体跳过，其中出现的 Step/Group 不会被当作块的起点
+# 关键字之后的空白和注释、名字的边界与 Lexer 相同（str.isspace、str.isalnum），按字节匹配后对少数候选解码确认
+_BLOCK_RE = re.compile(rb'"[^"]*"|#[^\n]*|(Step|Group)')
+# str.isspace 为真的全部字符（UTF-8 编码）与注释
+_GAP_RE = re.compile(rb'(?:[\t-\r\x1c-\x20]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]'
+                     rb'|\xe2\x81\x9f|\xe3\x80\x80|#[^\n]*)*')
+_WORD_RE = re.compile(rb'[\w\x80-\xff]*')  # 候选名字：ASCII 标识符字符与全部多字节字符，解码后再按 Lexer 的规则截断
+_IDENT_TAIL = re.compile(r'\w*')  # 与 Lexer 相同：str.isalnum() 或 '_'
+
+def _is_ident_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+def scan_blocks(data: bytes) -> Iterator[Tuple[str, str, int, int]]:
+    """一次扫描找出每个顶层块，生成 (关键字, 名字, 块起点的字节偏移, 块起点的行号)"""
+    line, pos = 1, 0
+    for m in _BLOCK_RE.finditer(data):
+        if m.group(1) is None:
+            continue  # 字符串或注释
+        start, end = m.span()
+        # 关键字必须是一个完整的标识符：前后都不能紧跟标识符字符
+        if start and _is_ident_char(data[max(0, start - 4):start].decode('utf-8', 'ignore')[-1:] or ' '):
+            continue
+        if _is_ident_char(data[end:end + 4].decode('utf-8', 'ignore')[:1] or ' '):
+            continue
+        word = _WORD_RE.match(data, _GAP_RE.match(data, end).end()).group().decode('utf-8', 'replace')
+        if not word or not (word[0].isalpha() or word[0] == '_'):
+            continue  # 后面不是名字，Lexer 会报错，交给语法分析
+        line += data[pos:start].count(b'\n')
+        pos = start
+        yield m.group(1).decode('ascii'), _IDENT_TAIL.match(word).group(), start, line
+
+class LazyProgram(Mapping):
+    """
+    惰性加载的分派表（步骤名 -> CompiledStep），用于几百MB的脚本
+    - 用 mmap 映射脚本文件，构造时一次扫描建立 步骤名 -> 块起点 的索引（同名步骤以后者为准）
+    - 第一次访问某个步骤时才解码、分析并编译该块，结果放入容量为 max_steps 的LRU
+    - 分支组（Group）在建立索引时全部分析，相同的分支表在所有步骤间共用
+    - 常驻内存与活跃步骤数成正比，与脚本大小无关；块内的语法错误在访问该步骤时抛出
+    脚本需整体替换（写入新文件后改名），映射期间原地改写文件会使仍在使用旧版本的会话读取出错
+    """
+    def __init__(self, path: str, max_steps: int = 1024, policy: str = KeywordMatcher.ORDER,
+                 version: int = 0):
+        self.path = path
+        self.max_steps = max_steps
+        self.policy = policy
+        self.version = version
+        self._file = open(path, 'rb')  # 保持打开，用于检查文件是否被原地改写
+        self._stat = os.fstat(self._file.fileno())
+        # 空文件不能映射
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._stat.st_size else b""
+        self._index: Dict[str, int] = {}  # 步骤名 -> 块序号
+        self._groups: Dict[str, GroupNode] = {}  # 分支组名 -> 分支组
+        self._tables: Dict[tuple, BranchTable] = {}  # 分支表驻留表
+        self._starts = array('q')  # 块起点（字节偏移），按出现顺序
+        self._lines = array('l')   # 块起点的行号
+        self._cache: "OrderedDict[str, CompiledStep]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self._key = None  # 版本摘要，第一次用到时才计算（见 key）
+        self._build_index()
+
+    @property
+    def key(self) -> int:
+        """
+        版本摘要（与完整加载时的 program_key 相同）；只有共享会话存储编码会话时才需要，
+        第一次访问时从打开的文件分段读取计算，加载时不读完整个文件，也不让整个映射常驻内存
+        """
+        with self._lock:
+            if self._key is None:
+                self._key = file_program_key(self._file, self._stat.st_size)
+            return self._key
+
+    def _build_index(self):
+        groups: Dict[str, int] = {}  # 分支组名 -> 块序号；与步骤共用名字空间，同名块以后者为准
+        for keyword, name, start, line in scan_blocks(self._mm):
+            if keyword == "Group":
+                groups[name] = len(self._starts)
+                self._index.pop(name, None)
+            else:
+                self._index[name] = len(self._starts)
+                groups.pop(name, None)
+            self._starts.append(start)
+            self._lines.append(line)
+        for name, i in groups.items():
+            self._groups[name] = self._parse(name, i)
+
+    def _block(self, i: int) -> str:
+        # 改名替换不影响已映射的旧文件；原地改写则可能读到截断或混杂的内容
+        stat = os.fstat(self._file.fileno())
+        if (stat.st_size, stat.st_mtime_ns) != (self._stat.st_size, self._stat.st_mtime_ns):
+            raise RuntimeError(f"{self.path} 在映射期间被原地改写，请重新加载")
+        end = self._starts[i + 1] if i + 1 < len(self._starts) else len(self._mm)
+        return decode_source(self._mm[self._starts[i]:end])
+
+    def _parse(self, name: str, i: int) -> Union[StepNode, GroupNode]:
+        blocks = Parser(Lexer(self._block(i), self._lines[i])).parse_program().steps
+        if len(blocks) != 1 or blocks[0].name != name:
+            raise SyntaxError(f"Line {self._lines[i]}: 无法单独解析步骤 {name}")
+        return blocks[0]
+
+    def _load(self, name: str) -> CompiledStep:
+        return compile_step(self._parse(name, self._index[name]), self.policy, self._groups, self._tables)
+
+    def __getitem__(self, name: str) -> CompiledStep:
+        with self._lock:
+            step = self._cache.get(name)
+            if step is not None:
+                self._cache.move_to_end(name)
+                self.hits += 1
+                return step
+        if name not in self._index:
+            raise KeyError(name)
+        step = self._load(name)  # 在锁外分析，不阻塞其他会话
+        with self._lock:
+            self.misses += 1
+            self._cache[name] = step
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.max_steps:
+                self._cache.popitem(last=False)
+            while len(self._tables) > self.max_steps:  # 驻留表同样有界；已编译的步骤仍持有各自的分支表
+                del self._tables[next(iter(self._tables))]
+        return step
+
+    def __contains__(self, name) -> bool:
+        return name in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __del__(self):
+        # 最后一个会话结束、版本被回收时释放映射
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {"steps": len(self._index), "groups": len(self._groups), "cached": len(self._cache), "max_steps": self.max_steps,
+                "hits": self.hits, "misses": self.misses}
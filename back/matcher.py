@@ -0,0 +1,79 @@
+# 文件名: matcher.py
+from typing import Iterable, List, Optional
+
+class KeywordMatcher:
+    """
+    多关键词匹配（Aho-Corasick自动机），加载DSL时为每个步骤编译一次
+    一次扫描找出输入中出现的全部关键词，耗时只与输入长度有关，与关键词数量无关
+    多个关键词同时出现时按 policy 选择：
+    - "order"：声明顺序靠前者优先（与逐个判断 keyword in user_input 的结果一致）
+    - "longest"：最长者优先，等长时按声明顺序
+    """
+    ORDER, LONGEST = "order", "longest"
+
+    def __init__(self, keywords: Iterable[str], policy: str = ORDER):
+        if policy not in (self.ORDER, self.LONGEST):
+            raise ValueError(f"未知的匹配策略: {policy}")
+        self.policy = policy
+        self.keywords: List[str] = list(dict.fromkeys(keywords))  # 去重，保留首次出现的位置
+        if policy == self.ORDER:
+            ranks = list(range(len(self.keywords)))
+        else:
+            order = sorted(range(len(self.keywords)), key=lambda i: (-len(self.keywords[i]), i))
+            ranks = [0] * len(order)
+            for rank, i in enumerate(order):
+                ranks[i] = rank
+        self._build(ranks)
+
+    def _build(self, ranks: List[int]):
+        none = len(self.keywords)  # 表示"没有匹配"的秩
+        goto = [{}]
+        best = [none]  # 每个状态可匹配到的最优关键词（秩越小越优先）
+        for i, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    best.append(none)
+                state = nxt
+            best[state] = min(best[state], ranks[i])
+
+        # 按层(BFS)计算失败指针，并把失败链上的最优匹配合并到当前状态
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+                best[nxt] = min(best[nxt], best[fail[nxt]])
+                queue.append(nxt)
+
+        self._goto, self._fail, self._best = goto, fail, best
+        self._by_rank = [-1] * (none + 1)  # 秩 -> 关键词下标，"没有匹配"对应-1
+        for i, rank in enumerate(ranks):
+            self._by_rank[rank] = i
+
+    def match(self, text: str) -> Optional[str]:
+        """返回按策略选出的关键词，没有任何关键词出现时返回None"""
+        i = self.match_index(text)
+        return self.keywords[i] if i >= 0 else None
+
+    def match_index(self, text: str) -> int:
+        """返回选出的关键词在 keywords 中的下标，没有匹配时返回-1"""
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found = best[0]  # 空关键词出现在任何输入中
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if best[state] < found:
+                found = best[state]
+                if found == 0:
+                    break  # 已是最高优先级
+        return self._by_rank[found]
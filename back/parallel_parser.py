@@ -0,0 +1,86 @@
+# 文件名: parallel_parser.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from interpreter import ProgramNode, LexicalError, SyntaxError
+from lazy_program import scan_blocks
+from parse_worker import Chunk, parse_chunk_steps, parse_chunk_or_error
+from program_cache import decode_step
+
+class DuplicateStepError(SyntaxError): pass # 多个块（或多个文件）定义了同名步骤或分支组
+
+def split_chunks(path: str, data: bytes, count: int) -> Tuple[List[Chunk], List[Tuple[str, int]]]:
+    """
+    把一个文件切成大小相近的至多 count 段，切点都在块的起点
+    同时返回每个块的 (名字, 行号)，用于检查重名
+    """
+    blocks = list(scan_blocks(data))
+    target = max(len(data) // max(count, 1), 1)
+    chunks, start, line = [], 0, 1
+    for keyword, _, offset, block_line in blocks[1:]:
+        if offset - start >= target and len(chunks) < count - 1:
+            chunks.append(Chunk(path, data[start:offset], line, keyword))
+            start, line = offset, block_line
+    chunks.append(Chunk(path, data[start:], line, ""))
+    return chunks, [(name, block_line) for _, name, _, block_line in blocks]
+
+def find_duplicates(blocks: Iterable[Tuple[str, str, int]]) -> Optional[str]:
+    """blocks 为 (文件, 步骤名, 行号)，返回第一处重名的说明"""
+    seen: Dict[str, Tuple[str, int]] = {}
+    for path, name, line in blocks:
+        if name in seen:
+            first_path, first_line = seen[name]
+            return f"{path} Line {line}: 步骤 {name} 重复定义（首次定义于 {first_path} Line {first_line}）"
+        seen[name] = (path, line)
+    return None
+
+def parse_files(paths: Sequence[str], workers: Optional[int] = None, chunks_per_worker: int = 4,
+                allow_duplicates: bool = False) -> ProgramNode:
+    """并行分析一个或多个DSL文件，见 parse_sources"""
+    sources = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            sources.append((path, f.read()))
+    return parse_sources(sources, workers, chunks_per_worker, allow_duplicates)
+
+def parse_sources(sources: Sequence[Tuple[str, bytes]], workers: Optional[int] = None, chunks_per_worker: int = 4,
+                  allow_duplicates: bool = False) -> ProgramNode:
+    """
+    并行分析一个或多个DSL源码 (文件路径, 内容)，按文件和步骤顺序合并为一个 ProgramNode
+    - 每个文件在顶层块（Step/Group）边界处切段，各段在进程池中独立做词法和语法分析
+    - 错误信息中的行号是原文件中的行号；多个文件时前面加上文件路径；报告位置最靠前的错误
+    - 默认不允许同名步骤（allow_duplicates=True 时与 Parser 一致，由 compile_program 取后者）
+    workers 为1时在当前进程中逐段分析；进程池只在本次调用期间存在，工作进程只执行 parse_worker 中的函数
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks, blocks = [], []
+    for path, data in sources:
+        file_chunks, file_blocks = split_chunks(path, data, workers * chunks_per_worker)
+        chunks.extend(file_chunks)
+        blocks.extend((path, name, line) for name, line in file_blocks)
+
+    steps = []
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            try:
+                steps.extend(parse_chunk_steps(chunk))
+            except (LexicalError, SyntaxError) as e:
+                raise _with_path(e, chunk, len(sources))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_chunk_or_error, chunks, chunksize=1))
+        for chunk, (encoded, error) in zip(chunks, results):
+            if error is not None:
+                raise _with_path(error, chunk, len(sources))
+            steps.extend(decode_step(step) for step in encoded)
+
+    if not allow_duplicates:
+        duplicate = find_duplicates(blocks)
+        if duplicate:
+            raise DuplicateStepError(duplicate)
+    return ProgramNode(steps)
+
+def _with_path(error: Exception, chunk: Chunk, files: int) -> Exception:
+    # 多个文件时在错误信息前加上文件路径
+    return type(error)(f"{chunk.path}: {error}") if files > 1 else error
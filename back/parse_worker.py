@@ -0,0 +1,42 @@
+# 文件名: parse_worker.py
+# 并行语法分析在工作进程中执行的部分。工作进程按模块名导入这里的函数，
+# 本模块只依赖 interpreter 与 program_cache 的编码函数（二者只依赖标准库），不会导入服务端的其他模块
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from interpreter import Lexer, Parser, StepNode, GroupNode, TokenType, LexicalError, SyntaxError
+from program_cache import decode_source, encode_step
+
+class Chunk(NamedTuple):
+    """按顶层块（Step/Group）边界切出的一段源码"""
+    path: str
+    data: bytes
+    line: int   # 第一行在原文件中的行号
+    more: str   # 紧随其后的块关键字（Step/Group），最后一段为空
+
+def parse_chunk_steps(chunk: Chunk) -> List[Union[StepNode, GroupNode]]:
+    """
+    分析一段源码；段尾补上原本紧随其后的块关键字并分析到它为止，使段尾的语法错误与整体分析时完全一致
+    """
+    text = decode_source(chunk.data)
+    end, stop = len(text), None
+    def tokens():
+        nonlocal stop
+        for token, offset in Lexer(text + chunk.more, chunk.line).tokens_with_offsets():
+            if offset == end and chunk.more:
+                stop = token
+            yield token
+    parser, steps = Parser(tokens()), []
+    while parser.current().type != TokenType.EOF and parser.current() is not stop:
+        steps.append(parser.parse_block())
+    return steps
+
+def parse_chunk(chunk: Chunk) -> tuple:
+    """在工作进程中分析一段源码，返回编码后的步骤（比 StepNode 对象更快地传回主进程）"""
+    return tuple(encode_step(step) for step in parse_chunk_steps(chunk))
+
+def parse_chunk_or_error(chunk: Chunk) -> Tuple[tuple, Optional[Exception]]:
+    """错误作为结果返回，这样可以按段的顺序报告最靠前的错误，而不是最先完成的"""
+    try:
+        return parse_chunk(chunk), None
+    except (LexicalError, SyntaxError) as e:
+        return (), e
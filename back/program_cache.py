@@ -0,0 +1,134 @@
+# 文件名: program_cache.py
+import hashlib
+import marshal
+import os
+from importlib.util import MAGIC_NUMBER
+from typing import BinaryIO, Callable, Iterable, Optional, Tuple, Union
+
+from interpreter import (Lexer, Parser, ProgramNode, StepNode, GroupNode, SpeakNode, ListenNode, BranchNode,
+                         DefaultNode, ExitNode, SilenceNode, IncludeNode, INTERPRETER_VERSION)
+
+CACHE_FORMAT = b"DSLC2"  # 缓存文件格式版本，编码方式变化时修改
+
+# 动作节点 <-> (类型码, 参数...) 的紧凑编码
+_ENCODERS = (
+    (SpeakNode, lambda a: (0, a.message)),
+    (ListenNode, lambda a: (1, a.timeout, a.total_silence_timeout)),
+    (BranchNode, lambda a: (2, a.keyword, a.step_name)),
+    (DefaultNode, lambda a: (3, a.step_name)),
+    (ExitNode, lambda a: (4,)),
+    (SilenceNode, lambda a: (5, a.step_name)),
+    (IncludeNode, lambda a: (6, a.group_name)),
+)
+_DECODERS = (SpeakNode, ListenNode, BranchNode, DefaultNode, ExitNode, SilenceNode, IncludeNode)
+
+def source_key(source: bytes) -> bytes:
+    """缓存键：源码内容 + 解释器版本 + 缓存格式 + marshal 所属的Python版本"""
+    return _source_digest(len(source), (source,))
+
+def _source_digest(size: int, chunks: Iterable[bytes]) -> bytes:
+    # 源码可以分段给出（size 为总长度），结果与整体计算相同
+    digest = hashlib.sha256()
+    for part in (CACHE_FORMAT, INTERPRETER_VERSION.encode(), MAGIC_NUMBER):
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    digest.update(size.to_bytes(8, 'little'))
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.digest()
+
+def program_key(source) -> int:
+    """程序版本的摘要：源码缓存键的前8字节，各工作进程加载同一脚本时相同"""
+    return int.from_bytes(source_key(source)[:8], 'little')
+
+def file_program_key(f: BinaryIO, size: int, chunk_size: int = 1 << 20) -> int:
+    """从已打开的文件分段读取计算 program_key，不把整个文件读入内存，也不经过映射"""
+    f.seek(0)
+    chunks = iter(lambda: f.read(chunk_size), b"")
+    return int.from_bytes(_source_digest(size, chunks)[:8], 'little')
+
+_ENCODER_MAP = dict(_ENCODERS)
+
+def encode_step(step: Union[StepNode, GroupNode]) -> tuple:
+    """步骤的值表示：(步骤名, 动作编码元组)，可直接比较两个步骤是否相同；分支组后面多一个标记"""
+    actions = tuple(_ENCODER_MAP[type(a)](a) for a in step.actions)
+    return (step.name, actions, "Group") if isinstance(step, GroupNode) else (step.name, actions)
+
+def decode_source(source: bytes) -> str:
+    """与以文本模式读取文件的结果一致（统一换行符）"""
+    return source.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+def dumps_program(program: ProgramNode) -> bytes:
+    """把AST编码为嵌套元组后用 marshal 序列化；驻留的步骤名在文件中只存一份"""
+    return marshal.dumps(tuple(encode_step(step) for step in program.steps))
+
+def decode_step(encoded: tuple) -> Union[StepNode, GroupNode]:
+    """encode_step 的逆操作"""
+    node = GroupNode if len(encoded) == 3 else StepNode
+    return node(encoded[0], [_DECODERS[a[0]](*a[1:]) for a in encoded[1]])
+
+def loads_program(data: bytes) -> ProgramNode:
+    return ProgramNode([decode_step(step) for step in marshal.loads(data)])
+
+class ProgramCache:
+    """
+    编译结果缓存：解析成功后把AST写入缓存目录，文件名由源码哈希决定
+    之后的启动（包括多进程下的其他worker）源码未变时直接读取，跳过词法和语法分析
+    缓存缺失、哈希不符或文件损坏时回退到完整解析
+    """
+    def __init__(self, cache_dir: str, parse: Optional[Callable[[str, bytes], ProgramNode]] = None):
+        self.cache_dir = cache_dir
+        self.parse = parse  # 未命中时的分析方式，参数为 (文件路径, 源码)，如 parallel_parser.parse_sources；默认流式分析
+        self.hits = self.misses = 0
+
+    def path_for(self, key: bytes) -> str:
+        return os.path.join(self.cache_dir, key.hex()[:32] + ".dslc")
+
+    def get(self, key: bytes) -> Optional[ProgramNode]:
+        try:
+            with open(self.path_for(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        header = CACHE_FORMAT + key
+        if not data.startswith(header):
+            return None
+        try:
+            return loads_program(data[len(header):])
+        except (ValueError, EOFError, TypeError, IndexError):
+            return None  # 文件损坏，按未命中处理
+
+    def put(self, key: bytes, program: ProgramNode):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(key)
+        tmp = f"{path}.{os.getpid()}.tmp"  # 先写临时文件再原子替换，并发启动的worker不会读到半个文件
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(CACHE_FORMAT + key + dumps_program(program))
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def load(self, dsl_path: str) -> Tuple[ProgramNode, bool]:
+        """读取并解析DSL文件，返回 (AST, 是否命中缓存)；解析错误原样抛出"""
+        with open(dsl_path, 'rb') as f:
+            return self.load_source(dsl_path, f.read())
+
+    def load_source(self, dsl_path: str, source: bytes) -> Tuple[ProgramNode, bool]:
+        """同 load，源码已由调用方读出"""
+        key = source_key(source)
+        program = self.get(key)
+        if program is not None:
+            self.hits += 1
+            return program, True
+        self.misses += 1
+        if self.parse is not None:
+            program = self.parse(dsl_path, source)
+        else:
+            program = Parser(Lexer(decode_source(source))).parse_program()
+        self.put(key, program)
+        return program, False
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "cache_dir": self.cache_dir}
@@ -0,0 +1,190 @@
+# 文件名: program_registry.py
+import os
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from compiler import compile_program, CompiledStep
+from interpreter import ProgramNode
+from matcher import KeywordMatcher
+from incremental import IncrementalProgram, StepDiff
+from lazy_program import LazyProgram
+from program_cache import ProgramCache, decode_source, program_key, source_key
+from vm import Bytecode
+
+class ProgramValidationError(Exception): pass # 新脚本解析成功但无法运行（缺少入口或跳转目标）
+
+def validate_program(steps: Dict[str, CompiledStep], entry: str = "welcome") -> List[str]:
+    """
+    缺少入口步骤时抛出 ProgramValidationError
+    返回指向未定义步骤的 Branch/Default/Silence 目标作为警告（运行时按"步骤不存在"处理，现有脚本中也有）
+    """
+    if entry not in steps:
+        raise ProgramValidationError(f"缺少入口步骤 {entry}")
+    warnings = []
+    for step in steps.values():
+        for target in list(step.branches.values()) + [step.default_target, step.silence_target]:
+            if target is not None and target not in steps:
+                warnings.append(f"步骤 {step.name} 跳转到未定义的步骤 {target}")
+    return warnings
+
+def diff_steps(old: Dict[str, CompiledStep], new: Dict[str, CompiledStep]) -> StepDiff:
+    """比较两个分派表（不比较 matcher，它由 branches 决定）"""
+    return StepDiff(
+        added=[name for name in new if name not in old],
+        removed=[name for name in old if name not in new],
+        modified=[name for name in new if name in old and new[name][:-1] != old[name][:-1]],
+    )
+
+class ProgramRegistry:
+    """
+    DSL程序的版本登记，支持不停机热加载
+    - reload()：在后台线程解析、编译、校验新脚本，全部成功后原子替换 current；失败时保留旧版本
+      重新加载时只重新分析改动过的 Step 块（见 IncrementalProgram）
+    - 会话在创建时取得 current 并一直使用它，新旧版本互不影响
+    - 只保存各版本的弱引用，旧版本的最后一个会话结束后即被回收
+    - watch(interval)：轮询脚本修改时间，变化后自动 reload；refresh()：修改过时立即加载
+    - 每个版本是一个 Bytecode（会话创建时绑定，最后一个会话结束后随之回收）
+    - lazy_steps > 0 时版本的步骤来自 LazyProgram，按需分析
+    """
+    def __init__(self, dsl_path: str, cache: ProgramCache, policy: str = KeywordMatcher.ORDER,
+                 on_load: Optional[Callable[[ProgramNode], None]] = None, lazy_steps: int = 0):
+        self.dsl_path = dsl_path
+        self.lazy_steps = lazy_steps  # 大于0时使用惰性模式，值为每个版本缓存的已分析步骤数
+        self.cache = cache
+        self.policy = policy
+        self.on_load = on_load  # 新版本生效前的回调，如用新关键词训练本地分类器
+        self.current: Optional[Bytecode] = None
+        self._versions = weakref.WeakValueDictionary()  # 版本号 -> Bytecode
+        self._next_version = 1
+        self._mtime = None
+        self._lock = threading.Lock()  # 同一时间只进行一次加载
+        self._refresh_lock = threading.Lock()  # refresh 的检查与加载整体串行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dsl-reload")
+        self._watcher = None
+        self.loads = self.failures = 0
+        self.last_error: Optional[str] = None
+        self.warnings: List[str] = []  # 当前版本的校验警告
+        self._incremental: Optional[IncrementalProgram] = None
+        self.last_diff: Optional[StepDiff] = None  # 最近一次增量加载的步骤变化
+
+    def load(self) -> Bytecode:
+        """同步加载脚本并切换为当前版本；解析或校验失败时抛出异常，current 不变"""
+        with self._lock:
+            try:
+                self._mtime = os.path.getmtime(self.dsl_path)  # 失败时也记下，watch 不会反复加载同一个坏文件
+                if self.lazy_steps:
+                    steps = self._load_lazy()
+                    version = Bytecode(steps, self._next_version)  # 摘要在第一次用到时计算
+                    warnings = []
+                else:
+                    with open(self.dsl_path, 'rb') as f:
+                        source = f.read()
+                    if self.current is None:
+                        program, _ = self.cache.load_source(self.dsl_path, source)
+                        steps = compile_program(program, self.policy)
+                    else:
+                        program, steps = self._load_incremental(source)
+                    warnings = validate_program(steps)
+                    if self.on_load:
+                        self.on_load(program)
+                    version = Bytecode(steps, self._next_version, key=program_key(source))
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                raise
+            self._next_version += 1
+            self._versions[version.version] = version
+            self.current = version  # 单次赋值，请求线程看到的要么是旧版本要么是新版本
+            self.loads += 1
+            self.last_error = None
+            self.warnings = warnings
+            return version
+
+    def _load_lazy(self) -> LazyProgram:
+        """
+        惰性模式：只建立步骤索引，步骤在第一次访问时才分析
+        不做整体校验，也不用Branch关键词训练本地分类器（否则要分析全部步骤）
+        """
+        steps = LazyProgram(self.dsl_path, self.lazy_steps, self.policy, self._next_version)
+        if "welcome" not in steps:
+            steps.close()
+            raise ProgramValidationError("缺少入口步骤 welcome")
+        return steps
+
+    def _load_incremental(self, source: bytes) -> Tuple[ProgramNode, Dict[str, CompiledStep]]:
+        """
+        重新加载时只分析改动过的 Step 块；第一次重新加载时完整解析一遍并建立块索引
+        返回的分派表是副本，进行中的会话持有的旧版本不受影响
+        """
+        if self._incremental is None:
+            self._incremental = IncrementalProgram(decode_source(source), self.policy)
+            self.last_diff = diff_steps(self.current, self._incremental.compiled)
+        else:
+            self.last_diff = self._incremental.update(decode_source(source))
+        program = self._incremental.program
+        self.cache.put(source_key(source), program)
+        return program, dict(self._incremental.compiled)
+
+    def reload(self) -> Future:
+        """在后台线程中加载，返回 Future（结果为新的 Bytecode 或异常）"""
+        return self._executor.submit(self.load)
+
+    def refresh(self):
+        """
+        脚本在磁盘上已被修改时同步加载（共享会话存储遇到其他工作进程热加载的版本时调用）
+        多个线程同时调用只加载一次；加载失败时保留当前版本
+        """
+        with self._refresh_lock:
+            if not self.changed():
+                return
+            try:
+                version = self.load()
+                print(f"DSL脚本已随其他工作进程重新加载，版本 {version.version}，共 {len(version)} 个步骤。")
+            except Exception as e:
+                print(f"DSL脚本重新加载失败，继续使用旧版本: {e}")
+
+    def changed(self) -> bool:
+        try:
+            return os.path.getmtime(self.dsl_path) != self._mtime
+        except OSError:
+            return False
+
+    def watch(self, interval: float):
+        """启动守护线程，每 interval 秒检查一次脚本是否被修改"""
+        if self._watcher is not None:
+            return
+        stop = threading.Event()
+        def poll():
+            while not stop.wait(interval):
+                if self.changed():
+                    try:
+                        version = self.load()
+                        print(f"DSL脚本已重新加载，版本 {version.version}，共 {len(version)} 个步骤。")
+                    except Exception as e:
+                        print(f"DSL脚本重新加载失败，继续使用旧版本: {e}")
+        self._watcher = (threading.Thread(target=poll, name="dsl-watcher", daemon=True), stop)
+        self._watcher[0].start()
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher[1].set()
+            self._watcher = None
+        self._executor.shutdown(wait=False)
+
+    def live_versions(self) -> List[int]:
+        """仍被当前版本或会话引用的版本号"""
+        return sorted(self._versions.keys())
+
+    def stats(self) -> dict:
+        return {
+            "current_version": self.current.version if self.current is not None else None,
+            "live_versions": self.live_versions(),
+            "loads": self.loads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "warnings": self.warnings,
+            "last_diff": self.last_diff._asdict() if self.last_diff is not None else None,
+            "lazy": self.current.stats() if self.current is not None else None,
+        }
@@ -0,0 +1,196 @@
+# 文件名: resilience.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional
+
+from LLMClient import LLMError
+
+class CircuitOpenError(LLMError): pass # 熔断期间不再请求上游
+
+class LatencyTracker:
+    """记录最近 window 次请求的耗时，用于计算分位数"""
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples  # 样本不足时不给出分位数
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class CircuitBreaker:
+    """
+    熔断器
+    - closed：正常请求，统计最近 window 次结果
+    - open：错误率达到 failure_threshold 后打开，cooldown 秒内直接拒绝
+    - half_open：冷却结束后只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: float = 0.5, window: int = 20,
+                 min_requests: int = 5, cooldown: float = 30):
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # True 表示成功
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0  # 累计打开次数
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self.state, self._probing = self.HALF_OPEN, False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, success: bool):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(success)
+            if len(self._outcomes) >= self.min_requests and self.error_rate() >= self.failure_threshold:
+                self._open()
+
+    def snapshot(self) -> tuple:
+        """(状态, 累计打开次数, 错误率)，在锁内一次读出"""
+        with self._lock:
+            return self.state, self.opened, self.error_rate()
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+class ResilientIntentClient:
+    """
+    上游保护层
+    - 自适应截止时间：最近请求耗时的 p99 * deadline_factor，限制在 [min_timeout, max_timeout]
+    - 对冲请求：超过 p95 仍未返回时再发一个相同请求，取先返回的结果
+    - 熔断：错误率过高时直接抛出 CircuitOpenError，调用方按 Default 分支处理
+    后端出错需要抛出异常（LLMClient 使用 raise_errors=True），返回None视为正常的"无匹配"
+    """
+    def __init__(self, backend, min_timeout: float = 1.0, max_timeout: float = 10.0,
+                 deadline_factor: float = 1.5, hedge: bool = True,
+                 tracker: Optional[LatencyTracker] = None, breaker: Optional[CircuitBreaker] = None,
+                 max_workers: int = 8):
+        self.backend = backend
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.deadline_factor = deadline_factor
+        self.hedge = hedge
+        self.tracker = tracker or LatencyTracker()
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._stats_lock = threading.Lock()  # 多个会话线程同时更新计数
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0         # 发出的对冲请求数
+        self.hedge_wins = 0     # 对冲请求先返回的次数
+        self.short_circuits = 0 # 熔断期间被拒绝的请求数
+
+    def deadline(self) -> float:
+        p99 = self.tracker.percentile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return min(max(p99 * self.deadline_factor, self.min_timeout), self.max_timeout)
+
+    def hedge_delay(self) -> Optional[float]:
+        return self.tracker.percentile(0.95) if self.hedge else None
+
+    def recognize_intent(self, user_input: str, available_intents: List[str]) -> Optional[str]:
+        if not self.breaker.allow():
+            self._count("short_circuits")
+            raise CircuitOpenError("上游错误率过高，已熔断")
+        self._count("requests")
+        started = time.monotonic()
+        deadline = started + self.deadline()
+        hedge_at = self.hedge_delay()
+        calls = [self._executor.submit(self.backend.recognize_intent, user_input, available_intents)]
+        pending = set(calls)
+        error: Optional[BaseException] = None
+
+        while pending:
+            wait_until = deadline
+            if hedge_at is not None and len(calls) == 1:
+                wait_until = min(deadline, started + hedge_at)
+            done, pending = wait(pending, timeout=max(0.0, wait_until - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    self._record(started, True)
+                    self._count("successes", "hedge_wins" if f is not calls[0] else None)
+                    return f.result()
+                error = f.exception()
+            if done:
+                continue
+            if time.monotonic() >= deadline:
+                break
+            if len(calls) == 1:
+                # 超过p95仍未返回，发出对冲请求
+                calls.append(self._executor.submit(self.backend.recognize_intent, user_input, available_intents))
+                pending.add(calls[-1])
+                self._count("hedges")
+
+        self._record(started, False)
+        self._count("failures", "timeouts" if pending else None)
+        if pending:
+            raise LLMError(f"请求超时({deadline - started:.2f}s)")
+        raise LLMError(f"上游请求失败: {error}")
+
+    def _record(self, started: float, success: bool):
+        # 超时也记录耗时，上游整体变慢时截止时间会随之放宽
+        self.tracker.record(time.monotonic() - started)
+        self.breaker.record(success)
+
+    def _count(self, *names: Optional[str]):
+        with self._stats_lock:
+            for name in names:
+                if name is not None:
+                    setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counters = {name: getattr(self, name) for name in
+                        ("requests", "successes", "failures", "timeouts", "hedges", "hedge_wins", "short_circuits")}
+        state, opened, error_rate = self.breaker.snapshot()
+        return {
+            **counters,
+            "breaker_state": state,
+            "breaker_opened": opened,
+            "error_rate": error_rate,
+            "deadline": self.deadline(),
+            "p50": self.tracker.percentile(0.5),
+            "p95": self.tracker.percentile(0.95),
+            "p99": self.tracker.percentile(0.99),
+        }
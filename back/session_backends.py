@@ -0,0 +1,398 @@
+# 文件名: session_backends.py
+import math
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from vm import Bytecode, DialogueVM, MISSING
+try:
+    import redis  # 可选依赖：仅 RedisSessionStore 需要
+except ImportError:
+    redis = None
+
+# 会话状态的二进制编码：程序版本摘要（Bytecode.key）、步骤编号（小于0时为 NO_STEP/MISSING，否则为0并在后面跟步骤名）、
+# 静默计数、两个时间戳、静默截止时间（没有当前步骤时为 -inf）
+_HEADER = struct.Struct('<Qbiddd')
+
+def encode_session(vm: DialogueVM) -> bytes:
+    """
+    把会话状态编码为 37 字节 + 步骤名（UTF-8）
+    共享存储中按步骤名而不是编号保存，任一加载了同一版本的工作进程都能在自己的程序上恢复会话
+    """
+    start, deadline = vm.total_silence_start_time, vm.next_deadline()
+    header = _HEADER.pack(vm.program.key, min(vm.step, 0), vm.silence_count, vm.last_interaction_time,
+                          math.nan if start is None else start, -math.inf if deadline is None else deadline)
+    return header + vm.program.names[vm.step].encode('utf-8') if vm.step >= 0 else header
+
+def decode_session(data: bytes, program: Bytecode, llm_client=None) -> DialogueVM:
+    """在 program 上恢复会话；步骤在该程序中不存在时按"步骤不存在"处理（版本由调用方按 session_program 选择）"""
+    _, step, silence_count, last, start, _ = _HEADER.unpack_from(data)
+    vm = DialogueVM(llm_client, program)
+    vm.step = program.ids.get(data[_HEADER.size:].decode('utf-8'), MISSING) if step == 0 else step
+    vm.silence_count = silence_count
+    vm.last_interaction_time = last
+    vm.total_silence_start_time = None if math.isnan(start) else start
+    return vm
+
+# 比较后交换：键的值仍是 ARGV[1] 时写入 ARGV[2]（过期时间为 ARGV[3] 毫秒时间戳），ARGV[2] 为空时删除
+_CAS_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+if ARGV[2] == '' then return redis.call('DEL', KEYS[1]) end
+redis.call('SET', KEYS[1], ARGV[2], 'PXAT', ARGV[3])
+return 1
+"""
+
+def session_program(data: bytes) -> int:
+    """不解码整个会话，只取会话所用程序版本的摘要"""
+    return _HEADER.unpack_from(data)[0]
+
+def session_time(data: bytes) -> float:
+    """不解码整个会话，只取 last_interaction_time"""
+    return _HEADER.unpack_from(data)[3]
+
+def session_deadline(data: bytes) -> float:
+    """不解码整个会话，只取编码时算好的静默截止时间"""
+    return _HEADER.unpack_from(data)[5]
+
+class _Pending:
+    """等待合并执行的一项操作"""
+    __slots__ = ('item', 'done', 'result', 'error')
+
+    def __init__(self, item):
+        self.item = item
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class BatchQueue:
+    """
+    把多个请求线程的操作合并为一批执行（组提交）
+    - 后台线程每次取出当前排队的全部操作（最多 max_batch 项）交给 flush，一批只有一次往返或一次提交
+    - 不额外等待凑批：执行上一批期间到达的操作自然组成下一批，空闲时单个操作立即执行
+    - 调用方阻塞到所在批次完成，拿到自己的结果；flush 抛出的异常交给这一批的每个调用方
+    """
+    def __init__(self, flush: Callable[[list], Sequence], max_batch: int = 256, name: str = "session-batch"):
+        self.flush = flush  # 操作列表 -> 对齐的结果列表
+        self.max_batch = max_batch
+        self.name = name
+        self._items: List[_Pending] = []
+        self._cond = threading.Condition()
+        self._worker = None
+        self.batches = 0  # 已执行的批次数
+        self.items = 0    # 已执行的操作数
+
+    def submit(self, item):
+        pending = _Pending(item)
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+            self._items.append(pending)
+            self._cond.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def counts(self) -> Tuple[int, int]:
+        """(已执行的批次数, 已执行的操作数)"""
+        with self._cond:
+            return self.batches, self.items
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                batch, self._items = self._items[:self.max_batch], self._items[self.max_batch:]
+            try:
+                results = self.flush([pending.item for pending in batch])
+            except Exception as e:
+                print(f"[Session] 批量操作失败: {e}")
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            with self._cond:  # 计数器由 stats 在其他线程中读取
+                self.batches += 1
+                self.items += len(batch)
+            for pending, result in zip(batch, results):
+                pending.result = result
+                pending.done.set()
+
+class SharedSessionStore:
+    """
+    多个工作进程共享的会话存储，接口与 SessionStore 相同（put/get/update/remove/sweep/stats）
+    - 会话以 encode_session 的紧凑编码保存，编码中带有程序版本的摘要；get 时在同一版本上恢复，
+      热加载后进行中的会话继续使用开始时的版本（与 SessionStore 相同）
+    - 本进程为最近用过的 max_versions 个版本保持引用；会话的版本不在其中时先调用 refresh
+      （脚本已被修改、另一个工作进程已热加载时在本进程中加载同一版本），仍然没有时
+      不在其他版本上按步骤名猜测，get 返回None，按会话已失效处理（计入 stale）
+    - 写回按比较后交换执行：update/remove 只在会话仍是本线程 get 时读到的状态时生效，
+      其他工作进程在此期间处理过同一会话时返回False（计入 conflicts），由调用方在最新状态上重新处理
+    - 并发请求的读和写分别经 BatchQueue 合并：读合并为一次批量查询，写合并为一次事务提交
+    - 计数器（created/ended/expired/evicted）只统计本进程的操作
+    子类实现 _read_many(ids) -> [编码或None]、_write_many(ops) -> [结果]、sweep() 和 _count()
+    写操作为 ("put"|"update", 会话ID, last_interaction_time, 编码, 旧编码) 或 ("remove", 会话ID, 旧编码)，
+    旧编码为None时不比较
+    """
+    def __init__(self, programs: Callable[[], Bytecode], max_sessions: int = 100000, ttl: float = 1800,
+                 clock: Callable[[], float] = time.time, llm_client=None, max_batch: int = 256,
+                 max_versions: int = 4, refresh: Optional[Callable[[], None]] = None):
+        self.programs = programs  # 返回当前程序版本，如 lambda: registry.current
+        self.refresh = refresh    # 遇到本进程没有的版本时调用，如 registry.refresh（脚本已修改时重新加载）
+        self._snapshots = threading.local()  # 本线程最近一次 get 读到的 (会话ID, 编码)，写回时与存储中的比较
+        self.max_versions = max_versions
+        self._versions: "OrderedDict[int, Bytecode]" = OrderedDict()  # 版本摘要 -> 程序，最近用过的在末尾
+        self._lock = threading.Lock()  # 保护版本表和计数器（请求线程与清理线程同时更新）
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self.llm_client = llm_client
+        self._reads = BatchQueue(self._read_many, max_batch, "session-read")
+        self._writes = BatchQueue(self._write_many, max_batch, "session-write")
+        self._sweeper = None
+        self.created = self.ended = self.expired = self.evicted = self.stale = self.conflicts = 0
+
+    def _pin(self, program: Bytecode):
+        """记下本进程用过的程序版本，旧版本在热加载后仍能恢复进行中的会话"""
+        with self._lock:
+            self._versions[program.key] = program
+            self._versions.move_to_end(program.key)
+            while len(self._versions) > self.max_versions:
+                self._versions.popitem(last=False)
+
+    def _program(self, key: int) -> Optional[Bytecode]:
+        current = self.programs()
+        self._pin(current)  # 当前版本总是可用；热加载后它成为旧版本时仍保留
+        if current.key == key:
+            return current
+        with self._lock:
+            program = self._versions.get(key)
+        if program is None and self.refresh is not None:
+            self.refresh()  # 会话可能开始于其他工作进程热加载的新版本
+            current = self.programs()
+            if current.key == key:
+                self._pin(current)
+                return current
+        return program
+
+    def _add(self, counter: str, n: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def put(self, session_id: str, vm: DialogueVM):
+        self._pin(vm.program)
+        self._writes.submit(("put", session_id, vm.last_interaction_time, encode_session(vm), None))
+        self._add("created")
+
+    def _read(self, session_id: str) -> Optional[bytes]:
+        data = self._reads.submit(session_id)
+        if data is None:
+            return None
+        if self.clock() - session_time(data) >= self.ttl:
+            if self._writes.submit(("remove", session_id, None)):
+                self._add("expired")
+            return None
+        return data
+
+    def get(self, session_id: str) -> Optional[DialogueVM]:
+        """载入会话；不存在、已过期或所用的程序版本在本进程中已不可用时返回None"""
+        data = self._read(session_id)
+        if data is None:
+            return None
+        program = self._program(session_program(data))
+        if program is None:
+            self._add("stale")
+            return None
+        self._snapshots.read = (session_id, data)
+        return decode_session(data, program, self.llm_client)
+
+    def _expected(self, session_id: str) -> Optional[bytes]:
+        """本线程 get 该会话时读到的编码（写回时比较用），用过即清除"""
+        read, self._snapshots.read = getattr(self._snapshots, "read", None), None
+        return read[1] if read is not None and read[0] == session_id else None
+
+    def _commit(self, op: tuple) -> bool:
+        done = self._writes.submit(op)
+        if not done and op[-1] is not None:
+            self._add("conflicts")
+        return done
+
+    def deadline(self, session_id: str) -> Optional[float]:
+        """会话的静默截止时间，只读编码头部，不在程序上恢复会话"""
+        data = self._read(session_id)
+        return None if data is None else session_deadline(data)
+
+    def update(self, session_id: str, vm: DialogueVM) -> bool:
+        """写回会话状态；会话在处理期间已被移除或被其他工作进程修改时不写入，返回False"""
+        return self._commit(("update", session_id, vm.last_interaction_time, encode_session(vm),
+                             self._expected(session_id)))
+
+    def remove(self, session_id: str) -> bool:
+        """对话正常结束时移除；条件与 update 相同"""
+        removed = self._commit(("remove", session_id, self._expected(session_id)))
+        if removed:
+            self._add("ended")
+        return removed
+
+    def start_sweeper(self, interval: float):
+        if self._sweeper is not None:
+            return
+        stop = threading.Event()
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[Session] 清理过期会话失败: {e}")
+        self._sweeper = (threading.Thread(target=run, name="session-sweeper", daemon=True), stop)
+        self._sweeper[0].start()
+
+    def stop(self):
+        if self._sweeper is not None:
+            self._sweeper[1].set()
+            self._sweeper = None
+
+    def __contains__(self, session_id) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        return self._count()
+
+    def _stats_size(self) -> Optional[int]:
+        """stats 中的会话数；计数代价高的后端返回None"""
+        return len(self)
+
+    def stats(self) -> dict:
+        size = self._stats_size()
+        with self._lock:
+            counters = {
+                "created": self.created,
+                "ended": self.ended,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "stale": self.stale,
+                "conflicts": self.conflicts,
+                "versions": len(self._versions),
+            }
+        (read_batches, reads), (write_batches, writes) = self._reads.counts(), self._writes.counts()
+        batches = {"read_batches": read_batches, "reads": reads, "write_batches": write_batches, "writes": writes}
+        return {"backend": type(self).__name__, "size": size, "max_sessions": self.max_sessions, "ttl": self.ttl,
+                **counters, **batches}
+
+class SQLiteSessionStore(SharedSessionStore):
+    """
+    本机多进程共享的会话存储：WAL 模式的 SQLite 文件，读写互不阻塞
+    - 一批写操作在一个事务中提交；一批读操作是一次 IN 查询；带旧编码的写操作在 WHERE 中比较 state
+    - 过期与容量上限由 sweep 执行：按 last 索引删除过期会话，超出 max_sessions 时删除最久没有交互的会话
+    """
+    def __init__(self, path: str, programs: Callable[[], Bytecode], **kwargs):
+        self.path = path
+        self._local = threading.local()  # 每个线程一个连接
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions "
+                         "(id TEXT PRIMARY KEY, last REAL NOT NULL, state BLOB NOT NULL) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_last ON sessions (last)")
+        super().__init__(programs, **kwargs)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下只在检查点时同步，进程崩溃不丢数据
+            self._local.conn = conn
+        return conn
+
+    def _read_many(self, ids: List[str]) -> List[Optional[bytes]]:
+        unique = list(dict.fromkeys(ids))
+        rows = self._connection().execute(
+            f"SELECT id, state FROM sessions WHERE id IN ({','.join('?' * len(unique))})", unique)
+        found: Dict[str, bytes] = dict(rows)
+        return [found.get(session_id) for session_id in ids]
+
+    def _write_many(self, ops: List[tuple]) -> List[bool]:
+        results = []
+        conn = self._connection()
+        with conn:  # 一个事务
+            for op in ops:
+                if op[0] == "put":
+                    cursor = conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", op[1:4])
+                elif op[0] == "update" and op[4] is None:
+                    cursor = conn.execute("UPDATE sessions SET last = ?, state = ? WHERE id = ?",
+                                          (op[2], op[3], op[1]))
+                elif op[0] == "update":
+                    cursor = conn.execute("UPDATE sessions SET last = ?, state = ? WHERE id = ? AND state = ?",
+                                          (op[2], op[3], op[1], op[4]))
+                elif op[2] is None:
+                    cursor = conn.execute("DELETE FROM sessions WHERE id = ?", (op[1],))
+                else:
+                    cursor = conn.execute("DELETE FROM sessions WHERE id = ? AND state = ?", (op[1], op[2]))
+                results.append(cursor.rowcount > 0)
+        return results
+
+    def sweep(self) -> int:
+        """删除过期会话并把会话数限制在 max_sessions 以内；返回删除的过期会话数"""
+        conn = self._connection()
+        with conn:
+            expired = conn.execute("DELETE FROM sessions WHERE last <= ?", (self.clock() - self.ttl,)).rowcount
+            evicted = conn.execute(
+                "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY last "
+                "LIMIT max(0, (SELECT count(*) FROM sessions) - ?))", (self.max_sessions,)).rowcount
+        self._add("expired", expired)
+        self._add("evicted", evicted)
+        return expired
+
+    def _count(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM sessions").fetchone()[0]
+
+class RedisSessionStore(SharedSessionStore):
+    """
+    Redis（或兼容其协议的服务）中的会话存储，可跨主机共享
+    - 一批读操作是一次 MGET，一批写操作是一次流水线；带旧编码的写操作由服务端脚本比较后写入（_CAS_SCRIPT）
+    - 每个键的过期时间设为 last_interaction_time + ttl，由 Redis 自行删除，sweep 无需做事
+    - 容量上限交给 Redis 的 maxmemory 策略（如 volatile-lru），这里不另外淘汰
+    """
+    def __init__(self, url: str, programs: Callable[[], Bytecode], prefix: str = "dsl:session:", **kwargs):
+        if redis is None:
+            raise RuntimeError("RedisSessionStore 需要安装 redis 包")
+        self.client = redis.Redis.from_url(url)
+        self._cas = self.client.register_script(_CAS_SCRIPT)
+        self.prefix = prefix
+        super().__init__(programs, **kwargs)
+
+    def _key(self, session_id: str) -> str:
+        return self.prefix + session_id
+
+    def _read_many(self, ids: List[str]) -> List[Optional[bytes]]:
+        return self.client.mget([self._key(session_id) for session_id in ids])
+
+    def _write_many(self, ops: List[tuple]) -> List[bool]:
+        pipe = self.client.pipeline(transaction=False)
+        for op in ops:
+            key, expected = self._key(op[1]), op[-1]
+            if op[0] == "remove" and expected is None:
+                pipe.delete(key)
+            elif op[0] == "remove":
+                self._cas(keys=[key], args=[expected, b"", 0], client=pipe)
+            else:
+                expire_at = max(int((op[2] + self.ttl) * 1000), int(self.clock() * 1000) + 1)
+                if expected is None:
+                    pipe.set(key, op[3], pxat=expire_at, xx=op[0] == "update")
+                else:
+                    self._cas(keys=[key], args=[expected, op[3], expire_at], client=pipe)
+        return [bool(result) for result in pipe.execute()]
+
+    def sweep(self) -> int:
+        return 0
+
+    def _count(self) -> int:
+        """遍历全部键，只在显式调用 len() 时使用"""
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=1000))
+
+    def _stats_size(self) -> Optional[int]:
+        return None  # /api/metrics 不为计数扫描整个键空间
@@ -0,0 +1,148 @@
+# 文件名: session_store.py
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from session_table import SessionTable
+from vm import DialogueVM
+
+class SessionStore:
+    """
+    有界的会话存储：会话ID -> SessionTable 中的一行
+    - 会话状态存放在预分配的数组表中，程序与意图识别客户端全局共享；get 载入为 DialogueVM，处理完后用 update 写回
+    - 空闲过期：距会话的 last_interaction_time 超过 ttl 秒即过期；get 时惰性检查，后台清理线程定期移除
+    - 容量上限：达到 max_sessions 时淘汰最久没有交互的会话（LRU）
+    - 表中的行按 last_interaction_time 串成有序链表（写回时时间变化的会话重新排位，通常就是末尾），
+      过期的会话总在最前面，一次清理的代价为 O(过期数)，不扫描全部会话
+    只在本进程内有效；多个工作进程共享会话时使用 session_backends 中接口相同的存储
+    """
+    def __init__(self, max_sessions: int = 100000, ttl: float = 1800,
+                 clock: Callable[[], float] = time.time, llm_client=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock  # 与会话的 last_interaction_time 使用同一时钟
+        self.llm_client = llm_client  # 载入的会话共用的意图识别客户端
+        self.table = SessionTable(max_sessions)
+        self._rows: Dict[str, int] = {}  # 会话ID -> 行号
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.created = self.ended = self.expired = self.evicted = 0
+
+    def _is_expired(self, row: int, now: float) -> bool:
+        return now - self.table.last_interaction_time[row] >= self.ttl
+
+    def put(self, session_id: str, vm: DialogueVM):
+        """加入新会话；达到容量时先淘汰最久没有交互的会话"""
+        with self._lock:
+            row = self._rows.pop(session_id, None)
+            if row is not None:
+                self.table.free(row)
+            while len(self._rows) >= self.max_sessions:
+                row = self.table.head
+                del self._rows[self.table.session_id[row]]
+                self.table.free(row)
+                self.evicted += 1
+            self._rows[session_id] = self.table.allocate(session_id, vm)
+            self.created += 1
+
+    def get(self, session_id: str) -> Optional[DialogueVM]:
+        """载入会话；不存在或已过期时返回None（过期的会话同时被移除）"""
+        with self._lock:
+            row = self._rows.get(session_id)
+            if row is None:
+                return None
+            if self._is_expired(row, self.clock()):
+                del self._rows[session_id]
+                self.table.free(row)
+                self.expired += 1
+                return None
+            return self.table.load(row, self.llm_client)
+
+    def deadline(self, session_id: str) -> Optional[float]:
+        """
+        会话的静默截止时间，不载入会话；在此之前的静默轮询只会得到无操作响应
+        不存在或已过期时返回None（过期的会话同时被移除）
+        """
+        with self._lock:
+            row = self._rows.get(session_id)
+            if row is None:
+                return None
+            if self._is_expired(row, self.clock()):
+                del self._rows[session_id]
+                self.table.free(row)
+                self.expired += 1
+                return None
+            return self.table.deadline[row]
+
+    def update(self, session_id: str, vm: DialogueVM) -> bool:
+        """请求处理完后写回会话状态；last_interaction_time 变化时重新排位，保持链表有序；会话已不在时返回False"""
+        with self._lock:
+            row = self._rows.get(session_id)
+            if row is None:
+                return False  # 处理期间已过期或被淘汰
+            moved = vm.last_interaction_time != self.table.last_interaction_time[row]
+            self.table.store(row, vm)
+            if moved:
+                self.table.reposition(row)
+            return True
+
+    def remove(self, session_id: str) -> bool:
+        """对话正常结束时移除；会话已不在时返回False"""
+        with self._lock:
+            row = self._rows.pop(session_id, None)
+            if row is None:
+                return False
+            self.table.free(row)
+            self.ended += 1
+            return True
+
+    def sweep(self) -> int:
+        """从最旧的一端移除已过期的会话，遇到第一个未过期的即停止；返回移除数"""
+        now, removed = self.clock(), 0
+        with self._lock:
+            while self.table.head >= 0:
+                row = self.table.head
+                if not self._is_expired(row, now):
+                    break
+                del self._rows[self.table.session_id[row]]
+                self.table.free(row)
+                removed += 1
+            self.expired += removed
+        return removed
+
+    def start_sweeper(self, interval: float):
+        """启动守护线程，每 interval 秒清理一次过期会话"""
+        if self._sweeper is not None:
+            return
+        stop = threading.Event()
+        def run():
+            while not stop.wait(interval):
+                self.sweep()
+        self._sweeper = (threading.Thread(target=run, name="session-sweeper", daemon=True), stop)
+        self._sweeper[0].start()
+
+    def stop(self):
+        if self._sweeper is not None:
+            self._sweeper[1].set()
+            self._sweeper = None
+
+    def __contains__(self, session_id) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            table = self.table.stats()
+            return {
+                "size": len(self._rows),
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "created": self.created,
+                "ended": self.ended,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "programs": table["programs"],      # 仍有会话在使用的程序版本数
+                "table_bytes": table["bytes"],
+            }
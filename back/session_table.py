@@ -0,0 +1,144 @@
+# 文件名: session_table.py
+import math
+from array import array
+from typing import Dict, List, Optional
+
+from vm import Bytecode, DialogueVM
+
+class SessionTable:
+    """
+    预分配的数组会话表：每个会话占一行，各字段按列存放在 array 中
+    - 一行只有会话状态本身：步骤编号、静默计数、两个时间戳和程序版本的下标，共 26 字节
+    - 另存写回时算好的静默截止时间（DialogueVM.next_deadline），轮询时不必载入会话即可判断是否到期
+    - 行之间用 prev/next 两列串成按 last_interaction_time 排序的双向链表，代替每个会话一个节点的 OrderedDict；
+      插入时从末尾向前找位置，时间通常是最新的，只比较一次，乱序写回的旧时间也能排到正确的位置
+    - 程序（Bytecode）按版本登记一次、按引用计数释放，意图识别客户端在载入时传入，都不随会话复制
+    - total_silence_start_time 为 None 时存为 NaN；没有当前步骤时截止时间为 -inf（总是走完整处理）
+    会话在请求期间载入为 DialogueVM，处理完后写回；表本身不加锁，由 SessionStore 串行访问
+    """
+    # 状态 + 截止时间 + 链表 + 会话ID引用；只是表中的数组，SessionStore 中会话ID -> 行号的字典每个会话另占约70字节
+    ROW_BYTES = 4 + 4 + 8 + 8 + 2 + 8 + 4 + 4 + 8
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.step = array('i', bytes(4 * capacity))
+        self.silence_count = array('i', bytes(4 * capacity))
+        self.last_interaction_time = array('d', bytes(8 * capacity))
+        self.total_silence_start_time = array('d', bytes(8 * capacity))
+        self.program = array('H', bytes(2 * capacity))
+        self.deadline = array('d', bytes(8 * capacity))
+        self.prev = array('i', bytes(4 * capacity))
+        self.next = array('i', bytes(4 * capacity))
+        self.session_id: List[Optional[str]] = [None] * capacity  # 行号 -> 会话ID（淘汰和清理时用）
+        self.head = self.tail = -1  # 最久没有交互的行 / 最近交互的行
+        self._used = 0            # 从未分配过的行从这里开始
+        self._free = array('i')   # 释放后可复用的行
+        self._programs: List[Optional[Bytecode]] = []  # 程序下标 -> 程序
+        self._program_refs: List[int] = []             # 程序下标 -> 引用它的行数
+        self._program_slots: Dict[int, int] = {}       # id(程序) -> 程序下标
+
+    def allocate(self, session_id: str, vm: DialogueVM) -> int:
+        """为会话分配一行、写入状态并放到链表末尾，返回行号；表满时抛出 MemoryError"""
+        if self._free:
+            row = self._free.pop()
+        elif self._used < self.capacity:
+            row = self._used
+            self._used += 1
+        else:
+            raise MemoryError("会话表已满")
+        self.session_id[row] = session_id
+        self.program[row] = self._acquire(vm.program)
+        self.store(row, vm)
+        self._link_sorted(row)
+        return row
+
+    def free(self, row: int):
+        self._unlink(row)
+        self._release(self.program[row])
+        self.session_id[row] = None
+        self._free.append(row)
+
+    def reposition(self, row: int):
+        """行的 last_interaction_time 变化后重新排到链表中的位置"""
+        self._unlink(row)
+        self._link_sorted(row)
+
+    def _link_sorted(self, row: int):
+        # 插在最后一个时间不晚于它的行之后
+        time, after = self.last_interaction_time, self.tail
+        while after >= 0 and time[after] > time[row]:
+            after = self.prev[after]
+        before = self.next[after] if after >= 0 else self.head
+        self.prev[row], self.next[row] = after, before
+        if after >= 0:
+            self.next[after] = row
+        else:
+            self.head = row
+        if before >= 0:
+            self.prev[before] = row
+        else:
+            self.tail = row
+
+    def _unlink(self, row: int):
+        prev, next = self.prev[row], self.next[row]
+        if prev >= 0:
+            self.next[prev] = next
+        else:
+            self.head = next
+        if next >= 0:
+            self.prev[next] = prev
+        else:
+            self.tail = prev
+
+    def load(self, row: int, llm_client) -> DialogueVM:
+        """把一行载入为可执行的 DialogueVM"""
+        vm = DialogueVM(llm_client, self._programs[self.program[row]])
+        vm.step = self.step[row]
+        vm.silence_count = self.silence_count[row]
+        vm.last_interaction_time = self.last_interaction_time[row]
+        start = self.total_silence_start_time[row]
+        vm.total_silence_start_time = None if math.isnan(start) else start
+        return vm
+
+    def store(self, row: int, vm: DialogueVM):
+        """把会话状态写回（同一会话的程序版本不变，不重新登记）"""
+        self.step[row] = vm.step
+        self.silence_count[row] = vm.silence_count
+        self.last_interaction_time[row] = vm.last_interaction_time
+        start = vm.total_silence_start_time
+        self.total_silence_start_time[row] = math.nan if start is None else start
+        deadline = vm.next_deadline()
+        self.deadline[row] = -math.inf if deadline is None else deadline
+
+    def _acquire(self, program: Bytecode) -> int:
+        slot = self._program_slots.get(id(program))
+        if slot is None:
+            if None in self._programs:
+                slot = self._programs.index(None)
+                self._programs[slot] = program
+                self._program_refs[slot] = 0
+            else:
+                slot = len(self._programs)
+                self._programs.append(program)
+                self._program_refs.append(0)
+            self._program_slots[id(program)] = slot
+        self._program_refs[slot] += 1
+        return slot
+
+    def _release(self, slot: int):
+        # 最后一个会话结束后释放程序，旧版本随之可以被回收
+        self._program_refs[slot] -= 1
+        if self._program_refs[slot] == 0:
+            del self._program_slots[id(self._programs[slot])]
+            self._programs[slot] = None
+
+    def __len__(self) -> int:
+        return self._used - len(self._free)
+
+    def stats(self) -> dict:
+        return {
+            "rows": len(self),
+            "capacity": self.capacity,
+            "programs": len(self._program_slots),
+            "bytes": self.capacity * self.ROW_BYTES,
+        }
@@ -0,0 +1,180 @@
+# 文件名: silence_timers.py
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from singleflight import KeyedLocks
+from timer_wheel import TimerWheel
+from vm import DialogueVM
+
+class SilenceTimers:
+    """
+    服务端的静默计时：客户端订阅推送后，由服务端在静默截止时间执行静默处理并推送结果
+    - 截止时间由会话状态算出（DialogueVM.next_deadline），放入分层时间轮；一个线程按刻度推进时间轮
+    - 到期时先读取存储中算好的截止时间：期间有新的交互（可能发生在其他工作进程）则按新的截止时间重新计时，
+      否则载入会话执行静默处理、写回，把提醒或结束消息放入订阅队列；无操作的结果不推送
+    - 只为有订阅者的会话计时，没有订阅的客户端仍可以自己轮询
+    - 静默处理持有会话的锁（locks，与处理用户消息的代码共用），载入后再按会话状态确认截止时间未变，
+      不会与同一会话的消息处理交错写回，也不会在用户的回复之后推送过时的提醒
+    store 为 SessionStore 或 session_backends 中接口相同的存储；锁只在本进程内有效，
+    跨进程由共享存储的比较后写回保证：写回失败时不推送这次结果
+    - 静默处理出错（如共享存储暂时不可用）时在 retry_delay 秒后重试，连续 retries 次失败后推送错误消息并停止计时，
+      会话的下一条消息会重新开始计时
+    """
+    def __init__(self, store, tick: float = 0.1, workers: int = 4, clock: Callable[[], float] = time.time,
+                 locks: Optional[KeyedLocks] = None, retries: int = 3, retry_delay: float = 1.0):
+        self.store = store
+        self.locks = locks if locks is not None else KeyedLocks()  # 会话ID -> 锁
+        self.tick = tick
+        self.clock = clock  # 与会话的 last_interaction_time 使用同一时钟
+        self.wheel = TimerWheel(tick, start=clock())
+        self._subscribers: Dict[str, queue.Queue] = {}  # 会话ID -> 推送队列
+        self._lock = threading.Lock()  # 保护时间轮与订阅表
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="silence")
+        self._thread = None
+        self._stop = threading.Event()
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._failures: Dict[str, int] = {}  # 会话ID -> 连续出错次数
+        self.fired = 0   # 到期执行的静默处理次数
+        self.pushed = 0  # 推送的消息数
+        self.errors = 0  # 静默处理出错次数
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="silence-timers", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+    def subscribe(self, session_id: str) -> queue.Queue:
+        """客户端建立推送连接；会话不存在时队列中直接是结束消息"""
+        events = queue.Queue()
+        vm = self.store.get(session_id)
+        if vm is None:
+            events.put({"error": "会话不存在", "end": True})
+            return events
+        with self._lock:
+            self._subscribers[session_id] = events  # 同一会话重新连接时替换旧连接
+        self.reschedule(session_id, vm)
+        return events
+
+    def unsubscribe(self, session_id: str, events: queue.Queue):
+        with self._lock:
+            if self._subscribers.get(session_id) is events:
+                del self._subscribers[session_id]
+                self._failures.pop(session_id, None)
+                self.wheel.cancel(session_id)
+
+    def reschedule(self, session_id: str, vm: Optional[DialogueVM]):
+        """会话状态变化后（如处理完一条消息）按新的截止时间计时；vm 为None或对话已结束时取消"""
+        self._schedule(session_id, vm.next_deadline() if vm is not None else None)
+
+    def _schedule(self, session_id: str, deadline: Optional[float]):
+        with self._lock:
+            if deadline is None or session_id not in self._subscribers:
+                self.wheel.cancel(session_id)
+            else:
+                self.wheel.schedule(session_id, deadline)
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            for session_id in self.due():
+                self._executor.submit(self.fire, session_id)
+
+    def due(self) -> List[str]:
+        """把时间轮推进到当前时间，返回到期的会话ID"""
+        with self._lock:
+            return self.wheel.advance(self.clock())
+
+    def fire(self, session_id: str):
+        """会话的静默截止时间已到（由计时线程在线程池中调用）"""
+        try:
+            with self.locks.hold(session_id):
+                self._fire(session_id)
+        except Exception as e:  # 线程池会吞掉异常，不处理的话这个会话不会再计时
+            self._failed(session_id, e)
+            return
+        with self._lock:
+            self._failures.pop(session_id, None)
+
+    def _failed(self, session_id: str, error: Exception):
+        """静默处理出错：稍后重试，连续失败达到上限时推送错误消息并停止计时"""
+        with self._lock:
+            self.errors += 1
+            failures = self._failures.get(session_id, 0) + 1
+            self._failures[session_id] = failures
+        print(f"[Silence] 会话 {session_id} 静默处理失败({failures}/{self.retries}): {error}")
+        if failures < self.retries:
+            self._schedule(session_id, self.clock() + self.retry_delay)
+            return
+        with self._lock:
+            self._failures.pop(session_id, None)
+            events = self._subscribers.get(session_id)
+            self.wheel.cancel(session_id)
+        if events is not None:
+            events.put({"error": "静默处理失败，请稍后重试。", "end": False})
+            with self._lock:
+                self.pushed += 1
+
+    def _fire(self, session_id: str):
+        deadline = self.store.deadline(session_id)
+        if deadline is not None and deadline > self.clock():
+            self._schedule(session_id, deadline)  # 有新的交互
+            return
+        vm = self.store.get(session_id) if deadline is not None else None
+        if vm is None:
+            self._push(session_id, {"error": "会话不存在", "end": True})
+            return
+        deadline = vm.next_deadline()
+        if deadline is not None and deadline > self.clock():
+            self._schedule(session_id, deadline)  # 读取截止时间之后、载入之前有新的交互（如其他工作进程）
+            return
+        with self._lock:
+            self.fired += 1
+        response = vm.process_user_input("")
+        if response.get('end'):
+            if not self.store.remove(session_id):
+                self._stale(session_id)
+                return
+            self._push(session_id, response)
+            return
+        if not self.store.update(session_id, vm):
+            self._stale(session_id)
+            return
+        if not response.get('no_op'):
+            self._push(session_id, response)
+        self.reschedule(session_id, vm)
+
+    def _stale(self, session_id: str):
+        """写回失败：会话在此期间被其他工作进程处理过或已被移除，丢弃这次结果，按存储中的最新状态重新计时"""
+        deadline = self.store.deadline(session_id)
+        if deadline is None:
+            self._push(session_id, {"error": "会话不存在", "end": True})
+        else:
+            self._schedule(session_id, deadline)
+
+    def _push(self, session_id: str, response: dict):
+        with self._lock:
+            events = self._subscribers.get(session_id)
+            if response.get('end'):
+                self._subscribers.pop(session_id, None)
+                self.wheel.cancel(session_id)
+        if events is not None:
+            events.put(response)
+            with self._lock:
+                self.pushed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "scheduled": len(self.wheel),
+                "fired": self.fired,
+                "pushed": self.pushed,
+                "errors": self.errors,
+            }
@@ -0,0 +1,84 @@
+# 文件名: singleflight.py
+import threading
+from contextlib import contextmanager
+from typing import Callable, Hashable, List, Optional
+
+from intent_cache import normalize_input
+
+class _Call:
+    """一次进行中的调用，后到的调用方在 done 上等待结果"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """相同键的并发调用合并为一次：第一个调用方执行，其余调用方共享其结果（或异常）"""
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0  # 被合并掉的调用次数
+
+    def do(self, key: Hashable, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+class KeyedLocks:
+    """
+    按键加锁：同一键的调用串行执行，不同键互不阻塞
+    锁在没有持有者和等待者时即删除，锁表的大小与并发的键数成正比，不随会话总数增长
+    """
+    def __init__(self):
+        self._locks = {}  # 键 -> [锁, 持有和等待的调用方数]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: Hashable):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+class SingleFlightIntentClient:
+    """意图识别的单飞层：相同(归一化输入, 意图集合)的并发请求只发送一次"""
+    def __init__(self, backend):
+        self.backend = backend
+        self.flight = SingleFlight()
+
+    def recognize_intent(self, user_input: str, available_intents: List[str]) -> Optional[str]:
+        key = (normalize_input(user_input), tuple(available_intents))
+        return self.flight.do(key, lambda: self.backend.recognize_intent(user_input, available_intents))
@@ -0,0 +1,95 @@
+# 文件名: timer_wheel.py
+import math
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+class TimerWheel:
+    """
+    分层时间轮：每层 slots 个槽，第 k 层一个槽覆盖 slots^k 个刻度
+    - schedule/cancel 为 O(1)：定时器按到期刻度放入对应层的槽中，每个键同时只有一个定时器
+    - advance(now) 每走一个刻度只处理第0层的一个槽；低层转完一圈时把上一层的一个槽降级重新放置
+    - 到期时间向上取整到刻度，定时器不会提前到期，最多晚一个刻度
+    - 超出全部层范围（slots^levels 个刻度）的定时器暂存在溢出集合中，最高层转完一圈时重新放置
+    时间轮本身不计时、不加锁，由调用方（如 SilenceTimers）在一个线程中驱动
+    """
+    def __init__(self, tick: float = 0.1, slots: int = 64, levels: int = 4, start: float = 0.0):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.origin = start
+        self.current = 0  # 已处理到的刻度
+        self._wheels: List[List[Set[Hashable]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._overflow: Set[Hashable] = set()
+        self._range = slots ** levels
+        self._timers: Dict[Hashable, Tuple[int, Set[Hashable]]] = {}  # 键 -> (到期刻度, 所在槽)
+
+    def schedule(self, key: Hashable, deadline: float):
+        """键在 deadline（与 start 同一时钟）到期；已有的定时器被替换"""
+        self.cancel(key)
+        tick = max(math.ceil((deadline - self.origin) / self.tick), self.current + 1)
+        self._place(key, tick)
+
+    def cancel(self, key: Hashable) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        timer[1].discard(key)
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        timer = self._timers.get(key)
+        return None if timer is None else self.origin + timer[0] * self.tick
+
+    def _place(self, key: Hashable, tick: int):
+        delta, level, span = tick - self.current, 0, 1
+        if delta >= self._range:
+            slot = self._overflow
+        else:
+            while delta >= span * self.slots:
+                level += 1
+                span *= self.slots
+            slot = self._wheels[level][(tick // span) % self.slots]
+        slot.add(key)
+        self._timers[key] = (tick, slot)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """走到 now 所在的刻度，返回期间到期的键（按到期顺序）"""
+        target = math.floor((now - self.origin) / self.tick)
+        expired = []
+        while self.current < target:
+            if not self._timers:
+                self.current = target  # 没有定时器时直接跳过
+                break
+            self.current += 1
+            self._cascade()
+            slot = self._wheels[0][self.current % self.slots]
+            if slot:
+                for key in list(slot):
+                    if self._timers[key][0] <= self.current:
+                        del self._timers[key]
+                        slot.discard(key)
+                        expired.append(key)
+        return expired
+
+    def _cascade(self):
+        # 第 level-1 层转完一圈时，把第 level 层当前的槽重新放置到下面的层
+        span = 1
+        for level in range(1, self.levels):
+            span *= self.slots
+            if self.current % span:
+                break
+            slot = self._wheels[level][(self.current // span) % self.slots]
+            keys = list(slot)
+            slot.clear()
+            for key in keys:
+                self._place(key, self._timers[key][0])
+        if self._overflow and self.current % self._range == 0:
+            keys = list(self._overflow)
+            self._overflow.clear()
+            for key in keys:
+                self._place(key, self._timers[key][0])
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key) -> bool:
+        return key in self._timers
@@ -0,0 +1,255 @@
+# 文件名: vm.py
+import time
+from collections.abc import Mapping
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from compiler import compile_program, CompiledStep
+from interpreter import ProgramNode
+from lazy_program import LazyProgram
+from LLMClient import LLMError
+from matcher import KeywordMatcher
+
+NO_STEP = -1  # 没有 Silence/Default 目标，或脚本没有 exitProc
+MISSING = -2  # 目标步骤未定义（执行到这里时按"步骤不存在"处理）
+
+EXIT_WORDS = frozenset(["再见", "退出", "exit", "quit", "没有", "没了"])
+
+class StepCode(NamedTuple):
+    """一个步骤的执行代码：跳转目标都已解析为步骤编号"""
+    message: str
+    message_count: int
+    end: bool
+    timeout: int
+    total_silence_timeout: int
+    silence: int                # Silence 目标编号
+    default: int                # Default 目标编号
+    intents: Tuple[str, ...]    # 关键词列表（即 matcher.keywords）
+    targets: Tuple[int, ...]    # 与 intents 对齐：关键词下标 -> 目标编号
+    matcher: KeywordMatcher
+
+def _target(ids: dict, name: Optional[str]) -> int:
+    return NO_STEP if name is None else ids.get(name, MISSING)
+
+def assemble(step: CompiledStep, ids: dict) -> StepCode:
+    """把 CompiledStep 中按名字的跳转替换为步骤编号"""
+    return StepCode(
+        message=step.message,
+        message_count=step.message_count,
+        end=step.end,
+        timeout=step.timeout,
+        total_silence_timeout=step.total_silence_timeout,
+        silence=_target(ids, step.silence_target),
+        default=_target(ids, step.default_target),
+        intents=step.intents,
+        targets=tuple(_target(ids, step.branches[keyword]) for keyword in step.matcher.keywords),
+        matcher=step.matcher,
+    )
+
+class Bytecode(Mapping):
+    """
+    编译为整数状态机的程序，所有会话共享
+    - 步骤按出现顺序编号，code(i) 返回编号为 i 的 StepCode
+    - 同时是 步骤名 -> CompiledStep 的只读映射，供校验、统计和热加载比较使用
+    steps 为 LazyProgram 时不预先生成代码，访问时由其LRU中的 CompiledStep 现场组装
+    key 为脚本内容的摘要（见 program_cache.program_key），跨进程标识同一版本；0 表示未知，惰性程序此时在第一次访问时计算
+    """
+    def __init__(self, steps: Union[Mapping, ProgramNode], version: int = 0, entry: str = "welcome",
+                 exit_step: str = "exitProc", key: int = 0):
+        if isinstance(steps, ProgramNode):
+            steps = compile_program(steps)
+        self.steps = steps
+        self.version = version
+        self._key = key
+        self.names: Tuple[str, ...] = tuple(steps)  # 编号 -> 步骤名
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.entry = self.ids.get(entry, MISSING)
+        self.exit = self.ids.get(exit_step, NO_STEP)
+        self.lazy = isinstance(steps, LazyProgram)
+        self._code: Optional[List[StepCode]] = None if self.lazy else [assemble(steps[name], self.ids) for name in self.names]
+
+    @property
+    def key(self) -> int:
+        # 惰性程序的摘要在第一次需要时才计算（见 LazyProgram.key）
+        if self._key == 0 and self.lazy:
+            self._key = self.steps.key
+        return self._key
+
+    def code(self, i: int) -> StepCode:
+        if self._code is not None:
+            return self._code[i]
+        return assemble(self.steps[self.names[i]], self.ids)
+
+    def __getitem__(self, name: str) -> CompiledStep:
+        return self.steps[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def stats(self) -> Optional[dict]:
+        return self.steps.stats() if self.lazy else None
+
+class DialogueVM:
+    """
+    在 Bytecode 上执行一轮对话
+    会话状态只有当前步骤编号、静默计数和两个时间戳，程序本身由所有会话共享
+    Web服务中会话常驻在 SessionTable 的一行里，请求期间才载入为 DialogueVM
+    """
+    __slots__ = ('llm_client', 'program', 'step', 'silence_count', 'last_interaction_time', 'total_silence_start_time')
+
+    def __init__(self, llm_client, program: Bytecode):
+        self.llm_client = llm_client
+        self.program = program
+        self.step = program.entry
+        self.silence_count = 0  # 标记是否进入过静默提醒流程
+        self.last_interaction_time = time.time()  # 记录最后一次交互时间
+        self.total_silence_start_time = None  # 记录总静默开始时间
+
+    @property
+    def current_step(self) -> Optional[str]:
+        return self.program.names[self.step] if self.step >= 0 else None
+
+    def process_user_input(self, user_input: str = "") -> dict:
+        if self.step < 0:
+            return {"error": "对话流程错误，未找到当前步骤。", "end": True}
+        if user_input:
+            return self.on_message(user_input)
+        return self.on_silence()
+
+    def on_message(self, user_input: str) -> dict:
+        """处理用户有输入的情况"""
+        code = self.program.code(self.step)
+        print(f"[Debug] 用户输入: '{user_input}', 重置所有静默计时器")
+        self.last_interaction_time = time.time()
+        self.total_silence_start_time = None  # 重置总静默计时
+        self.silence_count = 0
+
+        # 处理退出关键词
+        if user_input.lower() in EXIT_WORDS:
+            if self.program.exit != NO_STEP:
+                self.step = self.program.exit
+                return self.get_step_response()
+            return {"message": "感谢您的咨询，再见！", "end": True}
+
+        # 关键词精确匹配（一次扫描输入，按优先级策略选出关键词）
+        slot = code.matcher.match_index(user_input)
+        if slot >= 0:
+            self.step = code.targets[slot]
+            return self.get_step_response()
+
+        # LLM 意图识别
+        if code.intents:
+            try:
+                intent = self.llm_client.recognize_intent(user_input, list(code.intents))
+            except LLMError as e:
+                print(f"[Debug] 意图识别不可用({e})，按Default处理")
+                intent = None
+            if intent and intent in code.intents:
+                self.step = code.targets[code.intents.index(intent)]
+                return self.get_step_response()
+
+        # 默认处理
+        if code.default != NO_STEP:
+            self.step = code.default
+            return self.get_step_response()
+
+        # 如果连默认处理都没有
+        return {"message": "抱歉，我不太明白。您可以问我关于门票、时间或游玩攻略的问题。", "end": False}
+
+    def on_silence(self) -> dict:
+        """处理用户无输入的情况（超时轮询）"""
+        code = self.program.code(self.step)
+        current_time = time.time()
+
+        # 如果是第一次超时检测，初始化总静默计时器
+        if self.total_silence_start_time is None:
+            self.total_silence_start_time = self.last_interaction_time
+
+        total_silence_elapsed = current_time - self.total_silence_start_time
+        single_silence_elapsed = current_time - self.last_interaction_time
+
+        print(f"[Debug] 静默检测: 单次已过={single_silence_elapsed:.1f}s (阈值 {code.timeout}s), 总计已过={total_silence_elapsed:.1f}s (阈值 {code.total_silence_timeout}s)")
+
+        # 检查总静默超时（最高优先级）
+        if total_silence_elapsed >= code.total_silence_timeout:
+            print(f"[Debug] 总静默超时({code.total_silence_timeout}s)达到，结束对话")
+            # 尝试根据 DSL 优雅地结束
+            if code.silence != NO_STEP:
+                self.step = code.silence
+                # 如果silenceProc本身再次超时，它的silence会指向exitProc
+                if self.step >= 0:
+                    silence = self.program.code(self.step).silence
+                    if silence != NO_STEP:
+                        self.step = silence
+                        return self.get_step_response()
+            return {"message": "长时间无响应，对话已结束。", "end": True}
+
+        # 检查单次静默超时
+        if single_silence_elapsed >= code.timeout:
+            print(f"[Debug] 单次静默超时({code.timeout}s)触发，执行提醒。")
+            self.last_interaction_time = current_time  # 重置单次超时计时器
+            if code.silence != NO_STEP:
+                print(f"[Debug] 跳转到静默处理步骤: {self._name(code.silence)}")
+                self.step = code.silence
+                return self.get_step_response()
+            print("[Debug] 静默发生，但当前步骤未定义Silence处理，结束对话。")
+            return {"message": "长时间无响应，对话已结束。", "end": True}
+
+        # 没有达到任何超时条件，返回一个"无操作"的空消息响应
+        print("[Debug] 轮询未超时，不发送消息。")
+        response = self.get_step_response()  # 获取状态信息
+        response['message'] = ''  # 清空消息体
+        response['no_op'] = True  # 无操作标记（方便前端调试）
+        return response
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        下一次静默处理会产生动作的时间点：单次提醒或总静默超时中较早的一个
+        在这之前 on_silence 只返回无操作响应；没有当前步骤时返回None
+        """
+        if self.step < 0:
+            return None
+        code = self.program.code(self.step)
+        silence_start = self.last_interaction_time if self.total_silence_start_time is None else self.total_silence_start_time
+        return min(self.last_interaction_time + code.timeout, silence_start + code.total_silence_timeout)
+
+    def get_step_response(self) -> dict:
+        """获取当前步骤的响应，包含正确的超时配置"""
+        if self.step < 0:
+            return {"error": "步骤不存在", "end": True}
+        code = self.program.code(self.step)
+
+        # 计算剩余总静默时间
+        remaining_total_timeout = code.total_silence_timeout
+        if self.total_silence_start_time is not None:
+            elapsed = time.time() - self.total_silence_start_time
+            remaining_total_timeout = max(0, code.total_silence_timeout - elapsed)
+
+        name = self.program.names[self.step]
+        response_data = {
+            "message": code.message,
+            "end": code.end,
+            "current_step": name,
+            "timeout": code.timeout * 1000,  # 单次超时(提醒用)
+            "total_silence_timeout": code.total_silence_timeout,  # 总超时配置
+            "remaining_total_timeout": remaining_total_timeout,  # 剩余总静默时间
+            "current_silence_count": self.silence_count
+        }
+        print(f"[Debug] 发送响应: step={name}, 消息数量={code.message_count}, silence_count={self.silence_count}")
+        return response_data
+
+    def reset_conversation(self) -> dict:
+        self.step = self.program.entry
+        self.silence_count = 0
+        self.last_interaction_time = time.time()
+        self.total_silence_start_time = None
+        return self.get_step_response()
+
+    def _name(self, i: int) -> str:
+        # 调试输出用；未定义的目标没有名字
+        return self.program.names[i] if i >= 0 else "<未定义>"
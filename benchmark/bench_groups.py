@@ -0,0 +1,45 @@
+# 文件名: bench_groups.py
+# 对比每步重复写出分支与 Include 共用分支组的解析时间和内存（语义相同的两份脚本）
+# 运行: python benchmark/bench_groups.py [步骤数] [分支组数]
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from compiler import compile_program
+from interpreter import Lexer, Parser
+from dsl_generator import generate_script
+
+def measured(fn, *args):
+    """返回 (结果, 耗时, 结果仍占用的字节数)；tracemalloc 会拖慢执行，耗时取不跟踪时的一次运行"""
+    started = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    result = fn(*args)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, size
+
+def parse(script: str):
+    return Parser(Lexer(script).tokens()).parse_program()
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    groups = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    for label, inline in (("重复分支", True), ("分支组", False)):
+        script = generate_script(steps=steps, groups=groups, inline_groups=inline)
+        program, t_parse, m_ast = measured(parse, script)
+        compiled, t_compile, m_compiled = measured(compile_program, program)
+        matchers = len({id(step.matcher) for step in compiled.values()})
+        print(f"{label}: 脚本 {len(script.encode('utf-8')) / 1e6:5.1f} MB  "
+              f"解析 {t_parse:.3f}s / AST {m_ast / 1e6:6.1f} MB  "
+              f"编译 {t_compile:.3f}s / 分派表 {m_compiled / 1e6:6.1f} MB  matcher {matchers} 个")
+        del program, compiled
+
+if __name__ == '__main__':
+    main()
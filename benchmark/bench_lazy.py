@@ -0,0 +1,62 @@
+# 文件名: bench_lazy.py
+# 对比完整加载与mmap惰性加载的启动时间和常驻内存
+# 运行: python benchmark/bench_lazy.py [步骤数] [访问的步骤数]
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from compiler import compile_program
+from interpreter import Lexer, Parser
+from lazy_program import LazyProgram
+from dsl_generator import generate_script
+
+def measured(fn, *args):
+    """返回 (结果, 耗时, 结果仍占用的字节数)；tracemalloc 会拖慢执行，耗时取不跟踪时的一次运行"""
+    started = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    result = fn(*args)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, size
+
+def load_eager(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return compile_program(Parser(Lexer(f.read()).tokens()).parse_program())
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    active = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.dsl')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(generate_script(steps=steps))
+        print(f"脚本大小: {os.path.getsize(path) / 1e6:.1f} MB, 步骤数: {steps}, 活跃步骤数: {active}")
+
+        eager, t_eager, m_eager = measured(load_eager, path)
+        print(f"完整加载: {t_eager:.3f}s  {m_eager / 1e6:8.1f} MB")
+        names = random.Random(0).sample(list(eager), min(active, len(eager)))
+        del eager
+
+        lazy, t_index, m_index = measured(LazyProgram, path, active)
+        print(f"惰性索引: {t_index:.3f}s  {m_index / 1e6:8.1f} MB")
+
+        def touch():
+            lazy._cache.clear()  # 两次运行都从未分析的状态开始
+            for name in names:
+                lazy[name]
+        _, t_touch, m_touch = measured(touch)
+        print(f"访问 {len(names)} 个步骤: {t_touch:.3f}s  +{m_touch / 1e6:7.1f} MB "
+              f"({t_touch / len(names) * 1000:.2f} ms/步骤)")
+        lazy.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# 文件名: bench_lexer.py
+# 对比逐字符扫描与主正则词法分析（Token对象 / 紧凑 TokenStream）的速度
+# 运行: python benchmark/bench_lexer.py [步骤数]
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from interpreter import Lexer, Parser, TokenType
+from dsl_generator import generate_script
+
+def char_by_char_tokenize(script: str):
+    """逐字符扫描的参照实现"""
+    lexer, tokens = Lexer(script), []
+    while True:
+        token = lexer._scan_token()
+        tokens.append(token)
+        if token.type == TokenType.EOF:
+            return tokens
+
+def timed(fn, *args):
+    gc.collect()  # 上一项的结果已释放，各项计时不受彼此存活对象的回收开销影响
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+def digest(tokens) -> tuple:
+    return len(tokens), hash(tuple((t.type, t.value, t.line) for t in tokens))
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    script = generate_script(steps=steps)
+    print(f"脚本大小: {len(script.encode('utf-8')) / 1e6:.1f} MB, 步骤数: {steps}")
+
+    reference, t_ref = timed(char_by_char_tokenize, script)
+    expected, count = digest(reference), len(reference)
+    del reference
+    tokens, t_new = timed(lambda s: Lexer(s).tokenize(), script)
+    assert digest(tokens) == expected
+    del tokens
+    stream, t_stream = timed(lambda s: Lexer(s).token_stream(), script)
+    assert digest(stream) == expected
+    del stream
+    print(f"逐字符扫描: {t_ref:.3f}s  ({count / t_ref:,.0f} tokens/s)")
+    print(f"主正则扫描: {t_new:.3f}s  ({count / t_new:,.0f} tokens/s)  加速 {t_ref / t_new:.1f}x")
+    print(f"TokenStream: {t_stream:.3f}s  ({count / t_stream:,.0f} tokens/s)  加速 {t_ref / t_stream:.1f}x")
+
+    _, t_parse = timed(lambda s: Parser(Lexer(s).tokens()).parse_program(), script)
+    print(f"Token流词法+语法分析: {t_parse:.3f}s")
+    _, t_columns = timed(lambda s: Parser(Lexer(s)).parse_program(), script)
+    print(f"按列词法+语法分析:   {t_columns:.3f}s  加速 {t_parse / t_columns:.1f}x")
+
+if __name__ == '__main__':
+    main()
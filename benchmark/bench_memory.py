@@ -0,0 +1,48 @@
+# 文件名: bench_memory.py
+# 测量Token序列与AST的内存占用
+# 运行: python benchmark/bench_memory.py [步骤数]
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from interpreter import Lexer, Parser
+from dsl_generator import generate_script
+
+def retained(fn, *args):
+    """返回 (结果, 结果仍占用的字节数, 构建过程的峰值字节数)"""
+    gc.collect()
+    tracemalloc.start()
+    result = fn(*args)
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, peak
+
+def mb(n: int) -> str:
+    return f"{n / 1e6:8.1f} MB"
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    script = generate_script(steps=steps)
+    print(f"脚本大小: {len(script.encode('utf-8')) / 1e6:.1f} MB, 步骤数: {steps}")
+
+    tokens, size, peak = retained(lambda s: Lexer(s).tokenize(), script)
+    count = len(tokens)
+    print(f"Token对象列表: {mb(size)}  ({size / count:.0f} B/token, 峰值 {mb(peak)})")
+    del tokens
+
+    stream, size, peak = retained(lambda s: Lexer(s).token_stream(), script)
+    print(f"TokenStream:   {mb(size)}  ({size / count:.0f} B/token, 峰值 {mb(peak)})")
+    del stream
+
+    program, size, peak = retained(lambda s: Parser(Lexer(s).tokens()).parse_program(), script)
+    print(f"AST(Token流):  {mb(size)}  ({size / steps:.0f} B/step, 峰值 {mb(peak)})")
+    del program
+
+    program, size, peak = retained(lambda s: Parser(Lexer(s)).parse_program(), script)
+    print(f"AST(按列解析): {mb(size)}  ({size / steps:.0f} B/step, 峰值 {mb(peak)})")
+
+if __name__ == '__main__':
+    main()
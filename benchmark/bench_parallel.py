@@ -0,0 +1,34 @@
+# 文件名: bench_parallel.py
+# 并行语法分析从1个进程到N个进程的加速比
+# 运行: python benchmark/bench_parallel.py [步骤数] [最大进程数]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from interpreter import Lexer, Parser
+from parallel_parser import parse_sources
+from dsl_generator import generate_script
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    data = generate_script(steps=steps).encode('utf-8')
+    print(f"脚本大小: {len(data) / 1e6:.1f} MB, 步骤数: {steps}, CPU核数: {os.cpu_count()}")
+
+    _, t_seq = timed(lambda: Parser(Lexer(data.decode('utf-8')).tokens()).parse_program())
+    print(f"单进程流式分析: {t_seq:.3f}s")
+
+    workers = sorted({1, max_workers} | {2 ** i for i in range(1, max_workers.bit_length()) if 2 ** i < max_workers})
+    for n in workers:
+        program, t = timed(parse_sources, [('bench.dsl', data)], workers=n)
+        assert len(program.steps) == steps
+        print(f"{n:3d} 个进程: {t:.3f}s  加速 {t_seq / t:.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# 文件名: bench_scaling.py
+# 词法/语法分析的规模曲线：分别改变步骤数、每步分支数、Speak 长度和中文比例，
+# 测量吞吐（tokens/s、steps/s）与峰值内存，并与保存的基线比较，出现回退或基线的解释器版本不同时以非0状态退出
+# 运行: python benchmark/bench_scaling.py [--quick] [--update-baseline] [--tolerance 0.3] [--csv 文件]
+import argparse
+import gc
+import json
+import math
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'back'))
+from interpreter import Lexer, Parser, INTERPRETER_VERSION
+from dsl_generator import generate_script
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baselines', 'scaling.json')
+BASE = {"steps": 2000, "branches": 10, "speak_length": 40, "cjk_ratio": 0.8}
+# 每条曲线只改变一个参数，其余取 BASE
+AXES = {
+    "steps": [500, 2000, 8000, 32000],
+    "branches": [1, 10, 40],
+    "speak_length": [10, 40, 160],
+    "cjk_ratio": [0.0, 0.5, 1.0],
+}
+QUICK_AXES = {"steps": [500, 2000, 8000], "branches": [1, 10, 40], "speak_length": [10, 160], "cjk_ratio": [0.0, 1.0]}
+
+class Result(NamedTuple):
+    case: str
+    params: dict            # generate_script 的参数
+    tokens: int
+    steps: int
+    size: int               # 脚本字节数
+    lex_seconds: float      # 各次重复的中位数
+    parse_seconds: float    # 流式词法+语法分析，各次重复的中位数
+    peak: int               # 流式分析的峰值内存（字节）
+    lex_ratio: float        # 校准耗时 / 词法分析耗时，各次重复的中位数
+    parse_ratio: float      # 校准耗时 / 语法分析耗时，各次重复的中位数
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        按校准负载归一化的吞吐（每个校准耗时内处理的 token/步骤数），使不同机器上的基线可以比较
+        每次重复都紧挨着测一次校准负载，机器负载的波动同时影响两者，比值比绝对耗时稳定得多
+        """
+        return {
+            "tokens_per_s": self.tokens * self.lex_ratio,
+            "steps_per_s": self.steps * self.parse_ratio,
+            "peak_bytes_per_step": self.peak / self.steps,
+        }
+
+_CALIBRATION_WORDS = ("Step Speak Listen Branch " * 5000).split()
+
+def calibrate() -> float:
+    """固定的纯Python负载（字符串切片和字典访问）的耗时，作为机器速度的单位"""
+    started = time.perf_counter()
+    counts = {}
+    for i, word in enumerate(_CALIBRATION_WORDS):
+        counts[word] = counts.get(word, 0) + len(word[i % 3:])
+    return time.perf_counter() - started
+
+def timed_ratio(repeat: int, fn, *args) -> Tuple[float, float]:
+    """返回 (耗时中位数, 校准耗时/耗时 的中位数)；每次运行前后各测一次校准负载"""
+    seconds, ratios = [], []
+    for _ in range(repeat):
+        before = calibrate()
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - started
+        seconds.append(elapsed)
+        ratios.append((before + calibrate()) / 2 / elapsed)
+    return statistics.median(seconds), statistics.median(ratios)
+
+def count_tokens(script: str) -> int:
+    return sum(1 for _ in Lexer(script).tokens())
+
+def parse(script: str):
+    return Parser(Lexer(script)).parse_program()  # 与服务端加载脚本的方式相同：直接读列，不创建Token对象
+
+def peak_memory(script: str) -> int:
+    """流式分析的峰值内存；在新的进程中测量，不受之前用例留下的驻留字符串等状态影响"""
+    gc.collect()
+    tracemalloc.start()
+    parse(script)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def run_case(case: str, params: dict, repeat: int) -> Result:
+    script = generate_script(**params)
+    tokens = count_tokens(script)
+    lex_seconds, lex_ratio = timed_ratio(repeat, count_tokens, script)
+    parse_seconds, parse_ratio = timed_ratio(repeat, parse, script)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        peak = pool.submit(peak_memory, script).result()
+    return Result(case, params, tokens, params["steps"], len(script.encode('utf-8')), lex_seconds, parse_seconds,
+                  peak, lex_ratio, parse_ratio)
+
+def cases(axes: Dict[str, list]):
+    """(用例名, 生成参数)；各曲线在 BASE 处重合的点只运行一次"""
+    seen = set()
+    for axis, values in axes.items():
+        for value in values:
+            params = dict(BASE, **{axis: value})
+            key = tuple(sorted(params.items()))
+            if key not in seen:
+                seen.add(key)
+                yield ",".join(f"{k}={v}" for k, v in params.items()), params
+
+def scaling_exponent(results: List[Result]) -> Optional[float]:
+    """步骤数曲线上 耗时 ~ 步骤数^k 的拟合指数（最小二乘）；线性扩展时约为1"""
+    points = [(math.log(r.steps), math.log(r.parse_seconds)) for r in results]
+    if len(points) < 2:
+        return None
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    return sum((x - mx) * (y - my) for x, y in points) / sum((x - mx) ** 2 for x, _ in points)
+
+def compare(metrics: Dict[str, Dict[str, float]], baseline: dict, tolerance: float,
+            memory_tolerance: float) -> List[str]:
+    """返回相对基线的回退说明；吞吐低于基线 (1-tolerance) 倍或峰值内存高于 (1+memory_tolerance) 倍视为回退"""
+    failures = []
+    for case, values in metrics.items():
+        expected = baseline.get("cases", {}).get(case)
+        if expected is None:
+            continue
+        for key in ("tokens_per_s", "steps_per_s"):
+            if values[key] < expected[key] * (1 - tolerance):
+                failures.append(f"{case}: {key} {values[key]:,.0f} < 基线 {expected[key]:,.0f}")
+        if values["peak_bytes_per_step"] > expected["peak_bytes_per_step"] * (1 + memory_tolerance):
+            failures.append(f"{case}: 峰值内存 {values['peak_bytes_per_step']:,.0f} B/step "
+                            f"> 基线 {expected['peak_bytes_per_step']:,.0f}")
+    max_exponent = baseline.get("max_scaling_exponent")
+    exponent = metrics.get("_scaling", {}).get("exponent")
+    if max_exponent is not None and exponent is not None and exponent > max_exponent:
+        failures.append(f"步骤数扩展指数 {exponent:.2f} > {max_exponent}")
+    return failures
+
+def main():
+    ap = argparse.ArgumentParser(description="词法/语法分析规模基准")
+    ap.add_argument("--quick", action="store_true", help="较少的数据点，用于快速检查")
+    ap.add_argument("--repeat", type=int, default=5, help="每项的重复次数，取耗时的中位数")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true", help="把本次结果写为新的基线")
+    ap.add_argument("--tolerance", type=float, default=0.30, help="允许的吞吐下降比例")
+    ap.add_argument("--memory-tolerance", type=float, default=0.10, help="允许的峰值内存增长比例")
+    ap.add_argument("--csv", help="把每个数据点写入CSV，便于绘制曲线")
+    args = ap.parse_args()
+
+    baseline = None
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("interpreter_version") != INTERPRETER_VERSION:
+            # 词法/语法或AST结构变了，旧基线不再可比；确认新的性能后用 --update-baseline 重新生成
+            print(f"基线的解释器版本 {baseline.get('interpreter_version')} 与当前版本 {INTERPRETER_VERSION} 不同，"
+                  f"请确认后使用 --update-baseline 更新基线")
+            return 1
+
+    print(f"解释器版本 {INTERPRETER_VERSION}，吞吐按校准负载归一化后与基线比较")
+    results = []
+    for case, params in cases(QUICK_AXES if args.quick else AXES):
+        result = run_case(case, params, args.repeat)
+        results.append(result)
+        print(f"{case:58s} {result.size / 1e6:6.2f} MB  "
+              f"{result.tokens / result.lex_seconds:>12,.0f} tokens/s  "
+              f"{result.steps / result.parse_seconds:>9,.0f} steps/s  "
+              f"峰值 {result.peak / result.steps:>7,.0f} B/step")
+
+    metrics = {r.case: r.metrics() for r in results}
+    curve = sorted((r for r in results if all(r.params[k] == v for k, v in BASE.items() if k != "steps")),
+                   key=lambda r: r.steps)
+    exponent = scaling_exponent(curve)
+    if exponent is not None:
+        print(f"步骤数扩展指数: {exponent:.2f}（耗时 ~ 步骤数^k）")
+        metrics["_scaling"] = {"exponent": exponent}
+
+    if args.csv:
+        with open(args.csv, 'w', encoding='utf-8') as f:
+            f.write("case,size,tokens,steps,lex_seconds,parse_seconds,peak\n")
+            for r in results:
+                f.write(f"\"{r.case}\",{r.size},{r.tokens},{r.steps},{r.lex_seconds:.6f},{r.parse_seconds:.6f},{r.peak}\n")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        cases_out = {case: values for case, values in metrics.items() if not case.startswith("_")}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"interpreter_version": INTERPRETER_VERSION, "max_scaling_exponent": 1.2,
+                       "cases": cases_out}, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"基线已写入 {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("没有基线，使用 --update-baseline 生成")
+        return 0
+    failures = compare(metrics, baseline, args.tolerance, args.memory_tolerance)
+    for failure in failures:
+        print(f"回退: {failure}")
+    print("与基线比较: " + ("失败" if failures else "通过"))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# 文件名: bench_sessions.py
+# 测量空闲会话的常驻内存：每个会话一个 DialogueVM 对象（OrderedDict 维护顺序）与 会话表中的一行
+# 运行: python benchmark/bench_sessions.py [会话数]
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from interpreter import Lexer, Parser
+from session_store import SessionStore
+from vm import Bytecode, DialogueVM
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spotServer.dsl')
+
+def objects(program: Bytecode, ids):
+    """每个会话一个对象，按 (对象, 排序时间) 放在 OrderedDict 中"""
+    sessions = OrderedDict()
+    for session_id in ids:
+        vm = DialogueVM(None, program)
+        sessions[session_id] = (vm, vm.last_interaction_time)
+    return sessions
+
+def table(program: Bytecode, ids):
+    store = SessionStore(max_sessions=len(ids))
+    for session_id in ids:
+        store.put(session_id, DialogueVM(None, program))
+    return store
+
+def retained(fn, *args):
+    """返回 (结果, 结果仍占用的字节数, 耗时)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with open(SCRIPT_PATH, encoding='utf-8') as f:
+        program = Bytecode(Parser(Lexer(f.read()).tokens()).parse_program())
+    ids = [str(uuid.uuid4()) for _ in range(count)]  # 会话ID由两种方式共用，不计入
+    for label, build in (("会话对象", objects), ("会话表", table)):
+        result, size, elapsed = retained(build, program, ids)
+        print(f"{label}: {count} 个会话 {size / 1e6:7.1f} MB  ({size / count:5.0f} B/会话, 创建 {elapsed:.2f}s)")
+        del result
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+# 文件名: bench_startup.py
+# 对比冷启动（完整解析并写缓存）与热启动（读取编译缓存）的加载时间
+# 运行: python benchmark/bench_startup.py [步骤数]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from compiler import compile_program
+from program_cache import ProgramCache
+from dsl_generator import generate_script
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        dsl_path = os.path.join(tmp, 'bench.dsl')
+        with open(dsl_path, 'w', encoding='utf-8') as f:
+            f.write(generate_script(steps=steps))
+        print(f"脚本大小: {os.path.getsize(dsl_path) / 1e6:.1f} MB, 步骤数: {steps}")
+
+        cache = ProgramCache(os.path.join(tmp, 'cache'))
+        (program, cached), t_cold = timed(cache.load, dsl_path)
+        assert not cached
+        (program, cached), t_warm = timed(cache.load, dsl_path)
+        assert cached
+        cache_size = sum(os.path.getsize(os.path.join(cache.cache_dir, n)) for n in os.listdir(cache.cache_dir))
+        print(f"冷启动(词法+语法分析+写缓存): {t_cold:.3f}s")
+        print(f"热启动(读取缓存):             {t_warm:.3f}s  加速 {t_cold / t_warm:.1f}x  缓存文件 {cache_size / 1e6:.1f} MB")
+
+        _, t_compile = timed(compile_program, program)
+        print(f"编译分派表(两种启动都需要):   {t_compile:.3f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# 文件名: bench_status_poll.py
+# 对比未到期的静默轮询：完整处理（载入会话、process_user_input("")、写回）与只比较静默截止时间的快速路径
+# 运行: python benchmark/bench_status_poll.py [轮询次数]
+import contextlib
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back'))
+from interpreter import Lexer, Parser
+from session_store import SessionStore
+from vm import Bytecode, DialogueVM
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spotServer.dsl')
+
+def full_poll(store: SessionStore, session_id: str) -> dict:
+    vm = store.get(session_id)
+    response = vm.process_user_input("")
+    store.update(session_id, vm)
+    return response
+
+def fast_poll(store: SessionStore, session_id: str) -> bool:
+    return store.clock() < store.deadline(session_id)
+
+def main():
+    polls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with open(SCRIPT_PATH, encoding='utf-8') as f:
+        program = Bytecode(Parser(Lexer(f.read()).tokens()).parse_program())
+    store = SessionStore(max_sessions=1000)
+    ids = [str(uuid.uuid4()) for _ in range(1000)]
+    for session_id in ids:
+        store.put(session_id, DialogueVM(None, program))
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):  # 调试输出写到空设备
+        timings = []
+        for poll in (full_poll, fast_poll):
+            started = time.perf_counter()
+            for i in range(polls):
+                poll(store, ids[i % len(ids)])
+            timings.append(time.perf_counter() - started)
+    for label, elapsed in zip(("完整处理", "快速路径"), timings):
+        print(f"{label}: {polls / elapsed:>12,.0f} 次/s  ({elapsed / polls * 1e6:6.2f} µs/次)")
+    print(f"加速比: {timings[0] / timings[1]:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# 文件名: dsl_generator.py
+# 生成用于压测的合成DSL脚本
+import random
+
+CJK_CHARS = "门票时间游玩攻略购票物品故宫博物院成人学生老人开放闭馆路线身份证预约小程序请问还有其他可以帮您的吗"
+ASCII_CHARS = "abcdefghijklmnopqrstuvwxyz "
+
+def random_text(rng: random.Random, length: int, cjk_ratio: float) -> str:
+    return "".join(rng.choice(CJK_CHARS) if rng.random() < cjk_ratio else rng.choice(ASCII_CHARS)
+                   for _ in range(length))
+
+def generate_script(steps: int = 1000, branches: int = 10, speak_length: int = 40,
+                    cjk_ratio: float = 0.8, seed: int = 0, groups: int = 0, inline_groups: bool = False) -> str:
+    """
+    生成合成脚本：steps 个步骤，每步 branches 个分支，
+    Speak 文本长度 speak_length，其中约 cjk_ratio 比例为中文字符
+    groups > 0 时先生成 groups 个分支组，每步 Include 其中一个代替自己的分支；
+    inline_groups 为 True 时把分支组展开写在每个步骤里（语义相同，用于对比）
+    """
+    rng = random.Random(seed)
+    names = ["welcome"] + [f"step_{i}" for i in range(1, steps)]
+    def branch_lines():
+        lines = []
+        for b in range(branches):
+            keyword = random_text(rng, rng.randint(2, 4), cjk_ratio).strip() or f"k{b}"
+            lines.append(f'  Branch "{keyword}", {rng.choice(names)}')
+        return lines
+    group_lines = [branch_lines() for _ in range(groups)]
+    lines = []
+    for g, body in enumerate(group_lines if not inline_groups else []):
+        lines.append(f"Group group_{g}")
+        lines.extend(body)
+        lines.append("")
+    for i, name in enumerate(names):
+        lines.append(f"# 第 {i} 步")
+        lines.append(f"Step {name}")
+        lines.append(f'  Speak "{random_text(rng, speak_length, cjk_ratio)}"')
+        lines.append(f"  Listen {rng.randint(5, 15)}, {rng.randint(30, 60)}")
+        if groups:
+            g = rng.randrange(groups)
+            lines.extend(group_lines[g] if inline_groups else [f"  Include group_{g}"])
+        else:
+            lines.extend(branch_lines())
+        lines.append(f"  Silence {rng.choice(names)}")
+        lines.append(f"  Default {rng.choice(names)}")
+        lines.append("")
+    return "\n".join(lines)
@@ -5,7 +5,8 @@ class ChatInterface {
         this.userInput = document.getElementById('userInput');
         this.sendBtn = document.getElementById('sendBtn');
         this.sessionId = null; // 存储会话ID
-        this.silenceTimer = null; // 静默检测定时器
+        this.silenceTimer = null; // 静默检测定时器（浏览器不支持推送时使用）
+        this.events = null; // 服务端推送连接：静默提醒与结束消息由服务端计时后推送
         this.isWaiting = false;
         this.init();
     }
@@ -18,6 +19,7 @@ class ChatInterface {
         
         document.querySelectorAll('.quick-btn').forEach(btn => {
             btn.addEventListener('click', (e) => {
+                if (this.isWaiting) return; // 等待回复期间忽略快捷按钮，避免重复提交
                 const message = e.target.getAttribute('data-message');
                 this.userInput.value = message;
                 this.sendMessage();
@@ -27,6 +29,28 @@ class ChatInterface {
         this.startConversation();
     }
     
+    // --- 服务端推送 ---
+    openEvents() {
+        if (!window.EventSource || !this.sessionId) return;
+        this.events = new EventSource(`/api/events?session_id=${encodeURIComponent(this.sessionId)}`);
+        this.events.onmessage = (e) => {
+            const data = JSON.parse(e.data);
+            this.addBotMessage(data.error || data.message);
+            if (data.end) this.disableInput();
+        };
+        this.events.onerror = () => {
+            // 连接被关闭（而不是正在重连）时退回到浏览器计时
+            if (this.events && this.events.readyState === EventSource.CLOSED) this.events = null;
+        };
+    }
+
+    closeEvents() {
+        if (this.events) {
+            this.events.close();
+            this.events = null;
+        }
+    }
+
     // --- 静默计时器逻辑 ---
     handleSilenceTimer(timeout) {
         // 先清除旧的定时器
@@ -34,6 +58,7 @@ class ChatInterface {
             clearTimeout(this.silenceTimer);
             this.silenceTimer = null;
         }
+        if (this.events) return; // 服务端负责静默计时
 
         // 如果后端返回了有效的超时时间 (毫秒)
         if (timeout && timeout > 0) {
@@ -58,6 +83,7 @@ class ChatInterface {
             }
             
             this.addBotMessage(data.message);
+            this.openEvents();
             // 处理可能的超时设置
             this.handleSilenceTimer(data.timeout);
 
@@ -175,6 +201,7 @@ class ChatInterface {
     }
     
     disableInput() {
+        this.closeEvents();
         this.userInput.disabled = true;
         this.sendBtn.disabled = true;
         document.querySelectorAll('.quick-btn').forEach(btn => btn.disabled = true);
@@ -8,11 +8,14 @@
 
 #python test_suite.py 
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import sys
 import os
 import uuid
-import time
+import hmac
+import math
+import json
+import queue
 
 # 路径配置
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,191 +26,91 @@ if not os.path.exists(backend_dir): # 如果在同一目录下运行
 sys.path.append(backend_dir)
 
 
-from interpreter import Lexer, Parser, LexicalError, SyntaxError, \
-    StepNode, SpeakNode, ListenNode, BranchNode, DefaultNode, ExitNode, SilenceNode
+from interpreter import LexicalError, SyntaxError
 # 确保 LLMClient 在 sys.path 可找到
 from LLMClient import LLMClient
+from intent_cache import IntentCache
+from singleflight import SingleFlight, SingleFlightIntentClient
+from intent_batcher import IntentBatcher
+from intent_classifier import LocalIntentClassifier
+from resilience import ResilientIntentClient, CircuitBreaker
+from program_cache import ProgramCache
+from parallel_parser import parse_sources
+from program_registry import ProgramRegistry, ProgramValidationError
+from vm import DialogueVM
+from session_store import SessionStore
+from session_backends import SQLiteSessionStore, RedisSessionStore
+from silence_timers import SilenceTimers
 from dotenv import load_dotenv
 
 load_dotenv()
 
-class WebDSLInterpreter:
-    def __init__(self, llm_client: LLMClient, steps_data: dict):
-        self.llm_client = llm_client
-        self.steps = steps_data
-        self.silence_count = 0  # 标记是否进入过静默提醒流程
-        self.current_step = "welcome"
-        self.last_interaction_time = time.time()  # 记录最后一次交互时间
-        self.total_silence_start_time = None  # 记录总静默开始时间
-
-    def process_user_input(self, user_input: str = "") -> dict:
-        if self.current_step not in self.steps:
-            return {"error": "对话流程错误，未找到当前步骤。", "end": True}
-
-        step = self.steps[self.current_step]
-        listen_node = next((a for a in step.actions if isinstance(a, ListenNode)), None)
-        
-        # --- 1. 处理用户有输入的情况 ---
-        if user_input:
-            print(f"[Debug] 用户输入: '{user_input}', 重置所有静默计时器")
-            self.last_interaction_time = time.time()
-            self.total_silence_start_time = None  # 重置总静默计时
-            self.silence_count = 0 # 虽然不再主要依赖它，但重置是个好习惯
-
-            # 处理退出关键词
-            if user_input.lower() in ["再见", "退出", "exit", "quit", "没有", "没了"]:
-                if "exitProc" in self.steps:
-                    self.current_step = "exitProc"
-                    return self.get_step_response()
-                return {"message": "感谢您的咨询，再见！", "end": True}
-
-            # 关键词精确匹配
-            branch_nodes = {a.keyword: a for a in step.actions if isinstance(a, BranchNode)}
-            for keyword, branch_action in branch_nodes.items():
-                if keyword in user_input:
-                    self.current_step = branch_action.step_name
-                    return self.get_step_response()
-
-            # LLM 意图识别
-            if branch_nodes:
-                intent = self.llm_client.recognize_intent(user_input, list(branch_nodes.keys()))
-                if intent and intent in branch_nodes:
-                    self.current_step = branch_nodes[intent].step_name
-                    return self.get_step_response()
-
-            # 默认处理
-            default_node = next((a for a in step.actions if isinstance(a, DefaultNode)), None)
-            if default_node:
-                self.current_step = default_node.step_name
-                return self.get_step_response()
-            
-            # 如果连默认处理都没有
-            return {"message": "抱歉，我不太明白。您可以问我关于门票、时间或游玩攻略的问题。", "end": False}
-
-        # --- 2. 处理用户无输入的情况 (超时轮询) ---
-        else:
-            current_time = time.time()
-            single_timeout_sec = listen_node.timeout if listen_node else 10
-            total_timeout_sec = listen_node.total_silence_timeout if listen_node else 30
-
-            # 如果是第一次超时检测，初始化总静默计时器
-            if self.total_silence_start_time is None:
-                self.total_silence_start_time = self.last_interaction_time
-
-            total_silence_elapsed = current_time - self.total_silence_start_time
-            single_silence_elapsed = current_time - self.last_interaction_time
-            
-            print(f"[Debug] 静默检测: 单次已过={single_silence_elapsed:.1f}s (阈值 {single_timeout_sec}s), 总计已过={total_silence_elapsed:.1f}s (阈值 {total_timeout_sec}s)")
-
-            # 检查总静默超时（最高优先级）
-            if total_silence_elapsed >= total_timeout_sec:
-                print(f"[Debug] 总静默超时({total_timeout_sec}s)达到，结束对话")
-                # 尝试根据 DSL 优雅地结束
-                current_silence_node = next((a for a in step.actions if isinstance(a, SilenceNode)), None)
-                if current_silence_node:
-                    self.current_step = current_silence_node.step_name
-                    # 如果silenceProc本身再次超时，它的silence会指向exitProc
-                    silence_step = self.steps.get(self.current_step)
-                    if silence_step:
-                       final_silence_node = next((a for a in silence_step.actions if isinstance(a, SilenceNode)), None)
-                       if final_silence_node:
-                           self.current_step = final_silence_node.step_name
-                           return self.get_step_response()
-
-                return {"message": "长时间无响应，对话已结束。", "end": True}
-
-            # 检查单次静默超时
-            if single_silence_elapsed >= single_timeout_sec:
-                print(f"[Debug] 单次静默超时({single_timeout_sec}s)触发，执行提醒。")
-                self.last_interaction_time = current_time  # 重置单次超时计时器
-
-                silence_node = next((a for a in step.actions if isinstance(a, SilenceNode)), None)
-                if silence_node:
-                    print(f"[Debug] 跳转到静默处理步骤: {silence_node.step_name}")
-                    self.current_step = silence_node.step_name
-                    # 返回新步骤的响应，这是唯一的响应点
-                    return self.get_step_response()
-                else:
-                    print("[Debug] 静默发生，但当前步骤未定义Silence处理，结束对话。")
-                    return {"message": "长时间无响应，对话已结束。", "end": True}
-            
-            # **关键修复**: 如果没有达到任何超时条件，返回一个“无操作”的空消息响应
-            else:
-                print("[Debug] 轮询未超时，不发送消息。")
-                response = self.get_step_response() # 获取状态信息
-                response['message'] = '' # 清空消息体
-                response['no_op'] = True # 添加一个无操作标记（可选，方便前端调试）
-                return response
-
-    def get_step_response(self) -> dict:
-        """获取当前步骤的响应，包含正确的超时配置"""
-        if self.current_step not in self.steps:
-            return {"error": "步骤不存在", "end": True}
-
-        step = self.steps[self.current_step]
-        messages = []
-        end_conversation = False
-
-        # --- 获取超时配置 ---
-        single_timeout_sec = 10
-        total_timeout_sec = 30
-
-        listen_node = next((a for a in step.actions if isinstance(a, ListenNode)), None)
-        if listen_node:
-            single_timeout_sec = listen_node.timeout
-            total_timeout_sec = listen_node.total_silence_timeout
-
-        # 收集所有消息，但避免重复内容
-        seen_messages = set()
-        for action in step.actions:
-            if isinstance(action, SpeakNode):
-                # 检查消息是否已经存在，避免重复
-                if action.message not in seen_messages:
-                    messages.append(action.message)
-                    seen_messages.add(action.message)
-            elif isinstance(action, ExitNode):
-                end_conversation = True
-
-        # 计算剩余总静默时间
-        remaining_total_timeout = total_timeout_sec
-        if self.total_silence_start_time is not None:
-            elapsed = time.time() - self.total_silence_start_time
-            remaining_total_timeout = max(0, total_timeout_sec - elapsed)
-
-        response_data = {
-            "message": "\n".join(messages),
-            "end": end_conversation,
-            "current_step": self.current_step,
-            "timeout": single_timeout_sec * 1000,  # 单次超时(提醒用)
-            "total_silence_timeout": total_timeout_sec, # 总超时配置
-            "remaining_total_timeout": remaining_total_timeout, # 剩余总静默时间
-            "current_silence_count": self.silence_count
-        }
-        print(f"[Debug] 发送响应: step={self.current_step}, 消息数量={len(messages)}, silence_count={self.silence_count}")
-        return response_data
-
-    def reset_conversation(self):
-        self.current_step = "welcome"
-        self.silence_count = 0
-        self.last_interaction_time = time.time()
-        self.total_silence_start_time = None
-        return self.get_step_response()
-
 # --- 全局初始化 ---
 app = Flask(__name__)
-user_sessions = {}
-global_steps_ast = {}
+message_flight = SingleFlight()  # 合并同一会话重复提交的相同消息（如连击发送）
+global_programs = None  # ProgramRegistry，current 为新会话使用的程序版本
 global_llm_client = None
+user_sessions = None  # SessionStore，init_system 中创建
+silence_timers = None  # SilenceTimers，为订阅了推送的会话在服务端计时
+global_metrics = {}  # 名称 -> 提供 stats() 的组件，由 /api/metrics 汇总
+# 静默轮询未到期时的响应：默认为固定的无操作JSON；SESSION_STATUS_NO_CONTENT=1 时返回 204
+NO_OP_BODY = json.dumps({"message": "", "end": False, "no_op": True}).encode()
+NO_OP_STATUS = ('', 204) if os.getenv("SESSION_STATUS_NO_CONTENT") == "1" else None
 
 def init_system():
-    global global_llm_client, global_steps_ast
+    global global_llm_client, global_programs, user_sessions, silence_timers
     app_id = os.getenv("SPARK_APP_ID")
     api_key = os.getenv("SPARK_API_KEY")
     api_secret = os.getenv("SPARK_API_SECRET")
     if not all([app_id, api_key, api_secret]):
         raise ValueError("请在 .env 文件中配置星火大模型的 SPARK_APP_ID, SPARK_API_KEY, SPARK_API_SECRET")
 
-    global_llm_client = LLMClient(app_id, api_key, api_secret, spark_version="v3.5")
+    pool_size = int(os.getenv("SPARK_POOL_SIZE", "4"))  # 星火连接池大小（同时也是I/O线程数）
+    max_timeout = float(os.getenv("LLM_MAX_TIMEOUT", "10"))
+    llm_client = LLMClient(app_id, api_key, api_secret, spark_version="v3.5", pool_size=pool_size,
+                           timeout=max_timeout, raise_errors=True)
+    global_metrics["llm"] = llm_client
+    batch_size = int(os.getenv("INTENT_BATCH_SIZE", "1"))
+    if batch_size > 1:
+        # 高并发时把多个会话的兜底问题合并为一次请求
+        llm_client = IntentBatcher(
+            llm_client,
+            max_batch=batch_size,
+            max_wait=float(os.getenv("INTENT_BATCH_WAIT_MS", "5")) / 1000,
+            latency_budget=llm_client.timeout,
+            max_inflight=pool_size,
+        )
+        global_metrics["batcher"] = llm_client
+    # 自适应截止时间 + 对冲请求 + 熔断，上游不可用时直接走 Default 分支
+    llm_client = ResilientIntentClient(
+        llm_client,
+        min_timeout=float(os.getenv("LLM_MIN_TIMEOUT", "1")),
+        max_timeout=max_timeout,
+        hedge=os.getenv("LLM_HEDGE", "1") == "1",
+        breaker=CircuitBreaker(
+            failure_threshold=float(os.getenv("LLM_BREAKER_THRESHOLD", "0.5")),
+            cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+        ),
+        max_workers=pool_size * 2,
+    )
+    global_metrics["resilience"] = llm_client
+    # 本地分类层：置信度足够时不再请求大模型，其余交给单飞层（同时到达的相同问题只请求一次）
+    local_classifier = LocalIntentClassifier(
+        fallback=SingleFlightIntentClient(llm_client),
+        threshold=float(os.getenv("LOCAL_INTENT_THRESHOLD", "0.5")),
+    )
+    examples_path = os.getenv("INTENT_EXAMPLES")  # 可选：{用户输入: 意图} 格式的JSON标注样例
+    if examples_path:
+        with open(examples_path, 'r', encoding='utf-8') as f:
+            local_classifier.add_examples(json.load(f))
+    # 重复的兜底问题直接命中缓存
+    global_llm_client = IntentCache(
+        local_classifier,
+        max_size=int(os.getenv("INTENT_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("INTENT_CACHE_TTL", "600")),
+    )
+    global_metrics["local_classifier"] = local_classifier
+    global_metrics["intent_cache"] = global_llm_client
 
     # 适应不同运行环境的路径
     dsl_path = os.path.join(current_dir, '..', 'productSale.dsl')
@@ -216,27 +119,68 @@ def init_system():
     if not os.path.exists(dsl_path):
         raise FileNotFoundError("无法找到 spotServer.dsl 文件")
 
-    with open(dsl_path, 'r', encoding='utf-8') as f:
-        script = f.read()
-
+    # 源码未变时直接读取编译缓存，跳过词法和语法分析；未命中时边词法分析边语法分析并写入缓存
+    # DSL_PARSE_WORKERS 大于1时，缓存未命中的完整分析在多个进程中按 Step 边界分段并行进行
+    parse_workers = int(os.getenv("DSL_PARSE_WORKERS", "1"))
+    parse = None
+    if parse_workers > 1:
+        parse = lambda path, source: parse_sources([(path, source)], parse_workers, allow_duplicates=True)
+    program_cache = ProgramCache(os.getenv("DSL_CACHE_DIR", os.path.join(os.path.dirname(dsl_path), '.dslcache')), parse)
+    global_metrics["program_cache"] = program_cache
+
+    def train_classifier(program):
+        local_classifier.add_program(program)
+        local_classifier.fit()
+
+    # 程序按版本登记：热加载只替换新会话使用的版本，已有会话继续使用开始时的版本
+    # DSL_LAZY_STEPS 大于0时映射脚本文件、按需分析步骤，适合几百MB的生成脚本
+    global_programs = ProgramRegistry(dsl_path, program_cache, os.getenv("BRANCH_MATCH_POLICY", "order"),
+                                      on_load=train_classifier, lazy_steps=int(os.getenv("DSL_LAZY_STEPS", "0")))
     try:
-        lexer = Lexer(script)
-        tokens = lexer.tokenize()
-        parser = Parser(tokens)
-        program = parser.parse_program()
-    except (LexicalError, SyntaxError) as e:
+        version = global_programs.load()
+    except (LexicalError, SyntaxError, ProgramValidationError) as e:
         raise RuntimeError(f"解析DSL文件失败: {e}")
-
-    for step in program.steps:
-        global_steps_ast[step.name] = step
-
-    print(f"系统初始化完成，加载了 {len(global_steps_ast)} 个步骤。")
-
-try:
-    init_system()
-except Exception as e:
-    print(f"FATAL: 系统初始化失败: {e}")
-    global_llm_client = None # 标记服务不可用
+    global_metrics["programs"] = global_programs
+    for warning in global_programs.warnings:
+        print(f"警告: {warning}")
+
+    # 会话存储：空闲超过 SESSION_TTL 秒（从最后一次交互算起）过期，最多保留 SESSION_MAX 个会话
+    # memory（默认）：会话状态按行存放在本进程预分配的数组表中，程序和意图识别客户端由所有会话共享
+    # sqlite / redis：多个工作进程共享会话，任一进程都能处理任一会话的请求，重启后会话仍在
+    session_options = dict(max_sessions=int(os.getenv("SESSION_MAX", "100000")),
+                           ttl=float(os.getenv("SESSION_TTL", "1800")), llm_client=global_llm_client)
+    backend = os.getenv("SESSION_BACKEND", "memory")
+    if backend == "sqlite":
+        user_sessions = SQLiteSessionStore(os.getenv("SESSION_DB", os.path.join(os.path.dirname(dsl_path), '.sessions.db')),
+                                           lambda: global_programs.current, refresh=global_programs.refresh,
+                                           **session_options)
+    elif backend == "redis":
+        user_sessions = RedisSessionStore(os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"),
+                                          lambda: global_programs.current, refresh=global_programs.refresh,
+                                          **session_options)
+    else:
+        user_sessions = SessionStore(**session_options)
+    global_metrics["sessions"] = user_sessions
+    user_sessions.start_sweeper(float(os.getenv("SESSION_SWEEP_INTERVAL", "60")))
+    # 静默截止时间放在分层时间轮中，到期后服务端执行静默处理并通过 /api/events 推送
+    silence_timers = SilenceTimers(user_sessions, tick=float(os.getenv("SILENCE_TICK", "0.1")))
+    silence_timers.start()
+    global_metrics["silence_timers"] = silence_timers
+
+    watch_interval = float(os.getenv("DSL_WATCH_INTERVAL", "0"))  # 大于0时轮询脚本修改并自动热加载
+    if watch_interval > 0:
+        global_programs.watch(watch_interval)
+
+    print(f"系统初始化完成，加载了 {len(version)} 个步骤{'（编译缓存）' if program_cache.hits else ''}。")
+
+# 以 spawn 方式启动的工作进程（如 DSL_PARSE_WORKERS 的分析进程）会以 __mp_main__ 的名字重新导入直接运行的本文件，
+# 这时不再初始化：否则每个工作进程都会再次加载脚本、创建进程池和后台线程
+if __name__ != '__mp_main__':
+    try:
+        init_system()
+    except Exception as e:
+        print(f"FATAL: 系统初始化失败: {e}")
+        global_llm_client = None # 标记服务不可用
 
 # --- Flask 路由定义 ---
 @app.route('/')
@@ -245,55 +189,132 @@ def index():
 
 @app.route('/api/start', methods=['POST'])
 def start_conversation():
-    if not global_llm_client or not global_steps_ast:
+    if not global_llm_client or not global_programs:
         return jsonify({"error": "服务正在初始化或初始化失败，请稍后重试。", "end": True}), 503
     session_id = str(uuid.uuid4())
-    interpreter = WebDSLInterpreter(global_llm_client, global_steps_ast)
-    user_sessions[session_id] = interpreter
+    interpreter = DialogueVM(global_llm_client, global_programs.current)  # 会话绑定当前版本，直到结束
     response = interpreter.reset_conversation()
+    user_sessions.put(session_id, interpreter)
     response['session_id'] = session_id
     return jsonify(response)
 
 @app.route('/api/message', methods=['POST'])
 def handle_message():
-    if not global_llm_client or not global_steps_ast:
+    if not global_llm_client or not global_programs:
         return jsonify({"error": "服务未就绪。", "end": True}), 503
 
     data = request.json
     session_id = data.get('session_id')
     user_input = data.get('message', '').strip()
 
-    if not session_id or session_id not in user_sessions:
+    if not session_id:
         return jsonify({"error": "会话已过期，请刷新页面开始新的对话。", "end": True})
-
-    interpreter = user_sessions[session_id]
-    response = interpreter.process_user_input(user_input)
-
-    if response.get('end'):
-        if session_id in user_sessions:
-            del user_sessions[session_id]
-            print(f"会话 {session_id} 已结束并清理。")
-
+    if not user_input:
+        # 页面自行计时时的静默消息：未到写回时算好的静默截止时间则不载入会话，返回剩余毫秒数供页面重新计时
+        deadline = user_sessions.deadline(session_id)
+        if deadline is None:
+            return jsonify({"error": "会话已过期，请刷新页面开始新的对话。", "end": True})
+        remaining = deadline - user_sessions.clock()
+        if remaining > 0:
+            return jsonify({"message": "", "end": False, "no_op": True, "timeout": math.ceil(remaining * 1000)})
+    # 载入、处理和写回都在单飞内完成，合并的重复请求不会用旧状态覆盖结果
+    response = message_flight.do((session_id, user_input), lambda: run_turn(session_id, user_input))
     return jsonify(response)
 
+def run_turn(session_id: str, user_input: str) -> dict:
+    """载入会话执行一轮，结束时移除，否则写回状态；与服务端的静默处理共用会话锁，两者不会交错写回"""
+    with silence_timers.locks.hold(session_id):
+        return _run_turn(session_id, user_input)
+
+def _run_turn(session_id: str, user_input: str, attempts: int = 3) -> dict:
+    # 共享会话存储按比较后交换写回：其他工作进程同时处理了同一会话时写回失败，在最新状态上重新处理这一轮
+    for _ in range(attempts):
+        interpreter = user_sessions.get(session_id)
+        if interpreter is None:
+            return {"error": "会话已过期，请刷新页面开始新的对话。", "end": True}
+        response = interpreter.process_user_input(user_input)
+        if response.get('end'):
+            if user_sessions.remove(session_id):
+                silence_timers.reschedule(session_id, None)
+                print(f"会话 {session_id} 已结束并清理。")
+                return response
+        elif user_sessions.update(session_id, interpreter):
+            silence_timers.reschedule(session_id, interpreter)  # 有新的交互，静默计时重新开始
+            return response
+        print(f"会话 {session_id} 同时被其他请求修改，重新处理")
+    return {"error": "会话繁忙，请稍后重试。", "end": False}
+
 # 添加会话状态检查接口
 @app.route('/api/session_status', methods=['POST'])
 def check_session_status():
     """检查会话状态和静默超时"""
-    if not global_llm_client or not global_steps_ast:
+    if not global_llm_client or not global_programs:
         return jsonify({"error": "服务未就绪。", "end": True}), 503
 
     data = request.json
     session_id = data.get('session_id')
 
-    if not session_id or session_id not in user_sessions:
+    # 快速路径：与写回会话时算好的静默截止时间比较，未到期时直接返回固定的无操作响应
+    deadline = user_sessions.deadline(session_id) if session_id else None
+    if deadline is None:
         return jsonify({"error": "会话不存在", "end": True})
-
-    interpreter = user_sessions[session_id]
-    
-    # 模拟超时检查（空输入触发静默处理）
-    response = interpreter.process_user_input("")
-    return jsonify(response)
+    if user_sessions.clock() < deadline:
+        return NO_OP_STATUS if NO_OP_STATUS is not None else Response(NO_OP_BODY, mimetype='application/json')
+
+    # 模拟超时检查（空输入触发静默处理）；与处理消息相同，持有会话锁并在写回冲突时重新处理
+    return jsonify(run_turn(session_id, ""))
+
+@app.route('/api/events', methods=['GET'])
+def session_events():
+    """
+    Server-Sent Events：推送服务端静默计时产生的提醒和结束消息
+    连接期间客户端无需再轮询 /api/session_status；连接断开后停止计时
+    """
+    if not global_llm_client or not global_programs:
+        return jsonify({"error": "服务未就绪。", "end": True}), 503
+    session_id = request.args.get('session_id', '')
+    events = silence_timers.subscribe(session_id)
+    keepalive = float(os.getenv("SSE_KEEPALIVE", "25"))
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"  # 防止代理关闭空闲连接
+                    continue
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if event.get('end'):
+                    return
+        finally:
+            silence_timers.unsubscribe(session_id, events)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """意图识别各层的运行指标"""
+    return jsonify({name: component.stats() for name, component in global_metrics.items()})
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_program():
+    """在后台重新解析DSL脚本，校验通过后新会话使用新版本"""
+    if not global_programs:
+        return jsonify({"error": "服务未就绪。"}), 503
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        return jsonify({"error": "未启用管理接口。"}), 404  # 未配置令牌时不开放
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return jsonify({"error": "未授权。"}), 403
+    try:
+        version = global_programs.reload().result()
+    except (LexicalError, SyntaxError, ProgramValidationError, OSError) as e:
+        return jsonify({"error": f"重新加载失败，继续使用旧版本: {e}", **global_programs.stats()}), 400
+    print(f"DSL脚本已重新加载，版本 {version.version}，共 {len(version)} 个步骤。")
+    return jsonify({"steps": len(version), **global_programs.stats()})
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
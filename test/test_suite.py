@@ -2,6 +2,15 @@
 import unittest#标准单元测试框架
 import sys
 import os
+import json
+import random
+import subprocess
+import asyncio
+import threading
+import time
+import gc
+import tempfile
+from typing import Optional
 from unittest.mock import MagicMock, patch#用于模拟对象
 
 # 设置模块导入路径
@@ -14,6 +23,7 @@ def setup_module_paths():
         project_root,
         os.path.join(project_root, 'back'),
         os.path.join(project_root, 'webapp'),
+        os.path.join(project_root, 'frontend'),
         current_dir
     ]
      # 将这些路径加入 sys.path
@@ -24,89 +34,64 @@ def setup_module_paths():
 setup_module_paths()#执行路径设置
 
 from interpreter import Lexer, Parser, LexicalError, SyntaxError
-from LLMClient import LLMClient
+from LLMClient import LLMClient, LLMError
+from intent_cache import IntentCache
+from singleflight import SingleFlight, SingleFlightIntentClient
+from intent_batcher import IntentBatcher
+from intent_classifier import LocalIntentClassifier
+from matcher import KeywordMatcher
+from compiler import compile_program
+from program_cache import ProgramCache, CACHE_FORMAT, source_key, program_key, dumps_program, loads_program, encode_step
+from program_registry import ProgramRegistry, ProgramValidationError
+from incremental import IncrementalProgram, StepDiff
+from lazy_program import LazyProgram
+from parallel_parser import parse_sources, split_chunks, DuplicateStepError
+from vm import Bytecode, DialogueVM, MISSING, NO_STEP
+from session_store import SessionStore
+from session_backends import SQLiteSessionStore, BatchQueue, encode_session, decode_session, session_deadline
+from timer_wheel import TimerWheel
+from silence_timers import SilenceTimers
+from resilience import ResilientIntentClient, CircuitBreaker, CircuitOpenError, LatencyTracker
 from test_stubs import LLMClientStub, DSLScriptStub
+try:
+    import websockets
+except ImportError:
+    websockets = None
 
 
 class TestableDSLInterpreter:
+    """
+    集成测试的对话入口：与 web_output 一样把脚本编译为 Bytecode、由 DialogueVM 执行，只把响应转换为文本
+    """
     def __init__(self, llm_client):
         self.llm_client = llm_client
-        self.steps = {}
-        self.silence_count = 0
-        self.current_step = "welcome"
+        self.vm: Optional[DialogueVM] = None
 
     def load_dsl_script(self, script: str) -> bool:
-        """加载DSL脚本并解析为AST"""
+        """加载DSL脚本并编译为 Bytecode"""
         try:
-            lexer = Lexer(script)
-            tokens = lexer.tokenize()
-            parser = Parser(tokens)
-            ast = parser.parse_program()
-            self.steps.clear()
-            for step in ast.steps:
-                self.steps[step.name] = step
-            return True
+            program = Bytecode(Parser(Lexer(script)).parse_program())
         except (LexicalError, SyntaxError) as e:
             print(f"DSL解析失败: {e}")
             return False
+        self.vm = DialogueVM(self.llm_client, program)
+        return True
+
+    @property
+    def current_step(self) -> Optional[str]:
+        return self.vm.current_step
 
     def process_input(self, user_input: str) -> str:
-        """处理用户输入并返回响应"""
-        if self.current_step not in self.steps:
-            return "对话流程错误，未找到当前步骤。"  
+        """处理用户输入并返回响应文本；与 /api/message 一样去掉首尾空白，空输入按静默处理"""
+        return self._text(self.vm.process_user_input(user_input.strip()))
 
-        step = self.steps[self.current_step]
-        # 处理退出
-        exit_keywords = ["再见", "退出", "exit", "quit", "没有", "没了"]
-        if any(keyword in user_input.lower() for keyword in exit_keywords):
-            return "感谢咨询，再见！"
-
-         # 收集当前步骤下所有的分支节点 (关键词 -> 下一步骤名)
-        branch_nodes = {}
-        for action in step.actions:#检查 action 对象是否有 keyword 属性
-            if hasattr(action, 'keyword') and hasattr(action, 'step_name'):  # BranchNode
-                branch_nodes[action.keyword] = action.step_name
-
-        # 精确匹配
-        for keyword, step_name in branch_nodes.items():
-            if keyword in user_input:
-                self.current_step = step_name
-                return self.get_step_response()
-
-        # LLM 意图识别
-        if branch_nodes:
-            intent = self.llm_client.recognize_intent(user_input, list(branch_nodes.keys()))
-            if intent and intent in branch_nodes:
-                self.current_step = branch_nodes[intent]
-                return self.get_step_response()
-
-        # 默认处理
-        default_node = next((a for a in step.actions if hasattr(a, 'step_name') and not hasattr(a, 'keyword')), None)
-        if default_node:
-            self.current_step = default_node.step_name
-            return self.get_step_response()
-
-        return "抱歉，我不太理解您的问题。"
-
-    def get_step_response(self) -> str:
-        """获取当前步骤的响应"""
-        if self.current_step not in self.steps:
-            return "步骤不存在"  # 与实际实现保持一致
-
-        step = self.steps[self.current_step]
-        messages = []
-
-        for action in step.actions:
-            if hasattr(action, 'message'):  # SpeakNode
-                messages.append(action.message)
-
-        return "\n".join(messages)
-
-    def reset_conversation(self):
+    def reset_conversation(self) -> str:
         """重置对话状态"""
-        self.current_step = "welcome"
-        self.silence_count = 0
-        return self.get_step_response()
+        return self._text(self.vm.reset_conversation())
+
+    @staticmethod
+    def _text(response: dict) -> str:
+        return response.get("message") or response.get("error", "")
 
 
 class TestDSLInterpreterUnit(unittest.TestCase):
@@ -222,6 +207,1001 @@ class TestDSLInterpreterUnit(unittest.TestCase):
         self.assertEqual(len(ast.steps), 0)
         print("  Parser空脚本测试通过")
 
+    def test_lexer_matches_char_scan(self):
+        """测试主正则词法分析与逐字符扫描结果一致（含注释、多行字符串与非法字符）"""
+        print("\n[单元测试] -> Lexer主正则一致性测试")
+        scripts = [
+            '# 注释\nStep welcome\n  Speak "多行\n消息"\n  Listen 5, 20\n  Branch "门票", ticket_1\n',
+            'Step a_1 x²3 Exit',
+            'Step s\n  Speak "未闭合',
+            'Step s\n  Speak @',
+            'Stepx Step_1 Exit² Listen 1²2, ²x\n\n',  # 关键字前缀、²开头的标识符与数字
+            'Step s\n  Speak "a"\n  Speak "b\n\nc" \n  Exit  # 结尾\n  \n',
+        ]
+        for script in scripts:
+            with self.subTest(script=script):
+                reference, lexer = [], Lexer(script)
+                try:
+                    while not reference or reference[-1].type.name != 'EOF':
+                        reference.append(lexer._scan_token())
+                except LexicalError as e:
+                    with self.assertRaises(LexicalError) as ctx:
+                        Lexer(script).tokenize()
+                    self.assertEqual(str(ctx.exception), str(e))
+                    continue
+                tokens = Lexer(script).tokenize()
+                self.assertEqual([(t.type, t.value, t.line) for t in tokens],
+                                 [(t.type, t.value, t.line) for t in reference])
+        print("  Lexer主正则一致性测试通过")
+
+    def test_parser_streaming_tokens(self):
+        """测试Parser直接消费惰性Token流"""
+        print("\n[单元测试] -> Parser流式Token测试")
+        script = 'Step welcome\n  Speak "你好"\n  Listen 5, 20\n  Exit\n'
+        ast = Parser(Lexer(script).tokens()).parse_program()
+        self.assertEqual([s.name for s in ast.steps], ['welcome'])
+        self.assertEqual(len(ast.steps[0].actions), 3)
+        # 从指定行号开始分析片段，行号保持全局
+        with self.assertRaises(SyntaxError) as ctx:
+            Parser(Lexer('Step s\n  Listen x', line=41).tokens()).parse_program()
+        self.assertIn("Line 42", str(ctx.exception))
+        print("  Parser流式Token测试通过")
+
+    def test_token_stream_compact(self):
+        """测试紧凑TokenStream与Token列表一致，AST节点无__dict__且步骤名被驻留"""
+        print("\n[单元测试] -> TokenStream紧凑表示测试")
+        script = ('Step welcome\n  Speak "多行\n消息"\n  Listen 5, 20\n'
+                  '  Branch "门票", ticket\n  Default welcome\nStep ticket\n  Exit\n')
+        stream = Lexer(script).token_stream()
+        self.assertEqual([(t.type, t.value, t.line) for t in stream],
+                         [(t.type, t.value, t.line) for t in Lexer(script).tokenize()])
+        self.assertEqual(stream[-1].type.name, 'EOF')
+        self.assertLess(stream.nbytes(), 32 * len(stream))
+
+        ast = Parser(stream).parse_program()
+        welcome, ticket = ast.steps
+        self.assertFalse(hasattr(welcome, '__dict__'))
+        self.assertFalse(any(hasattr(a, '__dict__') for a in welcome.actions))
+        self.assertIs(welcome.actions[2].step_name, ticket.name)
+        self.assertIs(welcome.actions[3].step_name, welcome.name)
+        # Parser 直接读 Lexer 的列（服务端加载脚本的方式），结果与读Token对象时相同
+        expected = dumps_program(Parser(Lexer(script).tokens()).parse_program())
+        self.assertEqual(dumps_program(Parser(Lexer(script)).parse_program()), expected)
+        self.assertEqual(dumps_program(ast), expected)
+        for broken in ('Step s\n  Listen x', 'Step s\n  Speak "a"\n  Group', 'Step x²\n\n ²s'):
+            with self.assertRaises(SyntaxError) as ctx:
+                Parser(Lexer(broken, line=41).tokens()).parse_program()
+            with self.assertRaises(SyntaxError) as column_ctx:
+                Parser(Lexer(broken, line=41)).parse_program()
+            self.assertEqual(str(column_ctx.exception), str(ctx.exception))  # 行号同样保持全局
+        print("  TokenStream紧凑表示测试通过")
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    """Aho-Corasick 关键词匹配器测试"""
+
+    def test_overlapping_keywords_policies(self):
+        """测试重叠关键词按策略确定性地选出"""
+        print("\n[单元测试] -> 关键词匹配策略测试")
+        keywords = ["票", "门票", "成人票"]
+        self.assertEqual(KeywordMatcher(keywords).match("成人票多少钱"), "票")
+        self.assertEqual(KeywordMatcher(keywords, "longest").match("成人票多少钱"), "成人票")
+        self.assertEqual(KeywordMatcher(keywords, "longest").match("门票和成人票"), "成人票")
+        self.assertIsNone(KeywordMatcher(keywords).match("几点开门"))
+        with self.assertRaises(ValueError):
+            KeywordMatcher(keywords, "shortest")
+        print("  关键词匹配策略测试通过")
+
+    def test_order_policy_matches_substring_scan(self):
+        """测试声明顺序策略与逐个 keyword in text 的结果一致"""
+        print("\n[单元测试] -> 关键词匹配一致性测试")
+        rng = random.Random(7)
+        alphabet = "ab门票成人"
+        for _ in range(500):
+            keywords = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(6)]
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            expected = next((k for k in keywords if k in text), None)
+            self.assertEqual(KeywordMatcher(keywords).match(text), expected, (keywords, text))
+        print("  关键词匹配一致性测试通过")
+
+
+
+class TestCompiler(unittest.TestCase):
+    """AST编译为分派表的测试"""
+
+    def test_compiled_step_fields(self):
+        """测试编译后的步骤记录"""
+        print("\n[单元测试] -> 步骤编译测试")
+        script = """
+Step welcome
+  Speak "你好"
+  Speak "你好"
+  Speak "请问有什么可以帮您？"
+  Listen 5, 20
+  Branch "门票", ticket
+  Branch "票", other
+  Branch "门票", ticket2
+  Silence silence_step
+  Default fallback
+  Default ignored
+Step bye
+  Speak "再见"
+  Exit
+"""
+        steps = compile_program(Parser(Lexer(script).tokenize()).parse_program())
+        welcome = steps["welcome"]
+        self.assertEqual(welcome.message, "你好\n请问有什么可以帮您？")
+        self.assertEqual(welcome.message_count, 2)
+        self.assertEqual((welcome.timeout, welcome.total_silence_timeout), (5, 20))
+        self.assertEqual(welcome.silence_target, "silence_step")
+        self.assertEqual(welcome.default_target, "fallback")
+        self.assertEqual(welcome.intents, ("门票", "票"))
+        self.assertEqual(welcome.branches[welcome.matcher.match("门票多少钱")], "ticket2")  # 重复关键词以后者为准
+        self.assertFalse(welcome.end)
+        with self.assertRaises(TypeError):
+            welcome.branches["新"] = "x"
+
+        bye = steps["bye"]
+        self.assertTrue(bye.end)
+        self.assertEqual((bye.timeout, bye.total_silence_timeout), (10, 30))
+        self.assertIsNone(bye.default_target)
+        print("  步骤编译测试通过")
+
+
+class TestBranchGroups(unittest.TestCase):
+    """分支组（Group/Include）与分支表驻留测试"""
+
+    SCRIPT = """
+Group menu
+  Branch "门票", ticket
+  Branch "时间", time
+Step welcome
+  Speak "欢迎"
+  Branch "你好", welcome
+  Include menu
+  Branch "时间", welcome
+Step ticket
+  Include menu
+Step time
+  Include menu
+"""
+
+    def test_include_expands_and_shares_tables(self):
+        """测试 Include 在所在位置展开分支组，相同的分支表共用一个 matcher"""
+        print("\n[单元测试] -> 分支组测试")
+        program = Parser(Lexer(self.SCRIPT).tokens()).parse_program()
+        steps = compile_program(program)
+        self.assertEqual(list(steps), ["welcome", "ticket", "time"])  # 分支组不是步骤
+        welcome = steps["welcome"]
+        self.assertEqual(welcome.intents, ("你好", "门票", "时间"))
+        self.assertEqual(welcome.branches["时间"], "welcome")  # 与重复的 Branch 一样以后者为准
+        self.assertIs(steps["ticket"].matcher, steps["time"].matcher)
+        self.assertIs(steps["ticket"].branches, steps["time"].branches)
+        self.assertEqual(loads_program(dumps_program(program)).steps[0].name, "menu")
+        print("  分支组测试通过")
+
+    def test_group_errors(self):
+        """测试分支组中只能有 Branch，且 Include 的分支组必须已定义"""
+        print("\n[单元测试] -> 分支组错误测试")
+        with self.assertRaises(SyntaxError) as ctx:
+            Parser(Lexer('Group menu\n  Speak "x"\n').tokens()).parse_program()
+        self.assertIn("Line 2", str(ctx.exception))
+        with self.assertRaises(SyntaxError):
+            compile_program(Parser(Lexer("Step welcome\n  Include nothing\n").tokens()).parse_program())
+        print("  分支组错误测试通过")
+
+
+class TestProgramCache(unittest.TestCase):
+    """编译结果缓存测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dsl_path = os.path.join(self.tmp.name, "test.dsl")
+        self.cache = ProgramCache(os.path.join(self.tmp.name, "cache"))
+
+    def write_script(self, script):
+        with open(self.dsl_path, "w", encoding="utf-8") as f:
+            f.write(script)
+
+    def test_warm_load_skips_parsing(self):
+        """测试第二次加载命中缓存且AST与完整解析一致"""
+        print("\n[单元测试] -> 编译缓存命中测试")
+        script = DSLScriptStub.get_test_dsl()
+        self.write_script(script)
+        cold, cached = self.cache.load(self.dsl_path)
+        self.assertFalse(cached)
+        with patch.object(Parser, "parse_program", side_effect=AssertionError("不应重新解析")):
+            warm, cached = self.cache.load(self.dsl_path)
+        self.assertTrue(cached)
+        self.assertEqual(dumps_program(warm), dumps_program(Parser(Lexer(script).tokens()).parse_program()))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        print("  编译缓存命中测试通过")
+
+    def test_changed_or_corrupt_cache_falls_back(self):
+        """测试源码变化或缓存损坏时回退到完整解析"""
+        print("\n[单元测试] -> 编译缓存失效测试")
+        self.write_script('Step welcome\n  Speak "旧"\n')
+        self.cache.load(self.dsl_path)
+        self.write_script('Step welcome\n  Speak "新"\n')
+        program, cached = self.cache.load(self.dsl_path)
+        self.assertFalse(cached)
+        self.assertEqual(program.steps[0].actions[0].message, "新")
+
+        with open(self.dsl_path, "rb") as f:
+            key = source_key(f.read())
+        with open(self.cache.path_for(key), "r+b") as f:
+            f.truncate(len(CACHE_FORMAT) + len(key) + 3)
+        program, cached = self.cache.load(self.dsl_path)
+        self.assertFalse(cached)
+        self.assertEqual(program.steps[0].actions[0].message, "新")
+        print("  编译缓存失效测试通过")
+
+
+class TestProgramRegistry(unittest.TestCase):
+    """DSL热加载与版本绑定测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dsl_path = os.path.join(self.tmp.name, "test.dsl")
+        self.write_script('Step welcome\n  Speak "旧版本"\n')
+        self.registry = ProgramRegistry(self.dsl_path, ProgramCache(os.path.join(self.tmp.name, "cache")))
+        self.addCleanup(self.registry.stop)
+
+    def write_script(self, script):
+        with open(self.dsl_path, "w", encoding="utf-8") as f:
+            f.write(script)
+
+    def test_sessions_pinned_and_old_versions_collected(self):
+        """测试热加载后旧会话仍使用旧版本，旧会话结束后旧版本被回收"""
+        print("\n[单元测试] -> 热加载版本绑定测试")
+        self.registry.load()
+        old_session_steps = self.registry.current  # 会话创建时绑定的分派表
+
+        self.write_script('Step welcome\n  Speak "新版本"\n')
+        version = self.registry.reload().result(timeout=5)
+        self.assertEqual(version.version, 2)
+        self.assertIs(self.registry.current, version)
+        self.assertEqual(old_session_steps["welcome"].message, "旧版本")
+        self.assertEqual(self.registry.current["welcome"].message, "新版本")
+        self.assertEqual(self.registry.last_diff, StepDiff([], [], ["welcome"]))
+        self.assertEqual(self.registry.live_versions(), [1, 2])
+        self.assertNotEqual(old_session_steps.key, version.key)  # 共享存储按内容摘要区分版本
+        other = ProgramRegistry(self.dsl_path, ProgramCache(os.path.join(self.tmp.name, "cache")), lazy_steps=8)
+        self.addCleanup(other.stop)
+        self.assertEqual(other.load().key, version.key)  # 另一个工作进程（惰性模式）加载同一脚本
+
+        del old_session_steps
+        gc.collect()
+        self.assertEqual(self.registry.live_versions(), [2])
+        print("  热加载版本绑定测试通过")
+
+    def test_invalid_script_keeps_current_version(self):
+        """测试语法错误或缺少入口步骤时保留当前版本"""
+        print("\n[单元测试] -> 热加载校验测试")
+        current = self.registry.load()
+        for script, error in (('Step welcome\n  Speak\n', SyntaxError),
+                              ('Step other\n  Default missing\n', ProgramValidationError)):
+            self.write_script(script)
+            with self.assertRaises(error):
+                self.registry.reload().result(timeout=5)
+            self.assertIs(self.registry.current, current)
+        self.assertEqual(self.registry.stats()["failures"], 2)
+
+        self.write_script('Step welcome\n  Default missing\n')
+        self.registry.load()
+        self.assertEqual(self.registry.warnings, ["步骤 welcome 跳转到未定义的步骤 missing"])
+        print("  热加载校验测试通过")
+
+
+class TestIncrementalProgram(unittest.TestCase):
+    """Step块增量重新解析测试"""
+
+    SCRIPT = ('# 示例\nStep welcome\n  Speak "你好"\n  Branch "门票", ticket\n  Default welcome\n'
+              'Step ticket\n  Speak "票价60元"\n  Default welcome\n'
+              'Step bye\n  Speak "再见"\n  Exit\n')
+
+    def assert_matches_full_parse(self, inc):
+        full = Parser(Lexer(inc.source).tokens()).parse_program()
+        self.assertEqual([encode_step(s) for s in inc.program.steps], [encode_step(s) for s in full.steps])
+        self.assertEqual({name: step.message for name, step in inc.compiled.items()},
+                         {name: step.message for name, step in compile_program(full).items()})
+
+    def test_edit_reparses_only_changed_block(self):
+        """测试修改一行Speak只重新分析所在的块，其余步骤对象保持不变"""
+        print("\n[单元测试] -> 增量解析测试")
+        inc = IncrementalProgram(self.SCRIPT)
+        welcome, bye = inc.program.steps[0], inc.compiled["bye"]
+        diff = inc.update(self.SCRIPT.replace("票价60元", "票价80元"))
+        self.assertEqual(diff, StepDiff([], [], ["ticket"]))
+        self.assertIs(inc.program.steps[0], welcome)
+        self.assertIs(inc.compiled["bye"], bye)
+        self.assertEqual(inc.compiled["ticket"].message, "票价80元")
+        self.assert_matches_full_parse(inc)
+
+        diff = inc.update(inc.source.replace("Step bye", "Step help\n  Speak \"帮助\"\nStep bye") + "# 结尾注释\n")
+        self.assertEqual(diff, StepDiff(["help"], [], []))
+        diff = inc.update(inc.source.replace("Step ticket", "Step tickets"))
+        self.assertEqual(diff, StepDiff(["tickets"], ["ticket"], []))
+        self.assert_matches_full_parse(inc)
+        print("  增量解析测试通过")
+
+    def test_error_keeps_program(self):
+        """测试增量解析出错时程序保持不变，且错误信息与完整解析一致"""
+        print("\n[单元测试] -> 增量解析错误测试")
+        inc = IncrementalProgram(self.SCRIPT)
+        broken = self.SCRIPT.replace('Speak "再见"', 'Speak "再见')
+        with self.assertRaises(LexicalError) as ctx:
+            inc.update(broken)
+        with self.assertRaises(LexicalError) as full:
+            Parser(Lexer(broken).tokens()).parse_program()
+        self.assertEqual(str(ctx.exception), str(full.exception))
+        self.assertEqual(inc.source, self.SCRIPT)
+        self.assertEqual(inc.update(self.SCRIPT), StepDiff([], [], []))
+        print("  增量解析错误测试通过")
+
+    def test_group_edit_recompiles_includers(self):
+        """测试修改分支组时重新编译引用它的步骤；引用未定义的分支组时程序保持不变"""
+        print("\n[单元测试] -> 增量分支组测试")
+        script = 'Group menu\n  Branch "门票", ticket\n' + self.SCRIPT.replace('  Default welcome\n', '  Include menu\n', 1)
+        inc = IncrementalProgram(script)
+        bye = inc.compiled["bye"]
+        diff = inc.update(script.replace('"门票", ticket\n', '"门票", ticket\n  Branch "再见", bye\n', 1))
+        self.assertEqual(diff, StepDiff([], [], ["welcome"]))
+        self.assertEqual(inc.compiled["welcome"].branches["再见"], "bye")
+        self.assertIs(inc.compiled["bye"], bye)
+        source = inc.source
+        with self.assertRaises(SyntaxError):
+            inc.update(source.replace("Group menu", "Group menus"))
+        self.assertEqual(inc.source, source)
+        self.assert_matches_full_parse(inc)
+        print("  增量分支组测试通过")
+
+
+class TestLazyProgram(unittest.TestCase):
+    """mmap惰性加载测试"""
+
+    SCRIPT = ('# Step commented\nStep welcome\n  Speak "不是 Step fake 的起点"\n  Branch "门票", ticket\n'
+              'Step ticket\n  Speak "票价60元"\n  Default welcome\n'
+              'Step bye\n  Exit\n')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dsl_path = os.path.join(self.tmp.name, "test.dsl")
+        with open(self.dsl_path, "w", encoding="utf-8") as f:
+            f.write(self.SCRIPT)
+
+    def test_steps_parsed_on_access(self):
+        """测试索引跳过字符串和注释，按需分析的结果与完整编译一致，LRU有上限"""
+        print("\n[单元测试] -> 惰性加载测试")
+        lazy = LazyProgram(self.dsl_path, max_steps=2)
+        self.addCleanup(lazy.close)
+        self.assertEqual(list(lazy), ["welcome", "ticket", "bye"])
+        self.assertEqual(lazy.stats()["cached"], 0)
+        eager = compile_program(Parser(Lexer(self.SCRIPT).tokens()).parse_program())
+        for name in ("welcome", "ticket", "bye", "welcome"):
+            self.assertEqual(lazy[name][:-1], eager[name][:-1])
+        self.assertEqual(lazy.stats()["cached"], 2)
+        self.assertNotIn("fake", lazy)
+        self.assertIsNone(lazy.get("fake"))
+        print("  惰性加载测试通过")
+
+    def test_blocks_follow_lexer_rules(self):
+        """测试块索引与词法分析器一样跳过注释和各种空白（含全角空格、不换行空格），摘要在第一次访问时计算"""
+        print("\n[单元测试] -> 惰性加载块边界测试")
+        script = ('Step welcome # 注释\n  Default s4\n'
+                  'Step # 名字在下一行\n s4\n  Speak "x"\n  Default s　\n'
+                  '　Step　s　\n  Speak "y"\n  Default 中文\n'
+                  'Step\xa0中文\n  Exit\n')
+        with open(self.dsl_path, "w", encoding="utf-8") as f:
+            f.write(script)
+        eager = compile_program(Parser(Lexer(script).tokens()).parse_program())
+        lazy = LazyProgram(self.dsl_path)
+        self.addCleanup(lazy.close)
+        self.assertEqual(list(lazy), list(eager))
+        for name in eager:
+            self.assertEqual(lazy[name][:-1], eager[name][:-1])
+        self.assertIsNone(lazy._key)
+        self.assertEqual(lazy.key, program_key(script.encode("utf-8")))
+        print("  惰性加载块边界测试通过")
+
+    def test_in_place_rewrite_detected(self):
+        """测试映射期间原地改写脚本时报错，而不是读取到混杂的内容"""
+        print("\n[单元测试] -> 惰性加载原地改写测试")
+        lazy = LazyProgram(self.dsl_path)
+        self.addCleanup(lazy.close)
+        with open(self.dsl_path, "a", encoding="utf-8") as f:
+            f.write("Step extra\n  Exit\n")
+        with self.assertRaises(RuntimeError):
+            lazy["ticket"]
+        print("  惰性加载原地改写测试通过")
+
+
+class TestParallelParser(unittest.TestCase):
+    """分段并行语法分析测试"""
+
+    def test_chunks_match_sequential_parse(self):
+        """测试分段（含进程池）分析的结果与整体分析一致"""
+        print("\n[单元测试] -> 并行分析一致性测试")
+        script = DSLScriptStub.get_test_dsl()
+        expected = [encode_step(s) for s in Parser(Lexer(script).tokens()).parse_program().steps]
+        source = [("test.dsl", script.encode("utf-8"))]
+        chunks, _ = split_chunks("test.dsl", source[0][1], 4)
+        self.assertGreater(len(chunks), 1)
+        for workers in (1, 2):
+            program = parse_sources(source, workers=workers, chunks_per_worker=4)
+            self.assertEqual([encode_step(s) for s in program.steps], expected)
+        print("  并行分析一致性测试通过")
+
+    def test_errors_use_global_lines(self):
+        """测试错误信息使用原文件行号，并检查跨文件的重名步骤"""
+        print("\n[单元测试] -> 并行分析错误测试")
+        script = 'Step a\n  Speak "1"\nStep b\n  Speak "2"\nStep c\n  Speak\nStep d\n  Exit\n'
+        with self.assertRaises(SyntaxError) as full:
+            Parser(Lexer(script).tokens()).parse_program()
+        with self.assertRaises(SyntaxError) as ctx:
+            parse_sources([("a.dsl", script.encode("utf-8"))], workers=1, chunks_per_worker=4)
+        self.assertEqual(str(ctx.exception), str(full.exception))
+
+        sources = [("a.dsl", b"Step welcome\n  Exit\n"), ("b.dsl", b"\nStep welcome\n  Exit\n")]
+        with self.assertRaises(DuplicateStepError) as dup:
+            parse_sources(sources, workers=1)
+        self.assertIn("b.dsl Line 2", str(dup.exception))
+        self.assertEqual(len(parse_sources(sources, workers=1, allow_duplicates=True).steps), 2)
+        print("  并行分析错误测试通过")
+
+    def test_worker_imports_only_parser(self):
+        """测试工作进程导入的 parse_worker 不会带入服务端的其他模块"""
+        print("\n[单元测试] -> 并行分析工作进程依赖测试")
+        import parse_worker
+        code = ("import sys; sys.path.insert(0, sys.argv[1]); import parse_worker; "
+                "print(sorted({'lazy_program', 'compiler', 'vm', 'LLMClient', 'web_output'} & set(sys.modules)))")
+        output = subprocess.run([sys.executable, "-c", code, os.path.dirname(parse_worker.__file__)],
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[]")
+        print("  并行分析工作进程依赖测试通过")
+
+
+class TestDialogueVM(unittest.TestCase):
+    """整数状态机与对话虚拟机测试"""
+
+    SCRIPT = """
+Step welcome
+  Speak "欢迎"
+  Listen 5, 20
+  Branch "门票", ticket
+  Branch "时间", ghost
+  Silence silenceProc
+  Default welcome
+Step ticket
+  Speak "票价100元"
+Step silenceProc
+  Speak "还在吗？"
+  Silence exitProc
+Step exitProc
+  Speak "再见"
+  Exit
+"""
+
+    def setUp(self):
+        self.program = Bytecode(Parser(Lexer(self.SCRIPT).tokens()).parse_program())
+        self.llm_stub = LLMClientStub()
+        self.vm = DialogueVM(self.llm_stub, self.program)
+
+    def test_bytecode_layout(self):
+        """测试步骤编号与跳转表"""
+        print("\n[单元测试] -> 字节码布局测试")
+        p = self.program
+        self.assertEqual(p.names, ("welcome", "ticket", "silenceProc", "exitProc"))
+        self.assertEqual((p.entry, p.exit), (0, 3))
+        welcome = p.code(p.entry)
+        self.assertEqual(welcome.targets, (1, MISSING))  # 未定义的目标
+        self.assertEqual((welcome.silence, welcome.default), (2, 0))
+        self.assertEqual(p.code(1).default, NO_STEP)
+        self.assertEqual(p["ticket"].message, "票价100元")  # 同时是 步骤名 -> CompiledStep 的映射
+        print("  字节码布局测试通过")
+
+    def test_turns(self):
+        """测试关键词、意图识别、默认与退出跳转"""
+        print("\n[单元测试] -> 虚拟机对话测试")
+        self.assertEqual(self.vm.reset_conversation()["message"], "欢迎")
+        self.assertEqual(self.vm.process_user_input("门票多少钱")["current_step"], "ticket")
+        self.vm.reset_conversation()
+        self.assertEqual(self.vm.process_user_input("成人票多少钱")["current_step"], "ticket")  # 桩识别为"门票"
+        self.vm.reset_conversation()
+        self.assertEqual(self.vm.process_user_input("随便")["current_step"], "welcome")
+        self.assertEqual(self.vm.process_user_input("几点关门的时间"), {"error": "步骤不存在", "end": True})
+        self.assertIsNone(self.vm.current_step)
+        self.assertEqual(self.vm.process_user_input("再见")["error"], "对话流程错误，未找到当前步骤。")
+        self.vm.reset_conversation()
+        response = self.vm.process_user_input("退出")
+        self.assertEqual((response["current_step"], response["end"]), ("exitProc", True))
+        print("  虚拟机对话测试通过")
+
+    def test_silence(self):
+        """测试单次静默提醒与总静默结束"""
+        print("\n[单元测试] -> 虚拟机静默测试")
+        now = [1000.0]
+        with patch("vm.time.time", side_effect=lambda: now[0]):
+            self.vm.reset_conversation()
+            now[0] += 1
+            self.assertTrue(self.vm.process_user_input("")["no_op"])
+            now[0] += 5
+            self.assertEqual(self.vm.process_user_input("")["current_step"], "silenceProc")
+            now[0] += 11
+            self.assertEqual(self.vm.process_user_input("")["current_step"], "exitProc")
+            now[0] += 15  # 总静默超时，exitProc 没有 Silence 目标
+            self.assertEqual(self.vm.process_user_input(""), {"message": "长时间无响应，对话已结束。", "end": True})
+        print("  虚拟机静默测试通过")
+
+
+class TestSessionStore(unittest.TestCase):
+    """有界会话存储测试"""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.program = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT).tokens()).parse_program())
+        self.store = SessionStore(max_sessions=3, ttl=60, clock=lambda: self.now)
+
+    def session(self, last_interaction_time: float) -> DialogueVM:
+        vm = DialogueVM(None, self.program)
+        vm.last_interaction_time = last_interaction_time
+        return vm
+
+    def test_ttl_and_sweep(self):
+        """测试空闲过期：get 惰性移除，sweep 从最旧的一端移除直到第一个未过期的会话，乱序的时间也排在正确的位置"""
+        print("\n[单元测试] -> 会话过期测试")
+        self.store.put("a", self.session(self.now))
+        self.store.put("b", self.session(self.now))
+        self.now += 50
+        b = self.store.get("b")
+        b.last_interaction_time = self.now  # b 有新的交互
+        self.store.update("b", b)
+        self.now += 20
+        self.assertIsNone(self.store.get("a"))
+        self.assertEqual(self.store.get("b").last_interaction_time, b.last_interaction_time)
+        self.store.put("c", self.session(self.now - 61))  # 比 b 更早，排在 b 之前
+        self.store.put("d", self.session(self.now))
+        stale = self.store.get("d")
+        stale.last_interaction_time = self.now - 65  # 乱序写回了较早的时间
+        self.store.update("d", stale)
+        self.assertEqual(self.store.sweep(), 2)  # c、d 已过期；b 未过期，清理到此为止
+        self.assertEqual(len(self.store), 1)
+        self.now += 50
+        self.assertEqual(self.store.sweep(), 1)
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.stats()["expired"], 4)
+        print("  会话过期测试通过")
+
+    def test_lru_eviction(self):
+        """测试达到容量时淘汰最久没有交互的会话"""
+        print("\n[单元测试] -> 会话LRU测试")
+        for name in "abc":
+            self.store.put(name, self.session(self.now))
+        self.now += 1
+        self.store.update("a", self.session(self.now))
+        self.store.put("d", self.session(self.now))  # 淘汰 b
+        self.assertNotIn("b", self.store)
+        self.assertIn("a", self.store)
+        self.store.remove("c")
+        stats = self.store.stats()
+        self.assertEqual((stats["size"], stats["evicted"], stats["ended"]), (2, 1, 1))
+        print("  会话LRU测试通过")
+
+    def test_deadline(self):
+        """测试不载入会话即可取得静默截止时间，未到期前的静默处理都是无操作"""
+        print("\n[单元测试] -> 静默截止时间测试")
+        vm = self.session(self.now)
+        self.store.put("a", vm)
+        self.assertEqual(self.store.deadline("a"), self.now + 5)  # welcome: Listen 5, 20
+        with patch("vm.time.time", return_value=self.now + 4.9):
+            self.assertTrue(self.store.get("a").process_user_input("")["no_op"])
+        vm.step = MISSING
+        self.store.update("a", vm)
+        self.assertEqual(self.store.deadline("a"), float("-inf"))  # 没有当前步骤，总是走完整处理
+        self.assertIsNone(self.store.deadline("b"))
+        self.now += 61
+        self.assertIsNone(self.store.deadline("a"))
+        self.assertEqual(self.store.stats()["expired"], 1)
+        print("  静默截止时间测试通过")
+
+    def test_table_rows(self):
+        """测试会话状态按行写回和载入，行与程序版本在会话结束后释放"""
+        print("\n[单元测试] -> 会话表测试")
+        vm = self.session(self.now)
+        vm.process_user_input("门票")
+        vm.total_silence_start_time = self.now - 5
+        self.store.put("a", vm)
+        loaded = self.store.get("a")
+        self.assertIsNot(loaded, vm)
+        self.assertEqual((loaded.current_step, loaded.total_silence_start_time), ("ticket", self.now - 5))
+        loaded.reset_conversation()
+        self.store.update("a", loaded)
+        self.assertIsNone(self.store.get("a").total_silence_start_time)
+        other = Bytecode(self.program.steps, version=2)
+        self.store.put("b", DialogueVM(None, other))
+        self.assertIs(self.store.get("b").program, other)
+        self.assertEqual(self.store.stats()["programs"], 2)
+        self.store.remove("b")
+        self.store.put("c", self.session(self.now))
+        self.assertEqual((len(self.store.table), self.store.stats()["programs"]), (2, 1))  # 复用 b 的行
+        print("  会话表测试通过")
+
+
+class TestSharedSessionStore(unittest.TestCase):
+    """多进程共享会话存储测试（SQLite）"""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.program = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT).tokens()).parse_program())
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "sessions.db")
+
+    def store(self, program=None, max_sessions=3):
+        program = program or self.program
+        return SQLiteSessionStore(self.path, lambda: program, max_sessions=max_sessions, ttl=60,
+                                  clock=lambda: self.now)
+
+    def session(self) -> DialogueVM:
+        vm = DialogueVM(None, self.program)
+        vm.last_interaction_time = self.now
+        return vm
+
+    def test_codec(self):
+        """测试会话编码：按步骤名保存，在新版本程序上按名字恢复"""
+        print("\n[单元测试] -> 会话编码测试")
+        vm = self.session()
+        vm.process_user_input("门票")
+        vm.total_silence_start_time = self.now - 3
+        data = encode_session(vm)
+        self.assertEqual(len(data), 37 + len("ticket"))
+        self.assertEqual(session_deadline(data), vm.next_deadline())
+        restored = decode_session(data, self.program)
+        self.assertEqual((restored.step, restored.total_silence_start_time), (vm.step, vm.total_silence_start_time))
+        reordered = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT.replace("Step ticket", "Step ticket2", 1)
+                                          + "Step ticket\n  Speak \"新票价\"\n").tokens()).parse_program())
+        self.assertEqual(decode_session(data, reordered).get_step_response()["message"], "新票价")
+        vm.reset_conversation()
+        vm.process_user_input("几点关门的时间")  # 跳到未定义的步骤
+        self.assertIsNone(decode_session(encode_session(vm), self.program).current_step)
+        print("  会话编码测试通过")
+
+    def test_version_pinning(self):
+        """测试热加载后共享存储中的会话仍在开始时的程序版本上恢复，本进程没有该版本时不按步骤名猜测"""
+        print("\n[单元测试] -> 共享会话版本测试")
+        old = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT).tokens()).parse_program(), 1, key=11)
+        new = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT.replace("Step ticket", "Step ticket2", 1)
+                                    + "Step ticket\n  Speak \"新票价\"\n").tokens()).parse_program(), 2, key=22)
+        current = [old]
+        worker = SQLiteSessionStore(self.path, lambda: current[0], ttl=60, clock=lambda: self.now)
+        vm = DialogueVM(None, old)
+        vm.last_interaction_time = self.now
+        vm.process_user_input("门票")
+        worker.put("s1", vm)
+        current[0] = new  # 热加载
+        restored = worker.get("s1")
+        self.assertIs(restored.program, old)
+        self.assertNotEqual(restored.get_step_response()["message"], "新票价")
+        worker.put("s2", DialogueVM(None, new))
+        self.assertIs(worker.get("s2").program, new)
+        late = SQLiteSessionStore(self.path, lambda: new, ttl=60, clock=lambda: self.now)  # 热加载后才启动的进程
+        self.assertIsNone(late.get("s1"))
+        self.assertEqual(late.stats()["stale"], 1)
+        self.assertIs(late.get("s2").program, new)
+        behind = [old]  # 另一个工作进程热加载了 new，本进程还没有
+        lagging = SQLiteSessionStore(self.path, lambda: behind[0], ttl=60, clock=lambda: self.now,
+                                     refresh=lambda: behind.__setitem__(0, new))
+        self.assertIs(lagging.get("s2").program, new)
+        self.assertIs(behind[0], new)
+        self.assertEqual(lagging.stats()["stale"], 0)
+        print("  共享会话版本测试通过")
+
+    def test_compare_and_swap(self):
+        """测试两个工作进程同时处理同一会话时，后写回的一方失败，在最新状态上重新处理后才能写入"""
+        print("\n[单元测试] -> 共享会话比较后写回测试")
+        worker_a, worker_b = self.store(), self.store()
+        worker_a.put("s1", self.session())
+        vm_a, vm_b = worker_a.get("s1"), worker_b.get("s1")
+        vm_a.process_user_input("门票")
+        self.assertTrue(worker_a.update("s1", vm_a))
+        vm_b.process_user_input("几点关门的时间")
+        self.assertFalse(worker_b.update("s1", vm_b))  # 读到的状态已被 a 改变，不覆盖
+        self.assertEqual(worker_b.stats()["conflicts"], 1)
+        self.assertEqual(worker_a.get("s1").current_step, "ticket")
+        vm_b = worker_b.get("s1")  # 重新读取后写回成功
+        vm_b.process_user_input("几点关门的时间")
+        self.assertTrue(worker_b.update("s1", vm_b))
+        self.assertFalse(worker_a.remove("s1"))  # 结束时的移除同样比较：a 读到的是 b 写回之前的状态
+        self.assertIsNotNone(worker_a.get("s1"))
+        self.assertTrue(worker_a.remove("s1"))
+        print("  共享会话比较后写回测试通过")
+
+    def test_shared_between_workers(self):
+        """测试两个工作进程的存储实例共享会话，过期与容量上限由 sweep 执行"""
+        print("\n[单元测试] -> 共享会话存储测试")
+        worker_a, worker_b = self.store(), self.store()
+        worker_a.put("s1", self.session())
+        vm = worker_b.get("s1")
+        vm.process_user_input("门票")
+        worker_b.update("s1", vm)
+        self.assertEqual(worker_a.get("s1").current_step, "ticket")
+        worker_a.remove("s1")
+        worker_b.update("s1", vm)  # 已结束的会话不会被写回
+        self.assertIsNone(worker_b.get("s1"))
+        for name in "abcd":
+            worker_a.put(name, self.session())
+            self.now += 1
+        self.now += 56  # a 过期
+        self.assertEqual(worker_b.sweep(), 1)
+        self.assertEqual(len(worker_b), 3)
+        worker_a.put("e", self.session())
+        worker_b.sweep()  # 超出容量，淘汰最久没有交互的 b
+        self.assertIsNone(worker_a.get("b"))
+        self.assertEqual(worker_b.stats()["evicted"], 1)
+        print("  共享会话存储测试通过")
+
+    def test_batching(self):
+        """测试并发操作被合并为批次执行"""
+        print("\n[单元测试] -> 批量操作测试")
+        store = self.store(max_sessions=1000)
+        def worker(i):
+            for j in range(20):
+                store.put(f"{i}-{j}", self.session())
+                self.assertIsNotNone(store.get(f"{i}-{j}"))
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = store.stats()
+        self.assertEqual((stats["size"], stats["writes"], stats["reads"]), (160, 160, 160))
+        self.assertLessEqual(stats["write_batches"], 160)
+
+        queue = BatchQueue(lambda items: [item * 2 for item in items])
+        self.assertEqual(queue.submit(21), 42)
+        failing = BatchQueue(lambda items: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            failing.submit(1)
+        print("  批量操作测试通过")
+
+
+class TestSilenceTimers(unittest.TestCase):
+    """分层时间轮与服务端静默计时测试"""
+
+    def test_timer_wheel(self):
+        """测试定时器按到期顺序触发，跨层降级与溢出后不提前也不丢失"""
+        print("\n[单元测试] -> 时间轮测试")
+        wheel = TimerWheel(tick=1.0, slots=4, levels=2)
+        for key, deadline in (("a", 2.5), ("b", 9), ("c", 30), ("d", 100), ("e", 5)):
+            wheel.schedule(key, deadline)
+        self.assertTrue(wheel.cancel("e"))
+        self.assertFalse(wheel.cancel("e"))
+        self.assertEqual(wheel.deadline("a"), 3.0)  # 向上取整到刻度
+        self.assertEqual(wheel.advance(2.9), [])
+        self.assertEqual(wheel.advance(10), ["a", "b"])
+        wheel.schedule("b", 12)  # 重新计时
+        self.assertEqual(wheel.advance(29.5), ["b"])
+        self.assertEqual(wheel.advance(1000), ["c", "d"])
+        self.assertEqual(len(wheel), 0)
+        print("  时间轮测试通过")
+
+    def test_server_silence(self):
+        """测试订阅后由服务端在截止时间执行静默处理并推送，新的交互会重新计时"""
+        print("\n[单元测试] -> 服务端静默计时测试")
+        now = [1000.0]
+        clock = lambda: now[0]
+        program = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT).tokens()).parse_program())
+        store = SessionStore(max_sessions=10, ttl=600, clock=clock, llm_client=LLMClientStub())
+        timers = SilenceTimers(store, tick=0.1, clock=clock)
+        self.addCleanup(timers.stop)
+        with patch("vm.time.time", side_effect=clock):
+            vm = DialogueVM(None, program)
+            vm.reset_conversation()
+            store.put("s", vm)
+            events = timers.subscribe("s")
+            self.assertEqual(timers.wheel.deadline("s"), 1005.0)  # welcome: Listen 5, 20
+
+            now[0] = 1003.0
+            vm = store.get("s")
+            vm.process_user_input("随便")  # Default welcome，重新计时
+            store.update("s", vm)
+            timers.reschedule("s", vm)
+            now[0] = 1005.5
+            self.assertEqual(timers.due(), [])
+
+            now[0] = 1008.05
+            for session_id in timers.due():
+                timers.fire(session_id)
+            self.assertEqual(events.get_nowait()["current_step"], "silenceProc")
+            self.assertEqual(timers.wheel.deadline("s"), 1018.1)  # silenceProc 的默认单次超时10秒
+
+            now[0] = 1023.1  # silenceProc 再次超时，Silence 跳到 exitProc 并结束
+            for session_id in timers.due():
+                timers.fire(session_id)
+            event = events.get_nowait()
+            self.assertEqual((event["current_step"], event["end"]), ("exitProc", True))
+        self.assertIsNone(store.get("s"))
+        self.assertEqual(timers.stats(), {"subscribers": 0, "scheduled": 0, "fired": 2, "pushed": 2,
+                                          "errors": 0})
+        print("  服务端静默计时测试通过")
+
+    def test_fire_serialized_with_message(self):
+        """测试静默处理等待同一会话的消息处理完成，截止时间因此推后时不再推送过时的提醒"""
+        print("\n[单元测试] -> 静默处理与消息串行测试")
+        now = [1000.0]
+        clock = lambda: now[0]
+        program = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT).tokens()).parse_program())
+        store = SessionStore(max_sessions=10, ttl=600, clock=clock, llm_client=LLMClientStub())
+        timers = SilenceTimers(store, tick=0.1, clock=clock)
+        self.addCleanup(timers.stop)
+        with patch("vm.time.time", side_effect=clock):
+            vm = DialogueVM(None, program)
+            vm.reset_conversation()
+            store.put("s", vm)
+            events = timers.subscribe("s")
+            now[0] = 1005.5  # 已到截止时间，计时线程开始静默处理时用户的消息正在处理
+            with timers.locks.hold("s"):
+                fired = threading.Thread(target=timers.fire, args=("s",))
+                fired.start()
+                fired.join(0.1)
+                self.assertTrue(fired.is_alive())  # 等待消息处理完成
+                vm = store.get("s")
+                vm.process_user_input("随便")
+                store.update("s", vm)
+            fired.join(5)
+        self.assertTrue(events.empty())
+        self.assertEqual(timers.stats()["fired"], 0)
+        self.assertEqual(timers.wheel.deadline("s"), 1010.5)  # 按新的截止时间重新计时
+        self.assertEqual(len(timers.locks), 0)
+        print("  静默处理与消息串行测试通过")
+
+    def test_fire_error_retried(self):
+        """测试静默处理出错时稍后重试，连续失败达到上限时推送错误消息并停止计时，而不是让会话静默地失去计时"""
+        print("\n[单元测试] -> 静默处理出错测试")
+        now = [1000.0]
+        clock = lambda: now[0]
+        program = Bytecode(Parser(Lexer(TestDialogueVM.SCRIPT).tokens()).parse_program())
+        store = SessionStore(max_sessions=10, ttl=600, clock=clock, llm_client=LLMClientStub())
+        timers = SilenceTimers(store, tick=0.1, clock=clock, retries=2, retry_delay=1.0)
+        self.addCleanup(timers.stop)
+        with patch("vm.time.time", side_effect=clock):
+            vm = DialogueVM(None, program)
+            vm.reset_conversation()
+            store.put("s", vm)
+            events = timers.subscribe("s")
+            now[0] = 1005.5
+            with patch.object(store, "deadline", side_effect=ConnectionError("存储不可用")):
+                timers.fire("s")
+                self.assertEqual(timers.wheel.deadline("s"), 1006.5)  # retry_delay 后重试
+                self.assertTrue(events.empty())
+                timers.fire("s")
+            self.assertEqual(events.get_nowait(), {"error": "静默处理失败，请稍后重试。", "end": False})
+            self.assertIsNone(timers.wheel.deadline("s"))
+            self.assertEqual(timers.stats()["errors"], 2)
+
+            vm = store.get("s")
+            vm.process_user_input("随便")
+            store.update("s", vm)
+            timers.reschedule("s", vm)  # 下一条消息重新开始计时
+            now[0] = 1011.0
+            timers.fire("s")
+        self.assertEqual(events.get_nowait()["current_step"], "silenceProc")
+        self.assertEqual(len(timers.locks), 0)
+        print("  静默处理出错测试通过")
+
+
+class WebRouteTestCase(unittest.TestCase):
+    """Flask 路由测试的基类：不连接星火，用测试桩和 spotServer.dsl 替换 web_output 的全局组件"""
+
+    def setUp(self):
+        try:
+            import web_output
+        except ImportError as e:
+            self.skipTest(f"缺少Web依赖: {e}")
+        self.web = web_output
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        dsl_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'spotServer.dsl')
+        programs = ProgramRegistry(dsl_path, ProgramCache(os.path.join(self.tmp.name, "cache")))
+        programs.load()
+        llm_client = LLMClientStub()
+        sessions = SessionStore(max_sessions=100, ttl=600, llm_client=llm_client)
+        timers = SilenceTimers(sessions)
+        self.addCleanup(timers.stop)
+        for name, value in (("global_llm_client", llm_client), ("global_programs", programs),
+                            ("user_sessions", sessions), ("silence_timers", timers)):
+            patcher = patch.object(web_output, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = web_output.app.test_client()
+
+    def start(self) -> str:
+        return self.client.post('/api/start', json={}).get_json()["session_id"]
+
+
+class TestWebRoutes(WebRouteTestCase):
+    """Web接口测试"""
+
+    def test_admin_reload_requires_token(self):
+        """测试未配置 ADMIN_TOKEN 时管理接口不开放，令牌错误时拒绝"""
+        print("\n[接口测试] -> 管理接口鉴权测试")
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("ADMIN_TOKEN", None)
+            self.assertEqual(self.client.post('/api/admin/reload').status_code, 404)
+            self.assertEqual(self.client.post('/api/admin/reload', headers={'X-Admin-Token': ''}).status_code, 404)
+        with patch.dict(os.environ, {"ADMIN_TOKEN": "secret"}):
+            self.assertEqual(self.client.post('/api/admin/reload').status_code, 403)
+            self.assertEqual(self.client.post('/api/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code, 403)
+            response = self.client.post('/api/admin/reload', headers={'X-Admin-Token': 'secret'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()["current_version"], 2)
+        print("  管理接口鉴权测试通过")
+
+    def test_silence_fast_path(self):
+        """测试未到静默截止时间的空消息和状态轮询不载入会话，直接返回无操作响应（可选204）"""
+        print("\n[接口测试] -> 静默快速路径测试")
+        session_id = self.start()
+        with patch.object(self.web.user_sessions, "get", side_effect=AssertionError("不应载入会话")):
+            data = self.client.post('/api/message', json={"session_id": session_id, "message": ""}).get_json()
+            self.assertEqual((data["message"], data["end"], data["no_op"]), ("", False, True))
+            self.assertTrue(0 < data["timeout"] <= 10000)  # welcome: Listen 10, 50
+            response = self.client.post('/api/session_status', json={"session_id": session_id})
+            self.assertEqual(response.data, self.web.NO_OP_BODY)
+            with patch.object(self.web, "NO_OP_STATUS", ('', 204)):
+                response = self.client.post('/api/session_status', json={"session_id": session_id})
+                self.assertEqual((response.status_code, response.data), (204, b""))
+        for path in ('/api/message', '/api/session_status'):
+            self.assertTrue(self.client.post(path, json={"session_id": "unknown", "message": ""}).get_json()["end"])
+
+        vm = self.web.user_sessions.get(session_id)
+        vm.last_interaction_time -= 11  # 到期后照常执行静默处理
+        self.web.user_sessions.update(session_id, vm)
+        data = self.client.post('/api/message', json={"session_id": session_id, "message": ""}).get_json()
+        self.assertEqual(data["current_step"], "silenceProc")
+        print("  静默快速路径测试通过")
+
+    def test_turn_retried_after_write_conflict(self):
+        """测试写回失败（其他工作进程同时处理了同一会话）时在最新状态上重新处理这一轮"""
+        print("\n[接口测试] -> 写回冲突重试测试")
+        session_id = self.start()
+        store = self.web.user_sessions
+        real_update, attempts = store.update, []
+        def update(sid, vm):
+            attempts.append(vm.current_step)
+            return len(attempts) > 1 and real_update(sid, vm)  # 第一次写回时会话已被修改
+        with patch.object(store, "update", side_effect=update):
+            data = self.client.post('/api/message', json={"session_id": session_id, "message": "门票"}).get_json()
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(data["current_step"], store.get(session_id).current_step)
+        with patch.object(store, "update", return_value=False):
+            data = self.client.post('/api/message', json={"session_id": session_id, "message": "门票"}).get_json()
+        self.assertEqual((data["end"], "error" in data), (False, True))  # 一直冲突时不结束会话
+        print("  写回冲突重试测试通过")
+
+    def test_events_stream(self):
+        """测试 /api/events 推送服务端静默处理的结果，未知会话直接收到结束消息"""
+        print("\n[接口测试] -> 静默推送接口测试")
+        session_id = self.start()
+        response = self.client.get(f'/api/events?session_id={session_id}', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        stream = iter(response.response)
+        self.assertEqual(next(stream), b"retry: 3000\n\n")
+        vm = self.web.user_sessions.get(session_id)
+        vm.last_interaction_time -= 11  # welcome 的单次超时（10秒）已过，总超时未到
+        self.web.user_sessions.update(session_id, vm)
+        self.web.silence_timers.fire(session_id)
+        event = json.loads(next(stream).decode('utf-8')[len("data: "):])
+        self.assertEqual(event["current_step"], "silenceProc")
+        response.close()
+        self.assertEqual(self.web.silence_timers.stats()["subscribers"], 0)  # 断开后取消订阅
+
+        body = self.client.get('/api/events?session_id=unknown').get_data(as_text=True)
+        self.assertIn('"end": true', body)
+        print("  静默推送接口测试通过")
+
 
 class TestChatbotIntegration(unittest.TestCase):
     """
@@ -453,6 +1433,565 @@ class TestLLMClientIntegration(unittest.TestCase):
         print("  LLM客户端无效凭证测试通过")
 
 
+class FakeSparkSocket:
+    """模拟星火WebSocket连接：按顺序返回预置的回复分片"""
+    def __init__(self, chunks=("门票",)):
+        self.connected = True
+        self.chunks = list(chunks)
+        self.sent = []
+        self.frames = []
+
+    def settimeout(self, timeout): pass
+
+    def send(self, payload):
+        if not self.connected:
+            raise OSError("socket is already closed")
+        self.sent.append(json.loads(payload))
+        self.frames = [
+            json.dumps({"header": {"code": 0}, "payload": {"choices": {
+                "status": 2 if i == len(self.chunks) - 1 else 1,
+                "text": [{"content": chunk}]}}})
+            for i, chunk in enumerate(self.chunks)
+        ]
+
+    def recv(self):
+        if not self.frames:
+            raise OSError("connection closed")
+        return self.frames.pop(0)
+
+    def close(self):
+        self.connected = False
+
+
+class TestLLMClientPool(unittest.TestCase):
+    """LLM客户端连接池测试"""
+
+    def setUp(self):
+        self.sockets = []
+        def factory(url, **kwargs):
+            sock = FakeSparkSocket(("门", "票"))
+            self.sockets.append(sock)
+            return sock
+        patcher = patch('websocket.create_connection', side_effect=factory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.llm_client = LLMClient("test_id", "test_key", "test_secret", pool_size=2)
+        self.addCleanup(self.llm_client.close)
+
+    def test_connection_reused_across_requests(self):
+        """测试多次请求复用同一条连接"""
+        print("\n[集成测试] -> 连接池复用测试")
+        for _ in range(3):
+            self.assertEqual(self.llm_client.recognize_intent("多少钱", ["门票", "购票"]), "门票")
+        self.assertEqual(len(self.sockets), 1)
+        self.assertEqual(self.llm_client.pool.reused, 2)
+        print("  连接池复用测试通过")
+
+    def test_reconnect_when_server_closed(self):
+        """测试复用的连接已被关闭时自动重连"""
+        print("\n[集成测试] -> 连接池重连测试")
+        self.llm_client.recognize_intent("多少钱", ["门票"])
+        self.sockets[0].connected = False
+        self.assertEqual(self.llm_client.recognize_intent("多少钱", ["门票"]), "门票")
+        self.assertEqual(len(self.sockets), 2)
+        print("  连接池重连测试通过")
+
+    def test_retry_on_fresh_connection_when_send_fails(self):
+        """测试复用的连接看似健康但发送失败时丢弃该连接，在新连接上重试成功"""
+        print("\n[集成测试] -> 连接池发送失败重试测试")
+        self.llm_client.recognize_intent("多少钱", ["门票"])
+        stale = self.sockets[0]
+        def broken_send(payload):
+            raise ConnectionResetError("connection reset by peer")
+        stale.send = broken_send  # connected 仍为True，只有发送时才发现连接已断开
+        self.assertEqual(self.llm_client.recognize_intent("多少钱", ["门票"]), "门票")
+        self.assertEqual(len(self.sockets), 2)
+        self.assertFalse(stale.connected)  # 出错的连接被关闭，不再回到空闲队列
+        self.assertEqual(list(self.llm_client.pool._idle)[0].ws, self.sockets[1])
+        self.assertEqual(len(self.llm_client.pool._idle), 1)
+        conns = [self.llm_client.pool.acquire() for _ in range(2)]  # 借出名额已全部归还
+        for conn in conns:
+            self.llm_client.pool.release(conn)
+        print("  连接池发送失败重试测试通过")
+
+    def test_no_retry_on_timeout_or_partial_reply(self):
+        """测试超时或已读到部分回复后出错时不换连接重发"""
+        print("\n[集成测试] -> 连接池不重试测试")
+        import websocket
+        def timeout(sock, recv):
+            raise websocket.WebSocketTimeoutException("timed out")
+        def reset_after_first_frame(sock, recv):
+            frame = recv()
+            if not sock.frames:
+                raise ConnectionResetError("connection reset by peer")
+            return frame
+        for failing_recv in (timeout, reset_after_first_frame):
+            with self.subTest(case=failing_recv.__name__):
+                self.llm_client.recognize_intent("多少钱", ["门票"])
+                sock, created = self.sockets[-1], len(self.sockets)
+                sock.recv = lambda sock=sock, recv=sock.recv, fail=failing_recv: fail(sock, recv)
+                self.assertIsNone(self.llm_client.recognize_intent("多少钱", ["门票"]))
+                self.assertEqual(len(self.sockets), created)  # 没有新建连接重发
+                self.assertEqual(len(sock.sent), 2)
+                self.assertFalse(sock.connected)
+        print("  连接池不重试测试通过")
+
+    def test_expired_connection_dropped(self):
+        """测试超过鉴权有效期的连接不再复用"""
+        print("\n[集成测试] -> 连接过期测试")
+        self.llm_client.recognize_intent("多少钱", ["门票"])
+        self.llm_client.pool.max_age = 0
+        self.llm_client.recognize_intent("多少钱", ["门票"])
+        self.assertEqual(len(self.sockets), 2)
+        self.assertFalse(self.sockets[0].connected)
+        print("  连接过期测试通过")
+
+    def test_api_error_returns_none(self):
+        """测试接口返回错误码时返回None且连接被丢弃"""
+        print("\n[集成测试] -> 接口错误测试")
+        sock = FakeSparkSocket()
+        sock.recv = lambda: json.dumps({"header": {"code": 10013, "message": "auth failed"}})
+        with patch('websocket.create_connection', return_value=sock):
+            self.assertIsNone(self.llm_client.recognize_intent("多少钱", ["门票"]))
+        self.assertFalse(sock.connected)
+        print("  接口错误测试通过")
+
+
+class TestStreamingEarlyExit(unittest.TestCase):
+    """流式回复提前返回测试"""
+
+    def test_decisive_prefix(self):
+        """测试何时可以根据回复前缀确定意图"""
+        print("\n[单元测试] -> 流式前缀判定测试")
+        intents = ["票", "门票", "时间"]
+        self.assertTrue(LLMClient._is_decisive("'门票", intents))
+        self.assertFalse(LLMClient._is_decisive("unkn", intents))
+        self.assertTrue(LLMClient._is_decisive("unknown", intents))
+        self.assertFalse(LLMClient._is_decisive("票", ["票", "票价"]))  # 还可能变成更长的意图
+        self.assertFalse(LLMClient._is_decisive("时", intents))
+        print("  流式前缀判定测试通过")
+
+    def test_returns_before_final_frame_and_recycles_connection(self):
+        """测试确定意图后立即返回，剩余帧读完后连接归还连接池"""
+        print("\n[集成测试] -> 流式提前返回测试")
+        gate = threading.Event()
+        sock = FakeSparkSocket(("门票", ""))
+        original_recv = sock.recv
+        def gated_recv():
+            if len(sock.frames) == 1:
+                gate.wait(2)  # 最后一帧迟迟不到
+            return original_recv()
+        sock.recv = gated_recv
+        client = LLMClient("test_id", "test_key", "test_secret", pool_size=1)
+        self.addCleanup(client.close)
+        with patch('websocket.create_connection', return_value=sock):
+            started = time.monotonic()
+            self.assertEqual(client.recognize_intent("多少钱", ["门票", "时间"]), "门票")
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual(client.early_exits, 1)
+            gate.set()
+            for _ in range(100):
+                if client.pool._idle:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(len(client.pool._idle), 1)
+        self.assertTrue(sock.connected)
+        print("  流式提前返回测试通过")
+
+
+@unittest.skipIf(websockets is None, "未安装 websockets")
+class TestAsyncLLMClient(unittest.TestCase):
+    """异步意图识别测试：使用本地WebSocket服务模拟星火接口"""
+
+    async def _serve(self, handler):
+        server = await websockets.serve(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        return server, f"ws://127.0.0.1:{port}"
+
+    @staticmethod
+    def _frame(content, status):
+        return json.dumps({"header": {"code": 0},
+                           "payload": {"choices": {"status": status, "text": [{"content": content}]}}})
+
+    def test_concurrent_requests_on_one_loop(self):
+        """测试单个事件循环上并发处理大量请求"""
+        print("\n[集成测试] -> 异步并发意图识别测试")
+        async def handler(ws):
+            request = json.loads(await ws.recv())
+            user_text = request["payload"]["message"]["text"][1]["content"]
+            await asyncio.sleep(0.05)
+            await ws.send(self._frame("'时间'" if "开门" in user_text else "门", 1))
+            await ws.send(self._frame("" if "开门" in user_text else "票", 2))
+
+        async def scenario():
+            server, url = await self._serve(handler)
+            client = LLMClient("test_id", "test_key", "test_secret")
+            with patch.object(client, '_get_auth_url', return_value=url):
+                inputs = ["几点开门", "多少钱"] * 100
+                results = await asyncio.gather(*[
+                    client.recognize_intent_async(text, ["门票", "时间"]) for text in inputs])
+            server.close()
+            await server.wait_closed()
+            return inputs, results
+
+        inputs, results = asyncio.run(scenario())
+        for text, intent in zip(inputs, results):
+            self.assertEqual(intent, "时间" if "开门" in text else "门票")
+        print("  异步并发意图识别测试通过")
+
+    def test_deadline_and_cancellation(self):
+        """测试截止时间与任务取消"""
+        print("\n[集成测试] -> 异步截止时间测试")
+        async def handler(ws):
+            await ws.recv()
+            await ws.wait_closed()  # 不回复，直到客户端放弃并关闭连接
+
+        async def scenario():
+            server, url = await self._serve(handler)
+            client = LLMClient("test_id", "test_key", "test_secret")
+            with patch.object(client, '_get_auth_url', return_value=url):
+                loop = asyncio.get_running_loop()
+                started = loop.time()
+                timed_out = await client.recognize_intent_async("多少钱", ["门票"], timeout=0.2)
+                elapsed = loop.time() - started
+                task = asyncio.ensure_future(client.recognize_intent_async("多少钱", ["门票"]))
+                await asyncio.sleep(0.1)
+                task.cancel()
+                try:
+                    await task
+                    cancelled = False
+                except asyncio.CancelledError:
+                    cancelled = True
+            server.close()
+            await server.wait_closed()
+            return timed_out, elapsed, cancelled
+
+        timed_out, elapsed, cancelled = asyncio.run(scenario())
+        self.assertIsNone(timed_out)
+        self.assertLess(elapsed, 1)
+        self.assertTrue(cancelled)
+        print("  异步截止时间测试通过")
+
+
+class TestIntentCache(unittest.TestCase):
+    """意图缓存测试"""
+
+    def setUp(self):
+        self.backend = MagicMock(wraps=LLMClientStub())
+        self.cache = IntentCache(self.backend, max_size=2, ttl=60, negative_ttl=60)
+        self.intents = ["门票", "购票", "时间"]
+
+    def test_repeat_question_hits_cache(self):
+        """测试重复问题（忽略空白、标点）命中缓存"""
+        print("\n[单元测试] -> 意图缓存命中测试")
+        self.assertEqual(self.cache.recognize_intent("怎么买票", self.intents), "购票")
+        self.assertEqual(self.cache.recognize_intent(" 怎么买票？", self.intents), "购票")
+        self.assertEqual(self.backend.recognize_intent.call_count, 1)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        print("  意图缓存命中测试通过")
+
+    def test_key_includes_branch_set(self):
+        """测试不同步骤的关键词集合分开缓存"""
+        print("\n[单元测试] -> 意图缓存键测试")
+        self.cache.recognize_intent("怎么买票", self.intents)
+        self.assertIsNone(self.cache.recognize_intent("怎么买票", ["门票"]))
+        self.assertEqual(self.backend.recognize_intent.call_count, 2)
+        print("  意图缓存键测试通过")
+
+    def test_negative_caching_and_ttl(self):
+        """测试None结果被缓存，且过期后重新请求"""
+        print("\n[单元测试] -> 意图负缓存测试")
+        self.assertIsNone(self.cache.recognize_intent("无关输入", self.intents))
+        self.assertIsNone(self.cache.recognize_intent("无关输入", self.intents))
+        self.assertEqual(self.backend.recognize_intent.call_count, 1)
+        self.cache.negative_ttl = 0
+        self.cache.clear()
+        self.cache.recognize_intent("无关输入", self.intents)
+        self.cache.recognize_intent("无关输入", self.intents)
+        self.assertEqual(self.backend.recognize_intent.call_count, 3)
+        print("  意图负缓存测试通过")
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        print("\n[单元测试] -> 意图缓存LRU测试")
+        self.cache.recognize_intent("怎么买票", self.intents)
+        self.cache.recognize_intent("几点开门", self.intents)
+        self.cache.recognize_intent("怎么买票", self.intents)  # 刷新为最近使用
+        self.cache.recognize_intent("门票价格", self.intents)  # 淘汰"几点开门"
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.cache.recognize_intent("怎么买票", self.intents)
+        self.assertEqual(self.backend.recognize_intent.call_count, 3)
+        self.cache.recognize_intent("几点开门", self.intents)
+        self.assertEqual(self.backend.recognize_intent.call_count, 4)
+        print("  意图缓存LRU测试通过")
+
+
+class TestSingleFlight(unittest.TestCase):
+    """单飞合并测试"""
+
+    def _run_concurrently(self, fn, count=8):
+        results = [None] * count
+        def worker(i):
+            results[i] = fn()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_identical_requests_share_one_call(self):
+        """测试相同的并发意图请求只调用一次后端"""
+        print("\n[单元测试] -> 单飞合并测试")
+        stub = LLMClientStub()
+        release = threading.Event()
+        def slow_recognize(user_input, intents):
+            release.wait(1)
+            return stub.recognize_intent(user_input, intents)
+        backend = MagicMock()
+        backend.recognize_intent.side_effect = slow_recognize
+        client = SingleFlightIntentClient(backend)
+        threading.Timer(0.1, release.set).start()
+        results = self._run_concurrently(lambda: client.recognize_intent("怎么买票", ["门票", "购票"]))
+        self.assertEqual(results, ["购票"] * 8)
+        self.assertEqual(backend.recognize_intent.call_count, 1)
+        self.assertEqual(client.flight.shared, 7)
+        print("  单飞合并测试通过")
+
+    def test_error_shared_and_not_sticky(self):
+        """测试首个调用的异常传递给所有等待者，且之后的调用重新执行"""
+        print("\n[单元测试] -> 单飞异常测试")
+        flight = SingleFlight()
+        release = threading.Event()
+        def failing():
+            release.wait(1)
+            raise RuntimeError("upstream down")
+        def call():
+            try:
+                return flight.do("key", failing)
+            except RuntimeError as e:
+                return str(e)
+        threading.Timer(0.1, release.set).start()
+        self.assertEqual(self._run_concurrently(call, 4), ["upstream down"] * 4)
+        self.assertEqual(flight.do("key", lambda: "ok"), "ok")
+        print("  单飞异常测试通过")
+
+
+class TestIntentBatcher(unittest.TestCase):
+    """意图微批处理测试"""
+
+    def test_batch_request_parsing(self):
+        """测试批量请求只发送一次系统提示词，并按序号解析每条结果"""
+        print("\n[集成测试] -> 批量意图识别解析测试")
+        sock = FakeSparkSocket(("1. 门票\n2. '时", "间'\n3. unknown"))
+        client = LLMClient("test_id", "test_key", "test_secret")
+        self.addCleanup(client.close)
+        with patch('websocket.create_connection', return_value=sock):
+            results = client.recognize_intents_batch(["多少钱", "几点开门", "你好"], ["门票", "时间"])
+        self.assertEqual(results, ["门票", "时间", None])
+        messages = sock.sent[0]["payload"]["message"]["text"]
+        self.assertEqual(len(messages), 2)
+        self.assertIn("3. 用户输入：你好", messages[1]["content"])
+        print("  批量意图识别解析测试通过")
+
+    def test_concurrent_inputs_grouped_by_intent_set(self):
+        """测试并发输入按意图集合合并为批次，并把结果分发回各调用方"""
+        print("\n[单元测试] -> 微批合并测试")
+        stub = LLMClientStub()
+        backend = MagicMock()
+        backend.recognize_intents_batch.side_effect = \
+            lambda inputs, intents: [stub.recognize_intent(text, intents) for text in inputs]
+        backend.recognize_intent.side_effect = stub.recognize_intent
+        batcher = IntentBatcher(backend, max_batch=4, max_wait=0.2)
+        cases = [("怎么买票", ["门票", "购票"]), ("门票价格", ["门票", "购票"]),
+                 ("几点开门", ["时间"]), ("成人票多少钱", ["门票", "购票"])]
+        results = {}
+        def call(text, intents):
+            results[text] = batcher.recognize_intent(text, intents)
+        threads = [threading.Thread(target=call, args=case) for case in cases]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, {"怎么买票": "购票", "门票价格": "门票", "几点开门": "时间", "成人票多少钱": "门票"})
+        backend.recognize_intents_batch.assert_called_once()
+        self.assertEqual(len(backend.recognize_intents_batch.call_args[0][0]), 3)
+        backend.recognize_intent.assert_called_once_with("几点开门", ["时间"])
+        print("  微批合并测试通过")
+
+    def test_latency_budget(self):
+        """测试超出延迟预算时抛出LLMError，熔断器记为失败、结果不进入缓存"""
+        print("\n[单元测试] -> 微批延迟预算测试")
+        backend = MagicMock()
+        backend.recognize_intent.side_effect = lambda *args: time.sleep(0.5) or "门票"
+        batcher = IntentBatcher(backend, max_batch=4, max_wait=0.01)
+        with self.assertRaises(LLMError):
+            batcher.recognize_intent("多少钱", ["门票"], budget=0.1)
+        print("  微批延迟预算测试通过")
+
+
+class TestLocalIntentClassifier(unittest.TestCase):
+    """本地意图分类层测试"""
+
+    def setUp(self):
+        self.fallback = MagicMock()
+        self.fallback.recognize_intent.return_value = None
+        self.classifier = LocalIntentClassifier(fallback=self.fallback)
+        program = Parser(Lexer(DSLScriptStub.get_test_dsl()).tokenize()).parse_program()
+        self.classifier.add_program(program)
+        self.classifier.add_examples(LLMClientStub().intent_mapping)
+        self.intents = ["门票", "购票", "时间", "物品", "游玩攻略"]
+
+    def test_confident_inputs_resolved_locally(self):
+        """测试有把握的输入在本地识别，不请求LLM"""
+        print("\n[单元测试] -> 本地意图分类测试")
+        cases = {"哪里可以买票": "购票", "开放时间是几点": "时间", "要带什么东西": "物品", "游玩路线推荐": "游玩攻略"}
+        for text, expected in cases.items():
+            with self.subTest(msg=f"输入: '{text}'"):
+                self.assertEqual(self.classifier.recognize_intent(text, self.intents), expected)
+        self.fallback.recognize_intent.assert_not_called()
+        print("  本地意图分类测试通过")
+
+    def test_low_confidence_defers_to_fallback(self):
+        """测试置信度不足时交给下一层"""
+        print("\n[单元测试] -> 本地分类兜底测试")
+        self.assertIsNone(self.classifier.recognize_intent("无关输入", self.intents))
+        self.fallback.recognize_intent.assert_called_once_with("无关输入", self.intents)
+        self.assertEqual(self.classifier.stats()["deferred"], 1)
+        print("  本地分类兜底测试通过")
+
+    def test_counters_concurrent(self):
+        """测试多个会话线程同时分类时计数不丢失"""
+        print("\n[单元测试] -> 本地分类并发计数测试")
+        self.classifier.fallback = None
+        self.classifier.fit()
+        switch = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, switch)
+        def worker():
+            for _ in range(200):
+                self.classifier.recognize_intent("无关输入", self.intents)
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.classifier.stats(), {"local_hits": 0, "deferred": 1600})
+        print("  本地分类并发计数测试通过")
+
+    def test_only_available_intents_scored(self):
+        """测试只在当前步骤的可用意图中选择"""
+        print("\n[单元测试] -> 本地分类意图范围测试")
+        intent, score, _ = self.classifier.classify("开放时间", ["门票", "购票"])
+        self.assertNotEqual(intent, "时间")
+        print("  本地分类意图范围测试通过")
+
+    def test_retrain_publishes_new_model(self):
+        """测试重新训练整体替换 (IDF, 索引)，已读取旧模型的分类不受影响"""
+        print("\n[单元测试] -> 本地分类热更新测试")
+        old = self.classifier.fit()
+        old_idf = dict(old[0])
+        self.classifier.add_keywords(["退票"])
+        new = self.classifier.fit()
+        self.assertIsNot(new, old)
+        self.assertEqual(old[0], old_idf)  # 旧模型未被原地修改
+        self.assertNotIn("退", old[1])
+        self.assertIn("退", new[0])
+        self.assertIn("退", new[1])
+        self.assertEqual(self.classifier.classify("我要退票", ["退票", "购票"])[0], "退票")
+        print("  本地分类热更新测试通过")
+
+
+class TestResilientIntentClient(unittest.TestCase):
+    """上游保护层测试：自适应截止时间、对冲请求、熔断"""
+
+    def _warm_tracker(self, seconds=0.05, count=50):
+        tracker = LatencyTracker(min_samples=20)
+        for _ in range(count):
+            tracker.record(seconds)
+        return tracker
+
+    def test_hedged_request_wins(self):
+        """测试超过p95后发出对冲请求并采用先返回的结果"""
+        print("\n[单元测试] -> 对冲请求测试")
+        calls = []
+        def recognize(user_input, intents):
+            calls.append(user_input)
+            if len(calls) == 1:
+                time.sleep(1)  # 第一个请求卡住
+            return "门票"
+        backend = MagicMock()
+        backend.recognize_intent.side_effect = recognize
+        client = ResilientIntentClient(backend, min_timeout=0.5, tracker=self._warm_tracker())
+        started = time.monotonic()
+        self.assertEqual(client.recognize_intent("多少钱", ["门票"]), "门票")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(client.stats()["hedges"], 1)
+        self.assertEqual(client.stats()["hedge_wins"], 1)
+        print("  对冲请求测试通过")
+
+    def test_adaptive_deadline(self):
+        """测试截止时间随观测到的延迟自适应"""
+        print("\n[单元测试] -> 自适应截止时间测试")
+        backend = MagicMock()
+        backend.recognize_intent.side_effect = lambda *args: time.sleep(1) or "门票"
+        client = ResilientIntentClient(backend, min_timeout=0.2, max_timeout=5, hedge=False,
+                                       tracker=self._warm_tracker())
+        self.assertAlmostEqual(client.deadline(), 0.2)
+        started = time.monotonic()
+        with self.assertRaises(LLMError):
+            client.recognize_intent("多少钱", ["门票"])
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(client.stats()["timeouts"], 1)
+        self.assertEqual(ResilientIntentClient(backend, max_timeout=5).deadline(), 5)  # 样本不足时使用上限
+        print("  自适应截止时间测试通过")
+
+    def test_circuit_breaker(self):
+        """测试错误率过高时熔断，冷却后探测成功恢复"""
+        print("\n[单元测试] -> 熔断测试")
+        backend = MagicMock()
+        backend.recognize_intent.side_effect = LLMError("upstream down")
+        breaker = CircuitBreaker(failure_threshold=0.5, min_requests=3, cooldown=0.1)
+        client = ResilientIntentClient(backend, hedge=False, breaker=breaker)
+        for _ in range(3):
+            with self.assertRaises(LLMError):
+                client.recognize_intent("多少钱", ["门票"])
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            client.recognize_intent("多少钱", ["门票"])
+        self.assertEqual(backend.recognize_intent.call_count, 3)
+
+        time.sleep(0.15)
+        backend.recognize_intent.side_effect = None
+        backend.recognize_intent.return_value = "门票"
+        self.assertEqual(client.recognize_intent("多少钱", ["门票"]), "门票")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(client.stats()["short_circuits"], 1)
+        print("  熔断测试通过")
+
+    def test_counters_concurrent(self):
+        """测试多个会话线程同时请求时计数不丢失"""
+        print("\n[单元测试] -> 上游保护层并发计数测试")
+        backend = MagicMock()
+        backend.recognize_intent = lambda user_input, intents: "门票"
+        client = ResilientIntentClient(backend, hedge=False)
+        self.addCleanup(client._executor.shutdown)
+        switch = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # 频繁切换线程，放大未加锁时的竞争
+        self.addCleanup(sys.setswitchinterval, switch)
+        def worker():
+            for _ in range(200):
+                client.recognize_intent("多少钱", ["门票"])
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = client.stats()
+        self.assertEqual((stats["requests"], stats["successes"], stats["failures"]), (1600, 1600, 0))
+        print("  上游保护层并发计数测试通过")
+
+
 class TestErrorScenarios(unittest.TestCase):
     """错误场景测试"""
     
@@ -508,15 +2047,12 @@ Step default_proc
         success = self.interpreter.load_dsl_script(DSLScriptStub.get_test_dsl())
         self.assertTrue(success)
         
-        # 测试空输入
-        response = self.interpreter.process_input("")
-        self.assertIn("抱歉", response)
-        self.assertIn("不太理解", response)
-        
-        # 测试只有空格的输入
-        response = self.interpreter.process_input("   ")
-        self.assertIn("抱歉", response)
-        self.assertIn("不太理解", response)
+        # 空输入与只有空格的输入都是静默轮询：未到静默时间时无操作，停留在当前步骤
+        for user_input in ("", "   "):
+            with self.subTest(msg=f"输入: {user_input!r}"):
+                self.assertEqual(self.interpreter.process_input(user_input), "")
+                self.assertEqual(self.interpreter.current_step, "welcome")
+        self.assertIn("不太理解", self.interpreter.process_input("无关问题"))
         
         print("  空用户输入测试通过")
 
@@ -532,8 +2068,18 @@ if __name__ == '__main__':
     
     # 添加测试类
     suite.addTests(loader.loadTestsFromTestCase(TestDSLInterpreterUnit))
+    suite.addTests(loader.loadTestsFromTestCase(TestKeywordMatcher))
+    suite.addTests(loader.loadTestsFromTestCase(TestCompiler))
     suite.addTests(loader.loadTestsFromTestCase(TestChatbotIntegration))
     suite.addTests(loader.loadTestsFromTestCase(TestLLMClientIntegration))
+    suite.addTests(loader.loadTestsFromTestCase(TestLLMClientPool))
+    suite.addTests(loader.loadTestsFromTestCase(TestStreamingEarlyExit))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncLLMClient))
+    suite.addTests(loader.loadTestsFromTestCase(TestIntentCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestSingleFlight))
+    suite.addTests(loader.loadTestsFromTestCase(TestIntentBatcher))
+    suite.addTests(loader.loadTestsFromTestCase(TestLocalIntentClassifier))
+    suite.addTests(loader.loadTestsFromTestCase(TestResilientIntentClient))
     suite.addTests(loader.loadTestsFromTestCase(TestErrorScenarios))
     
     # 运行测试